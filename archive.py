@@ -0,0 +1,219 @@
+# coding=utf-8
+#
+# Position archive: the holdings and cash of every statement converted, kept
+# in a local SQLite database, so that the history of a portfolio or a
+# security across statement dates can be queried without reading the csv
+# files again, e.g., the holdings of one ISIN in portfolio 12404 over the
+# last 90 days:
+#
+#	with PositionArchive() as archive:
+#		archive.holdings_history(portfolio='12404', isin='HK3377040226',
+#									start=datetime.date.today() - datetime.timedelta(90))
+#
+# The rows are the same as in the csv files, plus the account code and the
+# JPM security id (holdings) or cash account number (cash). Dates are stored
+# as 'yyyy-mm-dd' strings, so they sort and compare as dates.
+#
+
+import datetime, sqlite3
+from jpm.utility import get_archive_database
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+HOLDING_COLUMNS = [('portfolio', 'TEXT'), ('date', 'TEXT'),
+					('account_code', 'TEXT'), ('security_id', 'TEXT'),
+					('geneva_investment_id', 'TEXT'), ('isin', 'TEXT'),
+					('bloomberg_figi', 'TEXT'), ('currency', 'TEXT'),
+					('security_name', 'TEXT'), ('country', 'TEXT'),
+					('awaiting_receipt', 'REAL'), ('awaiting_delivery', 'REAL'),
+					('collateral_units', 'REAL'), ('borrowed_units', 'REAL'),
+					('settled_units', 'REAL'), ('total_units', 'REAL'),
+					('coupon_rate', 'REAL'), ('maturity_date', 'TEXT')]
+
+CASH_COLUMNS = [('portfolio', 'TEXT'), ('date', 'TEXT'),
+				('account_code', 'TEXT'), ('account_number', 'TEXT'),
+				('custodian', 'TEXT'), ('currency', 'TEXT'),
+				('opening_balance', 'REAL'), ('closing_balance', 'REAL')]
+
+INDEXES = [('holdings_portfolio_date', 'holdings', 'portfolio, date'),
+			('holdings_isin_currency', 'holdings', 'isin, currency'),
+			('holdings_security_id', 'holdings', 'security_id'),
+			('cash_portfolio_date', 'cash', 'portfolio, date')]
+
+
+
+def to_date_string(d):
+	"""
+	Convert a date or datetime to 'yyyy-mm-dd', a string is returned as it
+	is, None and '' to None.
+	"""
+	if d is None or d == '':
+		return None
+	if isinstance(d, (datetime.date, datetime.datetime)):
+		return d.strftime('%Y-%m-%d')
+	return d
+
+
+
+def to_record(row, columns):
+	"""
+	Convert a row (dictionary) to the form stored in the archive: only the
+	columns, dates as 'yyyy-mm-dd' strings and empty numbers as None.
+	"""
+	record = dict((name, row.get(name)) for name, t in columns)
+	record['date'] = to_date_string(record['date'])
+	if 'maturity_date' in record:
+		record['maturity_date'] = to_date_string(record['maturity_date'])
+	for name, t in columns:
+		if t == 'REAL' and record[name] == '':
+			record[name] = None
+
+	return record
+
+
+
+class PositionArchive(object):
+	"""
+	The archive database, the tables are created if not there yet. To be
+	used as a context manager, the database is closed at the end.
+	"""
+	def __init__(self, filename=None):
+		if filename is None:
+			filename = get_archive_database()
+
+		logger.debug('PositionArchive(): {0}'.format(filename))
+		self.connection = sqlite3.connect(filename)
+		self.connection.row_factory = sqlite3.Row
+		self.create_tables()
+
+
+
+	def __enter__(self):
+		return self
+
+
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+
+
+	def close(self):
+		self.connection.close()
+
+
+
+	def create_tables(self):
+		with self.connection:
+			for table, columns in [('holdings', HOLDING_COLUMNS),
+									('cash', CASH_COLUMNS)]:
+				self.connection.execute('CREATE TABLE IF NOT EXISTS {0} ({1})'.
+					format(table, ', '.join(name + ' ' + t for name, t in columns)))
+
+			for name, table, columns in INDEXES:
+				self.connection.execute('CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})'.
+											format(name, table, columns))
+
+
+
+	def add_statement(self, date, portfolios, holdings, cash):
+		"""
+		Put the holdings and cash of a statement into the archive, each is a
+		list of records from to_record(). The rows of the portfolios on the
+		date already in the archive are deleted first, even if a portfolio
+		has no rows now, so adding a statement again replaces it.
+		"""
+		keys = [(portfolio, to_date_string(date)) for portfolio in portfolios]
+		with self.connection:	# one transaction
+			for table, columns, rows in [('holdings', HOLDING_COLUMNS, holdings),
+										('cash', CASH_COLUMNS, cash)]:
+				self.connection.executemany(
+					'DELETE FROM {0} WHERE portfolio=? AND date=?'.format(table), keys)
+				self.connection.executemany('INSERT INTO {0} VALUES ({1})'.
+					format(table, ', '.join(':' + name for name, t in columns)), rows)
+
+		logger.debug('PositionArchive.add_statement(): {0} portfolios, '
+						'{1} holdings, {2} cash'.format(len(keys), len(holdings),
+														len(cash)))
+
+
+
+	def _query(self, table, conditions, start, end):
+		"""
+		Return the rows of the table matching the conditions (a list of
+		(column, value), None values are ignored) and between the start and
+		end dates (inclusive), ordered by date.
+		"""
+		where = []
+		parameters = []
+		for column, value in conditions:
+			if value is not None:
+				where.append(column + '=?')
+				parameters.append(value)
+
+		if start is not None:
+			where.append('date>=?')
+			parameters.append(to_date_string(start))
+		if end is not None:
+			where.append('date<=?')
+			parameters.append(to_date_string(end))
+
+		sql = 'SELECT * FROM {0}'.format(table)
+		if len(where) > 0:
+			sql = sql + ' WHERE ' + ' AND '.join(where)
+
+		return [dict(row) for row in
+				self.connection.execute(sql + ' ORDER BY date, rowid', parameters)]
+
+
+
+	def holdings_history(self, portfolio=None, isin=None, security_id=None,
+							currency=None, start=None, end=None):
+		"""
+		Return the holdings (list of dictionaries) of the portfolio and
+		security between the start and end dates, arguments not given are
+		not used to filter.
+		"""
+		return self._query('holdings', [('portfolio', portfolio), ('isin', isin),
+						('security_id', security_id), ('currency', currency)],
+						start, end)
+
+
+
+	def cash_history(self, portfolio=None, currency=None, start=None, end=None):
+		"""
+		Return the cash positions (list of dictionaries) of the portfolio
+		between the start and end dates.
+		"""
+		return self._query('cash', [('portfolio', portfolio),
+								('currency', currency)], start, end)
+
+
+
+	def previous_date(self, portfolio, date):
+		"""
+		Return the latest statement date of the portfolio before date, as a
+		'yyyy-mm-dd' string, None if there is none.
+		"""
+		date = to_date_string(date)
+		sql = 'SELECT MAX(date) FROM (' + \
+				'SELECT date FROM holdings WHERE portfolio=? AND date<? ' + \
+				'UNION ALL SELECT date FROM cash WHERE portfolio=? AND date<?)'
+		row = self.connection.execute(sql, (portfolio, date, portfolio, date)).fetchone()
+		return row[0]
+
+
+
+	def dates(self, portfolio=None):
+		"""
+		Return the statement dates in the archive, as 'yyyy-mm-dd' strings.
+		"""
+		sql = 'SELECT DISTINCT date FROM holdings{0} ' + \
+				'UNION SELECT DISTINCT date FROM cash{0} ORDER BY date'
+		if portfolio is None:
+			return [row[0] for row in self.connection.execute(sql.format(''))]
+
+		return [row[0] for row in self.connection.execute(
+					sql.format(' WHERE portfolio=?'), (portfolio, portfolio))]
@@ -0,0 +1,96 @@
+# coding=utf-8
+#
+# Write the cash and holding tables as typed columnar files, Parquet or
+# Arrow IPC, besides the csv files. The numbers are stored as float and the
+# dates as date, so downstream programs load them without parsing text and
+# guessing the types.
+#
+# pyarrow is optional, if it is not installed, is_available() returns False
+# and only the csv files can be written.
+#
+
+try:
+	import pyarrow
+	import pyarrow.parquet
+	import pyarrow.feather
+except ImportError:
+	pyarrow = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+# output format -> file extension
+FILE_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# columns of the cash and holding tables that are not strings
+FLOAT_COLUMNS = ['opening_balance', 'closing_balance', 'awaiting_receipt',
+					'awaiting_delivery', 'collateral_units', 'borrowed_units',
+					'settled_units', 'total_units', 'coupon_rate']
+DATE_COLUMNS = ['date', 'maturity_date']
+
+
+
+def is_available():
+	"""
+	Tell whether pyarrow is installed.
+	"""
+	return pyarrow is not None
+
+
+
+def column_type(name):
+	if name in FLOAT_COLUMNS:
+		return pyarrow.float64()
+	elif name in DATE_COLUMNS:
+		return pyarrow.date32()
+	else:
+		return pyarrow.string()
+
+
+
+def make_table(header, rows):
+	"""
+	Make an Arrow table from the rows of a csv file (see get_cash_rows()
+	and get_holding_rows()), the column names are in the header. The date
+	columns take datetime objects, an empty string means no value.
+	"""
+	columns = list(zip(*rows)) if len(rows) > 0 else [()] * len(header)
+	arrays = []
+	for name, values in zip(header, columns):
+		values = [None if value == '' else value for value in values]
+		arrays.append(pyarrow.array(values, type=column_type(name)))
+
+	return pyarrow.Table.from_arrays(arrays, names=header)
+
+
+
+def write_table(header, rows, filename, file_format='parquet'):
+	"""
+	Write the rows into a Parquet or Arrow IPC file.
+	"""
+	if pyarrow is None:
+		logger.error('write_table(): pyarrow not installed: {0}'.format(filename))
+		raise ImportError('pyarrow is needed to write {0}'.format(filename))
+
+	logger.debug('write_table(): {0}'.format(filename))
+	table = make_table(header, rows)
+	if file_format == 'parquet':
+		pyarrow.parquet.write_table(table, filename)
+	elif file_format == 'arrow':
+		pyarrow.feather.write_feather(table, filename)
+	else:
+		logger.error('write_table(): invalid file format {0}'.format(file_format))
+		raise ValueError('invalid file format: {0}'.format(file_format))
+
+
+
+def read_table(filename):
+	"""
+	Read a file written by write_table() as an Arrow table.
+	"""
+	if filename.endswith(FILE_FORMATS['parquet']):
+		return pyarrow.parquet.read_table(filename)
+	else:
+		return pyarrow.feather.read_table(filename)
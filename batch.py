@@ -0,0 +1,125 @@
+# coding=utf-8
+#
+# Convert many JPM broker statements in one go. Each statement is converted
+# in a worker process, so the throughput scales with the number of cores.
+#
+
+from concurrent.futures import ProcessPoolExecutor
+import glob, os
+from jpm.utility import get_input_directory, get_max_workers
+from jpm.open_jpm import convert_jpm
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+# the statement files in a directory
+STATEMENT_PATTERNS = ('*.xls', '*.xlsx')
+
+
+
+def find_statements(path):
+	"""
+	Find the JPM broker statements to convert. The path can be a directory,
+	then all the .xls and .xlsx files in it are returned, or a glob pattern
+	like 'C:\\data\\ListCo Equity\\*.xls'.
+
+	A relative path is relative to the input directory in the config file.
+	"""
+	path = os.path.join(get_input_directory(), path)
+	if os.path.isdir(path):
+		return list_statements(path)
+
+	return sorted(glob.glob(path))
+
+
+
+def list_statements(directory):
+	"""
+	Return the .xls and .xlsx files in the directory, except the lock files
+	of Excel.
+	"""
+	filenames = []
+	for pattern in STATEMENT_PATTERNS:
+		filenames.extend(glob.glob(os.path.join(directory, pattern)))
+
+	return sorted(f for f in filenames if not os.path.basename(f).startswith('~$'))
+
+
+
+def convert_statement(filename, output_dir=None, file_prefix=None):
+	"""
+	Convert one statement, the function runs in a worker process. For
+	output_dir and file_prefix, see convert_jpm().
+
+	It does not raise exceptions, instead it returns a tuple (filename,
+	output_files, error), where error is None if the conversion succeeds,
+	otherwise the error message.
+	"""
+	try:
+		output_files = convert_jpm(filename, output_dir, file_prefix)
+	except Exception as e:
+		logger.exception('convert_statement(): {0}'.format(filename))
+		return (filename, [], '{0}: {1}'.format(type(e).__name__, e))
+
+	return (filename, output_files, None)
+
+
+
+def convert_statements(filenames, max_workers=None):
+	"""
+	Convert the statements in a pool of worker processes, return the list
+	of results (see convert_statement()) in the same order as the filenames.
+
+	If max_workers is None, it is read from the config file.
+	"""
+	if max_workers is None:
+		max_workers = get_max_workers()
+
+	logger.debug('convert_statements(): {0} files, max_workers={1}'.
+					format(len(filenames), max_workers))
+	with ProcessPoolExecutor(max_workers=max_workers) as executor:
+		results = list(executor.map(convert_statement, filenames))
+
+	return results
+
+
+
+def print_summary(results):
+	"""
+	Print the success or failure of each statement, then the totals.
+	"""
+	failed = 0
+	for filename, output_files, error in results:
+		if error is None:
+			print('OK      {0}'.format(filename))
+		else:
+			failed = failed + 1
+			print('FAILED  {0}: {1}'.format(filename, error))
+
+	print('{0} files converted, {1} failed.'.
+			format(len(results)-failed, failed))
+
+
+
+if __name__ == '__main__':
+	import sys, logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	if len(sys.argv) < 2:
+		print('use python batch.py <input_directory or glob> [max_workers]')
+		sys.exit(1)
+
+	filenames = find_statements(sys.argv[1])
+	if len(filenames) == 0:
+		print('no statement found in {0}'.format(sys.argv[1]))
+		sys.exit(1)
+
+	max_workers = None
+	if len(sys.argv) > 2:
+		max_workers = int(sys.argv[2])
+
+	results = convert_statements(filenames, max_workers)
+	print_summary(results)
+	if any(error is not None for filename, output_files, error in results):
+		sys.exit(1)
@@ -0,0 +1,86 @@
+# coding=utf-8
+#
+# Compare the memory used by holding and cash positions stored as plain
+# dictionaries (the old parser output) and as the record types in 
+# records.py.
+#
+# Run from the parent directory of the jpm package:
+#
+#	python -m jpm.benchmark.bench_memory [number_of_positions]
+#
+
+import tracemalloc, datetime
+from jpm.records import HoldingPosition, CashPosition
+
+
+
+def equity_position(i):
+	return {'security_id': 'B{0:06d}'.format(i),
+			'security_name': 'SAMPLE EQUITY {0} COMMON STOCK HKD 1'.format(i),
+			'isin': 'HK{0:010d}'.format(i), 'regional_or_sub_account': '002',
+			'location_or_nominee': '0WX', 'country': 'HK',
+			'awaiting_receipt': 0.0, 'settled_units': float(i*100),
+			'total_units': float(i*100), 'awaiting_delivery': 0.0,
+			'collateral_units': 0.0, 'borrowed_units': 0.0}
+
+
+
+def bond_position(i):
+	position = equity_position(i)
+	position['coupon_rate'] = 0.05
+	position['maturity_date'] = datetime.datetime(2030, 1, 1)
+	position['current_face_settled'] = float(i*1000)
+	position['current_face_total'] = float(i*1000)
+	return position
+
+
+
+def cash_position(i):
+	return {'branch_code': '671', 'branch_name': 'JPMCBNALB', 
+			'account_number': '{0:08d}'.format(i), 'account_name': 'HKD',
+			'currency': 'HKD', 'dgsd_eligible': 'Y', 
+			'opening_balance': float(i), 'closing_balance': float(i)}
+
+
+
+def measure(make_position, n):
+	"""
+	Build n positions with make_position(i), return the memory allocated
+	in bytes.
+	"""
+	tracemalloc.start()
+	positions = [make_position(i) for i in range(n)]
+	size, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return size
+
+
+
+def run(n=100000):
+	results = []
+	for name, make_dict, record_type in \
+		[('equity', equity_position, HoldingPosition),
+		('bond', bond_position, HoldingPosition),
+		('cash', cash_position, CashPosition)]:
+
+		# the field values are built outside the measurement, so that only
+		# the container overhead is compared
+		values = [make_dict(i) for i in range(n)]
+		dict_size = measure(lambda i: dict(values[i]), n)
+		record_size = measure(lambda i: record_type(**values[i]), n)
+		results.append((name, dict_size, record_size))
+
+	return results
+
+
+
+if __name__ == '__main__':
+	import sys
+	n = 100000
+	if len(sys.argv) > 1:
+		n = int(sys.argv[1])
+
+	print('{0} positions'.format(n))
+	for name, dict_size, record_size in run(n):
+		print('{0:8s} dict: {1:>12,d} bytes  record: {2:>12,d} bytes  ({3:.0%})'.
+				format(name, dict_size, record_size, record_size/dict_size))
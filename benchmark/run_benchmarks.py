@@ -0,0 +1,194 @@
+# coding=utf-8
+#
+# Time the parser functions and the csv writers on synthetic statements of
+# increasing size (see synthetic.py), and save the results as JSON, so that
+# two versions of the code can be compared.
+#
+# Run from the parent directory of the jpm package:
+#
+#	python -m jpm.benchmark.run_benchmarks [results.json]
+#	python -m jpm.benchmark.run_benchmarks compare <old.json> <new.json>
+#
+
+import datetime, json, platform, shutil, sys, tempfile, time
+from jpm.open_jpm import read_date, read_account, read_holdings, read_cash, \
+						read_holdings_total, validate_holdings_total, \
+						read_jpm, classify_rows, write_csv, write_csv_pipelined, \
+						get_security_keys, PARSER_VERSION, ROW_ACCOUNT, \
+						ROW_HOLDING_FIELDS, ROW_HOLDINGS_SUBTOTAL, ROW_CASH_FIELDS
+from jpm.lookup_cache import seed_investment_ids, set_cache_size, \
+						get_cache_stats
+from jpm.benchmark.synthetic import generate_statement, SyntheticSheet
+
+
+
+# (accounts, holdings per account) of the synthetic statements
+DEFAULT_SIZES = [(10, 10), (50, 50), (200, 100)]
+
+# each benchmark is repeated this many times, the fastest is taken
+REPEAT = 5
+
+# a benchmark is run enough times to take at least this many seconds
+MIN_TIME = 0.2
+
+
+
+def time_function(func, repeat=REPEAT, min_time=MIN_TIME):
+	"""
+	Return the best time in seconds of one call to func(), and the number
+	of calls in each repeat, like timeit.Timer.autorange().
+	"""
+	number = 1
+	while True:
+		start = time.perf_counter()
+		for i in range(number):
+			func()
+		elapsed = time.perf_counter() - start
+		if elapsed >= min_time or number >= 1000000:
+			break
+		number = number * 10
+
+	best = elapsed
+	for i in range(repeat - 1):
+		start = time.perf_counter()
+		for j in range(number):
+			func()
+		best = min(best, time.perf_counter() - start)
+
+	return best/number, number
+
+
+
+def first_row(kinds, kind):
+	return kinds.index(kind)
+
+
+
+def prime_security_master(port_values):
+	"""
+	Put the investment ids of all the synthetic securities into the lookup
+	cache, so that the csv writers are timed without the lookups. The
+	cache is enlarged if needed to hold them all.
+	"""
+	keys = get_security_keys(port_values['accounts'])
+	if len(keys) > get_cache_stats()['investment_ids']['maxsize']:
+		set_cache_size(len(keys))
+
+	for key in keys:
+		seed_investment_ids(key, ('', key[2] if key[1] == 'ISIN' else '', ''))
+
+
+
+def benchmark_statement(accounts, holdings, output_dir):
+	"""
+	Run the benchmarks on one synthetic statement, return the list of
+	results, one dictionary per benchmark.
+	"""
+	ws = SyntheticSheet(generate_statement(accounts, holdings))
+	kinds = classify_rows(ws)
+	account_row = first_row(kinds, ROW_ACCOUNT)
+	holdings_row = first_row(kinds, ROW_HOLDING_FIELDS)
+	subtotal_row = first_row(kinds, ROW_HOLDINGS_SUBTOTAL)
+	cash_row = first_row(kinds, ROW_CASH_FIELDS)
+
+	holding_positions = []
+	read_holdings(ws, holdings_row, holding_positions, kinds)
+	n, holdings_total = read_holdings_total(ws, subtotal_row)
+
+	port_values = {}
+	read_jpm(ws, port_values)
+	prime_security_master(port_values)
+
+	def write_csv_files():
+		write_csv(port_values, output_dir, 'bench_')
+
+	def write_csv_files_pipelined():
+		write_csv_pipelined(ws, output_dir, 'bench_')
+
+	benchmarks = [
+		('read_date', lambda: read_date(ws, 0)),
+		('read_account', lambda: read_account(ws, account_row, {}, kinds)),
+		('read_holdings', lambda: read_holdings(ws, holdings_row, [], kinds)),
+		('read_cash', lambda: read_cash(ws, cash_row, [], kinds)),
+		('validate_holdings_total',
+			lambda: validate_holdings_total(holding_positions, holdings_total)),
+		('read_jpm', lambda: read_jpm(ws, {})),
+		('write_csv', write_csv_files),
+		('write_csv_pipelined', write_csv_files_pipelined)
+	]
+
+	results = []
+	for name, func in benchmarks:
+		seconds, number = time_function(func)
+		results.append({'benchmark': name, 'accounts': accounts,
+						'holdings': holdings, 'rows': ws.nrows,
+						'seconds': seconds, 'number': number})
+		print('{0:24s} {1:>4d} x {2:<4d} {3:>12.6f} ms'.
+				format(name, accounts, holdings, seconds*1000))
+
+	return results
+
+
+
+def run(sizes=DEFAULT_SIZES):
+	"""
+	Run the benchmarks on each size of statement, return the results with
+	the environment information, ready to be saved as JSON.
+	"""
+	output_dir = tempfile.mkdtemp()
+	try:
+		results = []
+		for accounts, holdings in sizes:
+			results.extend(benchmark_statement(accounts, holdings, output_dir))
+	finally:
+		shutil.rmtree(output_dir)
+
+	return {'parser_version': PARSER_VERSION,
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'time': datetime.datetime.now().isoformat(),
+			'results': results}
+
+
+
+def save_results(results, filename):
+	with open(filename, 'w') as f:
+		json.dump(results, f, indent=1)
+
+
+
+def load_results(filename):
+	with open(filename) as f:
+		return json.load(f)
+
+
+
+def compare_results(old, new):
+	"""
+	Return a list of (benchmark, accounts, holdings, old seconds, new
+	seconds) for the benchmarks in both results.
+	"""
+	def key(result):
+		return (result['benchmark'], result['accounts'], result['holdings'])
+
+	old_seconds = dict((key(r), r['seconds']) for r in old['results'])
+	return [key(r) + (old_seconds[key(r)], r['seconds'])
+			for r in new['results'] if key(r) in old_seconds]
+
+
+
+if __name__ == '__main__':
+	if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+		for name, accounts, holdings, old_seconds, new_seconds in \
+			compare_results(load_results(sys.argv[2]), load_results(sys.argv[3])):
+			print('{0:24s} {1:>4d} x {2:<4d} {3:>12.6f} ms {4:>12.6f} ms  {5:.2f}x'.
+					format(name, accounts, holdings, old_seconds*1000,
+							new_seconds*1000, old_seconds/new_seconds))
+		sys.exit(0)
+
+	filename = 'benchmark_results.json'
+	if len(sys.argv) > 1:
+		filename = sys.argv[1]
+
+	save_results(run(), filename)
+	print('results saved to {0}'.format(filename))
@@ -0,0 +1,230 @@
+# coding=utf-8
+#
+# Generate synthetic JPM broker statements of any size, in the same layout
+# as samples/statement.xls, to test and benchmark the parser and the csv
+# writers on large inputs.
+#
+# The statement is built as a list of rows, which can be read directly by
+# the parser through SyntheticSheet (no Excel file involved), or saved as an
+# .xlsx file by save_xlsx() if openpyxl is installed.
+#
+# Run from the parent directory of the jpm package:
+#
+#	python -m jpm.benchmark.synthetic <output.xlsx> [accounts] [holdings]
+#
+
+import datetime, random
+from xlrd.xldate import xldate_from_date_tuple
+from jpm.utility import get_datemode
+
+
+
+# account codes known by map_portfolio_id(), so that the csv writers accept
+# the synthetic statements
+ACCOUNT_CODES = ['48029', '48089', '48090', '48195', '53412', '53413',
+					'48194', 'AFU34', 'AFU35', 'BBK32', 'AFU37', 'AHS61',
+					'EUK64', 'EUK65', 'EWU12', 'EWU13']
+
+CURRENCIES = ['HKD', 'USD', 'CNY', 'SGD', 'JPY', 'EUR']
+
+HOLDING_HEADER = [
+	['Security ID', 'Security Name', '', '', 'Location/Nominee',
+		'Awaiting Receipt', 'Settled Units', 'Total Units'],
+	['ISIN', ' ', '', '', 'Reg./Sub Acct.', 'Awaiting Delivery',
+		'Current Face-Settled', 'Current Face-Total'],
+	['OCC ID', 'Coupon Rate', 'Maturity Date', 'Pool Number', 'Country',
+		'Collateral Units'],
+	['', '', '', '', '', 'Borrowed Units']
+]
+
+CASH_HEADER = ['Branch Code', 'Branch Name', '', '', 'Cash Account',
+				'Cash Account Name', 'Local CCY', 'DGSD Eligible',
+				'Opening Cash Balance', 'Closing Cash Balance']
+
+
+
+class SyntheticSheet(object):
+	"""
+	A list of rows with the part of the xlrd Sheet interface used by the
+	parser: name, nrows, ncols, cell_value() and row_values(). The rows are
+	padded with '' to the same length, as xlrd does.
+	"""
+	def __init__(self, rows, name='Sheet1'):
+		self.name = name
+		self.nrows = len(rows)
+		self.ncols = max([len(row) for row in rows] + [0])
+		self._rows = [row + [''] * (self.ncols - len(row)) for row in rows]
+
+
+
+	def cell_value(self, row, column):
+		return self._rows[row][column]
+
+
+
+	def row_values(self, row, start_colx=0, end_colx=None):
+		return self._rows[row][start_colx:end_colx]
+
+
+
+def generate_statement(accounts=10, holdings=20, cash=3, blank_density=1.0,
+						bond_ratio=0.5, empty_accounts=1, seed=0,
+						date=datetime.date(2016, 7, 6)):
+	"""
+	Return the rows of a statement with the given number of accounts, each
+	with the given number of holding positions (bonds or equities, bonds
+	are about bond_ratio of them) and cash positions.
+
+	blank_density is the average number of blank rows between two positions,
+	1.0 is the same as the JPM statements. The empty accounts ('No Data for
+	this Account') are put at the end, followed by the report footer. The
+	same arguments always give the same statement.
+	"""
+	rnd = random.Random(seed)
+	rows = [['', 'Positions'], [], [],
+			[''] * 16 + ['Page  1  of  1'], ['Summary'],
+			['As Of:  {0}'.format(date.strftime('%d-%b-%Y'))],
+			['Custody'] + [''] * 14 + ['Positions']]
+
+	for i in range(accounts):
+		rows.append(account_row(i))
+		if holdings > 0:
+			add_holdings(rows, rnd, i, holdings, blank_density, bond_ratio)
+
+		add_cash(rows, rnd, i, cash, blank_density)
+
+	for i in range(accounts, accounts+empty_accounts):
+		rows.append(account_row(i))
+		rows.append(['No Data for this Account'])
+
+	if empty_accounts > 0:	# otherwise the footer is read as cash rows
+		rows.append(['(*) Settled Units includes positions that are In Transit, At Registrar, Pledged and/or On Loan.'])
+		rows.append(['End of Report'])
+
+	return rows
+
+
+
+def account_row(i):
+	return ['Account:   {0}   SYNTHETIC FUND {1}           '.
+				format(ACCOUNT_CODES[i % len(ACCOUNT_CODES)], i)]
+
+
+
+def add_blank_rows(rows, rnd, blank_density):
+	n = int(blank_density)
+	if rnd.random() < blank_density - n:
+		n = n + 1
+
+	for i in range(n):
+		rows.append([])
+
+
+
+def add_holdings(rows, rnd, account, holdings, blank_density, bond_ratio):
+	"""
+	Add the holdings section of an account: the header, the positions and
+	the sub total, which is the sum of the positions.
+	"""
+	rows.extend([list(row) for row in HOLDING_HEADER])
+	rows.append([])
+
+	totals = [0.0] * 6
+	for i in range(holdings):
+		if i > 0:
+			add_blank_rows(rows, rnd, blank_density)
+
+		n = account*holdings + i
+		is_bond = rnd.random() < bond_ratio
+		quantities = [0.0, rnd.randint(1, 100000)*100.0, 0.0,
+						rnd.choice([0.0, 0.0, 0.0, rnd.randint(1, 100)*100.0])]
+		quantities[2] = quantities[1] - quantities[3]
+		if is_bond:
+			quantities.extend([quantities[1], quantities[2]])
+		else:
+			quantities.extend([0.0, 0.0])
+
+		totals = [total + q for total, q in zip(totals, quantities)]
+		rows.extend(holding_rows(rnd, n, is_bond, quantities))
+
+	rows.append(['', '', '', '', 'Totals:'] + [total_string(t) for t in totals[:3]])
+	rows.append(['', '', '', '', '', totals[3]] + [total_string(t) for t in totals[4:]])
+
+
+
+def holding_rows(rnd, n, is_bond, quantities):
+	currency = rnd.choice(CURRENCIES)
+	awaiting_receipt, settled, total, awaiting_delivery, face_settled, \
+		face_total = quantities
+	if is_bond:
+		coupon = rnd.randint(100, 800)/100
+		maturity = datetime.date(2017 + rnd.randint(0, 30), rnd.randint(1, 12),
+									rnd.randint(1, 28))
+		name = 'SYNTHETIC ISSUER {0} NOTES FIXED {1}% {2} {3} 1000'.format(
+					n, coupon, maturity.strftime('%d/%b/%Y').upper(), currency)
+		return [['S{0:06d}  '.format(n), name, '', '', '590', awaiting_receipt,
+					settled, total],
+				['XS{0:010d}  '.format(n), coupon,
+					xldate_from_date_tuple(maturity.timetuple()[:3], get_datemode()),
+					'', '130', awaiting_delivery, face_settled, face_total],
+				['', '', '', '', 'HK', 0.0],
+				['', '', '', '', '', 0.0]]
+	else:
+		name = 'SYNTHETIC COMPANY {0} LTD COMMON STOCK {1} 1'.format(n, currency)
+		return [['S{0:06d}  '.format(n), name, '', '', '0WX', awaiting_receipt,
+					settled, total],
+				['HK{0:010d}  '.format(n), '', '', '', '002', awaiting_delivery],
+				['', '', '', '', 'HK', 0.0],
+				['', '', '', '', '', 0.0]]
+
+
+
+def total_string(total):
+	"""
+	The sub totals are strings like '1,234.0000000  ', or ' ' if zero.
+	"""
+	if total == 0:
+		return ' '
+	return '{0:,.7f}  '.format(total)
+
+
+
+def add_cash(rows, rnd, account, cash, blank_density):
+	rows.append(list(CASH_HEADER))
+	for i in range(cash):
+		add_blank_rows(rows, rnd, blank_density)
+		currency = CURRENCIES[i % len(CURRENCIES)]
+		opening = rnd.randint(0, 10**9)/100
+		closing = rnd.randint(0, 10**9)/100
+		rows.append(['671', 'JPMCBNALB', '', '', '{0:08d}'.format(account*100+i),
+						currency, currency, 'Y', opening, closing, ' ', ' ', ' '])
+
+
+
+def save_xlsx(rows, filename):
+	"""
+	Save the rows of a statement as an .xlsx file, openpyxl is needed.
+	"""
+	from openpyxl import Workbook
+	wb = Workbook(write_only=True)
+	ws = wb.create_sheet('Sheet1')
+	for row in rows:
+		ws.append([None if cell_value == '' else cell_value for cell_value in row])
+
+	wb.save(filename)
+
+
+
+if __name__ == '__main__':
+	import sys
+	if len(sys.argv) < 2:
+		print('use python -m jpm.benchmark.synthetic <output.xlsx> [accounts] [holdings]')
+		sys.exit(1)
+
+	accounts, holdings = 10, 20
+	if len(sys.argv) > 2:
+		accounts = int(sys.argv[2])
+	if len(sys.argv) > 3:
+		holdings = int(sys.argv[3])
+
+	save_xlsx(generate_statement(accounts, holdings), sys.argv[1])
@@ -0,0 +1,84 @@
+# coding=utf-8
+#
+# Day over day delta of the holdings and cash: compare the positions of a
+# statement with those of the previous statement date, keep only the rows
+# added, removed or changed, so downstream reconciliation does not have to
+# go through the whole book every day.
+#
+# The holdings are matched by portfolio and JPM security id, the cash by
+# portfolio, cash account number and currency. The rows are in the archive
+# form (see archive.to_record()), so the previous positions can come from
+# the position archive or from a parsed statement.
+#
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+HOLDING_KEY = ['portfolio', 'security_id']
+CASH_KEY = ['portfolio', 'account_number', 'currency']
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+# columns not compared, the date is always different
+IGNORED_COLUMNS = ['date']
+
+
+
+def index_rows(rows, key):
+	"""
+	Return a dictionary of the rows by key. If more than one row has the
+	same key, the second one is keyed by key + (1,), the third by key + (2,)
+	and so on, so that they are matched in order.
+	"""
+	index = {}
+	for row in rows:
+		k = tuple(row[column] for column in key)
+		n = 0
+		while k + ((n,) if n > 0 else ()) in index:
+			n = n + 1
+
+		index[k + ((n,) if n > 0 else ())] = row
+
+	return index
+
+
+
+def is_changed(previous_row, row):
+	for column in row:
+		if column in IGNORED_COLUMNS:
+			continue
+		if previous_row.get(column) != row[column]:
+			return True
+
+	return False
+
+
+
+def compare_rows(previous_rows, rows, key):
+	"""
+	Compare the rows with the previous rows, matched by the key columns.
+	Return a list of (change, row), where change is ADDED, REMOVED or
+	CHANGED. Added and changed rows are the current ones, in their order,
+	followed by the removed rows, which are the previous ones.
+	"""
+	previous_index = index_rows(previous_rows, key)
+	delta = []
+	for k, row in index_rows(rows, key).items():
+		try:
+			previous_row = previous_index.pop(k)
+		except KeyError:
+			delta.append((ADDED, row))
+			continue
+
+		if is_changed(previous_row, row):
+			delta.append((CHANGED, row))
+
+	for row in previous_index.values():
+		delta.append((REMOVED, row))
+
+	logger.debug('compare_rows(): {0} rows, {1} changes'.format(len(rows), len(delta)))
+	return delta
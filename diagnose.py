@@ -0,0 +1,380 @@
+# coding=utf-8
+#
+# Diagnostic mode: check a JPM broker statement in one pass and report every
+# problem found, instead of stopping at the first one like read_jpm() does.
+# Each problem tells the row, column, field and cell value, so an operator
+# can fix a bad statement in one go, e.g.,
+#
+#	python diagnose.py <statement file, directory or glob> [report.json]
+#
+# prints the problems of each statement, and writes them into a JSON file
+# if it is given.
+#
+# The sheet is walked the same way as iter_statement(), but each cell is
+# converted on its own and an error is recorded, not raised. An account with
+# problems is left out, the other accounts are still read, so the result
+# has the accounts that would convert fine.
+#
+
+from concurrent.futures import ProcessPoolExecutor
+from collections import namedtuple
+from xlrd import cellname
+import json
+from jpm.utility import get_max_workers
+from jpm.schema import CASH_FIELDS_BY_NAME, QUANTITY_FIELDS
+from jpm.records import Account, HoldingPosition, CashPosition
+from jpm.workbook import open_sheet
+from jpm.open_jpm import read_date, classify_rows, extract_account_info, \
+						map_portfolio_id, get_holding_layout, RunningTotals, \
+						read_holdings_total, read_cash_fields, \
+						convert_datetime_to_string, InvalidAccountCode, \
+						ROW_BLANK, ROW_ACCOUNT, ROW_HOLDING_FIELDS, \
+						ROW_HOLDINGS_SUBTOTAL, ROW_CASH_FIELDS, ROW_NO_DATA
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+"""
+A problem found in the statement.
+
+row, column: the cell of the problem (0 based), column is None if the
+	problem is about a whole row, both are None if it is about the sheet.
+
+field: the field of the cell, like 'settled_units', None if not known.
+
+value: the cell value, or for a sub total, the sum of the positions.
+
+message: what is wrong.
+
+account: the account code, None if the problem is not in an account.
+"""
+Problem = namedtuple('Problem', ['row', 'column', 'field', 'value',
+									'message', 'account'])
+
+
+
+def diagnose_jpm(ws, port_values):
+	"""
+	Read the worksheet like read_jpm(), but record the problems found
+	instead of raising an exception. The accounts without problems are put
+	into port_values, return the list of Problem.
+	"""
+	logger.debug('diagnose_jpm(): {0}'.format(ws.name))
+	problems = []
+	try:
+		row, port_values['date'] = read_date(ws, 0)
+	except Exception as e:
+		row = 0
+		problems.append(Problem(None, None, 'date', None,
+								'no valid statement date: {0}'.format(error_message(e)),
+								None))
+
+	kinds = classify_rows(ws)
+	account_rows = [r for r in range(row, ws.nrows) if kinds[r] == ROW_ACCOUNT]
+	accounts = port_values.setdefault('accounts', [])
+	for account_row in account_rows:
+		account = diagnose_account(ws, account_row, kinds, problems)
+		if account is not None:
+			accounts.append(account)
+
+	logger.debug('diagnose_jpm(): {0} accounts, {1} valid, {2} problems'.
+					format(len(account_rows), len(accounts), len(problems)))
+	return problems
+
+
+
+def error_message(e):
+	return '{0}: {1}'.format(type(e).__name__, e)
+
+
+
+def diagnose_account(ws, row, kinds, problems):
+	"""
+	Read the account starting at row, see iter_account(). Return the
+	Account, or None if it has problems, which are added to problems.
+	"""
+	n = len(problems)
+	cell_value = ws.cell_value(row, 0)
+	try:
+		account_code, account_name = extract_account_info(cell_value)
+	except ValueError as e:
+		problems.append(Problem(row, 0, 'account', cell_value,
+								error_message(e), None))
+		return None
+
+	try:
+		map_portfolio_id(account_code)
+	except InvalidAccountCode:
+		problems.append(Problem(row, 0, 'account_code', account_code,
+								'no Geneva portfolio for the account code',
+								account_code))
+
+	account = Account(account_code=account_code, account_name=account_name)
+	row = row + 1
+	if row < ws.nrows and kinds[row] == ROW_HOLDING_FIELDS:
+		account['holdings'], row = diagnose_holdings(ws, row, kinds, account_code,
+														problems)
+
+	kind = kinds[row] if row < ws.nrows else ROW_ACCOUNT
+	if kind == ROW_CASH_FIELDS:
+		account['cash'] = diagnose_cash(ws, row, kinds, account_code, problems)
+
+	elif not kind in [ROW_NO_DATA, ROW_ACCOUNT]:
+		problems.append(Problem(row, None, None, None,
+								'unexpected sub section', account_code))
+
+	if len(problems) > n:
+		return None
+	return account
+
+
+
+def convert_cells(ws, position, cells, account_code, problems):
+	"""
+	Convert the cells of a position, cells are (field, row, column,
+	converter). A cell that fails is added to problems and left out of the
+	position. Return True if all cells are converted.
+	"""
+	succeeded = True
+	for fld, row, column, converter in cells:
+		cell_value = None
+		try:
+			cell_value = ws.cell_value(row, column)
+			if isinstance(cell_value, str):
+				cell_value = str.strip(cell_value)
+
+			value = converter(fld, cell_value)
+		except (TypeError, ValueError, IndexError) as e:
+			problems.append(Problem(row, column, fld, cell_value,
+									error_message(e), account_code))
+			succeeded = False
+			continue
+
+		if value is not None:
+			setattr(position, fld, value)
+
+	return succeeded
+
+
+
+def diagnose_holdings(ws, row, kinds, account_code, problems):
+	"""
+	Read the holdings section starting at row, see iter_holdings(). Return
+	the holdings and the row after the section.
+
+	The sub total is checked only if all positions are read fine, otherwise
+	the failed cells would make it mismatch as well.
+	"""
+	try:
+		layout = get_holding_layout(ws, row, kinds)
+	except (TypeError, ValueError) as e:
+		problems.append(Problem(row, None, None, None,
+								'invalid holding fields: {0}'.format(error_message(e)),
+								account_code))
+		return [], skip_holdings(row, kinds)
+
+	holdings = []
+	totals = RunningTotals()
+	succeeded = True
+	row = row + layout.rows_each_holding
+	while True:
+		while row < ws.nrows and kinds[row] == ROW_BLANK:
+			row = row + 1
+
+		if row >= ws.nrows or kinds[row] in [ROW_ACCOUNT, ROW_CASH_FIELDS, ROW_NO_DATA]:
+			problems.append(Problem(row, None, None, None,
+									'no Totals: row in the holdings section',
+									account_code))
+			return holdings, row
+
+		if kinds[row] == ROW_HOLDINGS_SUBTOTAL:
+			break
+
+		position = HoldingPosition()
+		cells = [(fld, row+row_offset, col_offset, converter)
+					for fld, row_offset, col_offset, converter in layout.columns]
+		if convert_cells(ws, position, cells, account_code, problems):
+			holdings.append(position)
+			totals.add(position)
+		else:
+			succeeded = False
+
+		row = row + layout.rows_each_holding
+
+	try:
+		n, holdings_total = read_holdings_total(ws, row)
+	except (TypeError, ValueError) as e:
+		problems.append(Problem(row, None, None, None,
+								'invalid sub total: {0}'.format(error_message(e)),
+								account_code))
+		return holdings, row + 2
+
+	if succeeded:
+		for fld, sub_total, total in totals.compare(holdings_total):
+			i = QUANTITY_FIELDS.index(fld)	# see read_holdings_total()
+			problems.append(Problem(row + i//3, 5 + i%3, fld, sub_total,
+									'sub total does not match: {0} != {1}'.
+										format(sub_total, total),
+									account_code))
+
+	return holdings, row + n
+
+
+
+def skip_holdings(row, kinds):
+	"""
+	Return the row after the holdings section starting at row, i.e., after
+	its 'Totals:' row, or the next section if it has none.
+	"""
+	while row < len(kinds):
+		if kinds[row] == ROW_HOLDINGS_SUBTOTAL:
+			return row + 2
+		if kinds[row] in [ROW_ACCOUNT, ROW_CASH_FIELDS, ROW_NO_DATA]:
+			return row
+		row = row + 1
+
+	return row
+
+
+
+def diagnose_cash(ws, row, kinds, account_code, problems):
+	"""
+	Read the cash section starting at row, see iter_cash(), return the
+	cash positions.
+	"""
+	try:
+		fields = read_cash_fields(ws, row)
+	except ValueError as e:
+		problems.append(Problem(row, None, None, None,
+								'invalid cash fields: {0}'.format(error_message(e)),
+								account_code))
+		return []
+
+	cash = []
+	row = row + 1
+	while True:
+		while row < ws.nrows and kinds[row] == ROW_BLANK:
+			row = row + 1
+
+		if row >= ws.nrows or kinds[row] == ROW_ACCOUNT:
+			break
+
+		position = CashPosition()
+		cells = [(fld, row, column, CASH_FIELDS_BY_NAME[fld].converter)
+					for column, fld in enumerate(fields) if fld != 'empty_field']
+		if convert_cells(ws, position, cells, account_code, problems):
+			cash.append(position)
+
+		row = row + 1
+
+	return cash
+
+
+
+def to_report(problem):
+	"""
+	Convert a Problem to a dictionary for the JSON report, with the cell
+	name as in Excel, like 'F212'.
+	"""
+	report = problem._asdict()
+	if problem.row is None:
+		report['cell'] = None
+	elif problem.column is None:
+		report['cell'] = str(problem.row + 1)
+	else:
+		report['cell'] = cellname(problem.row, problem.column)
+
+	return report
+
+
+
+def diagnose_statement(filename):
+	"""
+	Check one statement, the function runs in a worker process, see
+	diagnose_statements(). Return the report as a dictionary:
+
+	{'filename': ..., 'date': 'yyyy-mm-dd' or None, 'accounts': number of
+	accounts without problems, 'problems': [...]}
+
+	where each problem is from to_report(). If the file cannot be opened,
+	that is the only problem.
+	"""
+	port_values = {}
+	try:
+		with open_sheet(filename) as ws:
+			problems = diagnose_jpm(ws, port_values)
+	except Exception as e:
+		logger.exception('diagnose_statement(): {0}'.format(filename))
+		problems = [Problem(None, None, None, None, error_message(e), None)]
+
+	d = port_values.get('date')
+	return {'filename': filename,
+			'date': None if d is None else convert_datetime_to_string(d),
+			'accounts': len(port_values.get('accounts', [])),
+			'problems': [to_report(problem) for problem in problems]}
+
+
+
+def diagnose_statements(filenames, max_workers=None):
+	"""
+	Check the statements in a pool of worker processes, return the list of
+	reports in the same order as the filenames.
+	"""
+	if max_workers is None:
+		max_workers = get_max_workers()
+
+	with ProcessPoolExecutor(max_workers=max_workers) as executor:
+		return list(executor.map(diagnose_statement, filenames))
+
+
+
+def print_report(reports):
+	"""
+	Print the problems of each statement, then the totals.
+	"""
+	failed = 0
+	for report in reports:
+		if len(report['problems']) == 0:
+			print('OK      {0}'.format(report['filename']))
+			continue
+
+		failed = failed + 1
+		print('FAILED  {0}: {1} problems'.format(report['filename'],
+													len(report['problems'])))
+		for problem in report['problems']:
+			print('        {0} {1} {2}: {3}'.format(problem['cell'] or '-',
+								problem['field'] or '-', repr(problem['value']),
+								problem['message']))
+
+	print('{0} files checked, {1} with problems.'.format(len(reports), failed))
+
+
+
+def write_report(reports, filename):
+	with open(filename, 'w') as f:
+		json.dump(reports, f, indent=1)
+
+
+
+if __name__ == '__main__':
+	import sys, logging.config
+	from jpm.batch import find_statements
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	if len(sys.argv) < 2:
+		print('use python diagnose.py <statement file, directory or glob> [report.json]')
+		sys.exit(1)
+
+	filenames = find_statements(sys.argv[1])
+	if len(filenames) == 0:
+		print('no statement found in {0}'.format(sys.argv[1]))
+		sys.exit(1)
+
+	reports = diagnose_statements(filenames)
+	print_report(reports)
+	if len(sys.argv) > 2:
+		write_report(reports, sys.argv[2])
+
+	if any(len(report['problems']) > 0 for report in reports):
+		sys.exit(1)
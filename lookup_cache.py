@@ -0,0 +1,195 @@
+# coding=utf-8
+#
+# In process cache of the investment id and currency lookups. The same
+# securities appear in many accounts and many statements, so each distinct
+# lookup is done only once, as long as it stays in the cache.
+#
+# A security not found is cached as MISSING_INVESTMENT_IDS for a while only
+# (the "missing_ttl" setting in the [lookup] section of jpm.config), so a
+# long running process like server.py or watch.py picks it up once it is
+# added to Geneva. Other lookup errors, e.g., a database error, are not
+# cached at all.
+#
+
+from collections import OrderedDict
+from investment_lookup.id_lookup import get_investment_Ids, \
+										lookup_investment_currency, \
+										InvestmentIdNotFound
+from jpm.utility import get_lookup_cache_size, get_lookup_missing_ttl
+import time
+from jpm.metrics import stage
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+# the investment ids used when a security is not found by get_investment_Ids()
+MISSING_INVESTMENT_IDS = ('', 'MISSING_ISIN', '')
+
+
+
+class LookupCache(object):
+	"""
+	A bounded cache, when it is full, the least recently used entry is
+	evicted. It counts the hits, misses and evictions.
+
+	If ttl is given, it is a function of a value computed, returning the
+	seconds to keep the value, or None to keep it until it is evicted. An
+	expired value is computed again, that counts as a miss.
+	"""
+	def __init__(self, maxsize, ttl=None):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.clear()
+
+
+
+	def clear(self):
+		self._entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+
+
+	def get(self, key, compute):
+		"""
+		Return the value of key, if it is not in the cache or has expired,
+		call compute() to get the value and put it into the cache. Exceptions
+		from compute() are not cached.
+		"""
+		entry = self._entries.get(key)
+		if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+			self.misses = self.misses + 1
+			value = compute()
+			ttl = None if self.ttl is None else self.ttl(value)
+			self.put(key, value, ttl)
+			return value
+
+		self.hits = self.hits + 1
+		self._entries.move_to_end(key)
+		return entry[0]
+
+
+
+	def put(self, key, value, ttl=None):
+		"""
+		Put the value of key into the cache, if ttl is given, the value is
+		kept for ttl seconds.
+		"""
+		expires = None if ttl is None else time.monotonic() + ttl
+		self._entries[key] = (value, expires)
+		self._entries.move_to_end(key)
+		self._evict()
+
+
+
+	def resize(self, maxsize):
+		self.maxsize = maxsize
+		self._evict()
+
+
+
+	def _evict(self):
+		while len(self._entries) > self.maxsize:
+			self._entries.popitem(last=False)
+			self.evictions = self.evictions + 1
+
+
+
+	def stats(self):
+		return {'hits': self.hits, 'misses': self.misses,
+				'evictions': self.evictions, 'size': len(self._entries),
+				'maxsize': self.maxsize}
+
+
+
+def _investment_ids_ttl(investment_ids):
+	if investment_ids == MISSING_INVESTMENT_IDS:
+		return get_lookup_missing_ttl()
+	return None
+
+
+
+_investment_ids_cache = LookupCache(get_lookup_cache_size(), _investment_ids_ttl)
+_currency_cache = LookupCache(get_lookup_cache_size())
+
+
+
+def lookup_investment_ids(portfolio_id, security_id_type, security_id):
+	"""
+	Return the investment ids (geneva_investment_id, isin, bloomberg_figi)
+	of a security by get_investment_Ids(). If the lookup fails, return
+	MISSING_INVESTMENT_IDS. If the security is not found, that is cached
+	for "missing_ttl" seconds, other errors are not cached.
+	"""
+	def compute():
+		try:
+			with stage('lookup_investment_ids'):
+				return get_investment_Ids(portfolio_id, security_id_type, security_id)
+		except InvestmentIdNotFound:
+			logger.debug('lookup_investment_ids(): not found: {0}, {1}, {2}'.
+							format(portfolio_id, security_id_type, security_id))
+			return MISSING_INVESTMENT_IDS
+
+	try:
+		return _investment_ids_cache.get((portfolio_id, security_id_type, security_id),
+											compute)
+	except Exception:
+		logger.exception('lookup_investment_ids(): failed: {0}, {1}, {2}'.
+							format(portfolio_id, security_id_type, security_id))
+		return MISSING_INVESTMENT_IDS
+
+
+
+def lookup_currency(security_id_type, security_id):
+	"""
+	Return the currency of a security by lookup_investment_currency(). If
+	the security is not found, the exception is raised and not cached.
+	"""
+	def compute():
+		with stage('lookup_currency'):
+			return lookup_investment_currency(security_id_type, security_id)
+
+	return _currency_cache.get((security_id_type, security_id), compute)
+
+
+
+def seed_investment_ids(key, investment_ids):
+	"""
+	Put the investment ids of a security into the cache, key is
+	(portfolio_id, security_id_type, security_id), so that it is not looked
+	up, e.g., for the synthetic securities in tests and benchmarks.
+	"""
+	_investment_ids_cache.put(key, investment_ids)
+
+
+
+def set_cache_size(maxsize):
+	"""
+	Change the maximum number of entries in each lookup cache, the least
+	recently used entries are evicted if there are more.
+	"""
+	_investment_ids_cache.resize(maxsize)
+	_currency_cache.resize(maxsize)
+
+
+
+def get_cache_stats():
+	"""
+	Return the statistics of the lookup caches as a dictionary.
+	"""
+	return {'investment_ids': _investment_ids_cache.stats(),
+			'currency': _currency_cache.stats()}
+
+
+
+def clear_caches():
+	"""
+	Empty the lookup caches and the currencies loaded from the lookup
+	workbook, e.g., after the lookup tables are changed.
+	"""
+	from jpm.security_master import clear_currencies	# it imports this module
+	_investment_ids_cache.clear()
+	_currency_cache.clear()
+	clear_currencies()
@@ -0,0 +1,171 @@
+# coding=utf-8
+#
+# Timing of the conversion stages: opening the workbook, the section
+# readers, sub total validation, investment id lookups and csv writing.
+# For each stage, the wall time, number of calls and rows processed are
+# recorded.
+#
+# It is off by default. When off, a timed function costs one extra function
+# call and a flag check, so only functions called once per statement,
+# account or section are timed, not those called once per position.
+#
+# The time of a stage includes the stages it calls, e.g., read_account
+# includes read_holdings. The time of a generator stage (like
+# iter_holdings()) is the time spent inside the generator only, not in the
+# consumer of its events. The metrics are kept per process, so stages run
+# in worker processes (see read_jpm_parallel()) are not included.
+#
+
+from contextlib import contextmanager
+from functools import wraps
+import inspect, json, time
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+_enabled = False
+
+# stage name -> [seconds, calls, rows]
+_stages = {}
+
+
+
+def enable(enabled=True):
+	global _enabled
+	_enabled = enabled
+
+
+
+def is_enabled():
+	return _enabled
+
+
+
+def reset():
+	"""
+	Clear the metrics recorded so far.
+	"""
+	_stages.clear()
+
+
+
+def record(name, seconds, rows=0):
+	"""
+	Add one call of a stage to the metrics.
+	"""
+	try:
+		entry = _stages[name]
+	except KeyError:
+		entry = _stages[name] = [0.0, 0, 0]
+
+	entry[0] = entry[0] + seconds
+	entry[1] = entry[1] + 1
+	entry[2] = entry[2] + rows
+
+
+
+def get_metrics():
+	"""
+	Return the metrics as a dictionary, stage name -> {'seconds', 'calls',
+	'rows'}.
+	"""
+	return dict((name, {'seconds': seconds, 'calls': calls, 'rows': rows})
+				for name, (seconds, calls, rows) in _stages.items())
+
+
+
+def timed(name, rows=None):
+	"""
+	Decorator to record the calls of a function as stage name. If rows is
+	given, it is called with the return value of the function to get the
+	number of rows processed.
+
+	It works for generator functions as well, then the return value is the
+	value returned by the generator.
+	"""
+	def decorator(func):
+		if inspect.isgeneratorfunction(func):
+			@wraps(func)
+			def wrapper(*args, **kwargs):
+				if not _enabled:
+					return func(*args, **kwargs)
+				return _timed_generator(name, rows, func(*args, **kwargs))
+
+		else:
+			@wraps(func)
+			def wrapper(*args, **kwargs):
+				if not _enabled:
+					return func(*args, **kwargs)
+
+				start = time.perf_counter()
+				try:
+					result = func(*args, **kwargs)
+				except:
+					record(name, time.perf_counter() - start)
+					raise
+
+				record(name, time.perf_counter() - start,
+						0 if rows is None else rows(result))
+				return result
+
+		return wrapper
+
+	return decorator
+
+
+
+def _timed_generator(name, rows, generator):
+	"""
+	Pass on the values of the generator, only the time spent inside the
+	generator is counted.
+	"""
+	seconds = 0.0
+	n = 0
+	try:
+		while True:
+			start = time.perf_counter()
+			try:
+				value = next(generator)
+			except StopIteration as e:
+				if rows is not None:
+					n = rows(e.value)
+				return e.value
+			finally:
+				seconds = seconds + time.perf_counter() - start
+
+			yield value
+	finally:
+		record(name, seconds, n)
+
+
+
+@contextmanager
+def stage(name):
+	"""
+	Record the with block as stage name.
+	"""
+	if not _enabled:
+		yield
+		return
+
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		record(name, time.perf_counter() - start)
+
+
+
+def write_metrics(filename, extra=None):
+	"""
+	Write the metrics into a JSON file, with the items in the dictionary
+	extra if given.
+	"""
+	logger.debug('write_metrics(): {0}'.format(filename))
+	report = {'stages': get_metrics()}
+	if extra is not None:
+		report.update(extra)
+
+	with open(filename, 'w') as f:
+		json.dump(report, f, indent=1, sort_keys=True)
@@ -4,13 +4,28 @@
 #
 # 
 
-from xlrd import open_workbook
-from xlrd.xldate import xldate_as_datetime
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import datetime, csv, os
 from jpm.utility import get_datemode, retrieve_or_create, \
-						get_current_path, get_input_directory
-from investment_lookup.id_lookup import get_investment_Ids, \
-										lookup_investment_currency
+						get_input_directory, is_cache_enabled, \
+						is_memory_report_enabled, \
+						get_max_workers, is_metrics_enabled, get_arrow_format, \
+						is_archive_enabled, is_delta_enabled
+from jpm.schema import HOLDING_FIELDS, HOLDING_FIELDS_BY_NAME, CASH_FIELDS, \
+						CASH_FIELDS_BY_NAME, QUANTITY_FIELDS
+from jpm.records import Account, HoldingPosition, CashPosition
+from jpm.security_master import get_security_master, security_key
+from jpm.statement_cache import StatementCache, file_key
+from jpm.workbook import open_sheet, track_memory, SheetRows
+from jpm.metrics import timed, stage, write_metrics, \
+						enable as enable_metrics, reset as reset_metrics
+from jpm.lookup_cache import get_cache_stats
+from jpm.arrow_output import write_table, FILE_FORMATS
+from jpm.archive import PositionArchive, to_record, \
+						HOLDING_COLUMNS as ARCHIVE_HOLDING_COLUMNS, \
+						CASH_COLUMNS as ARCHIVE_CASH_COLUMNS
+from jpm.delta import compare_rows, HOLDING_KEY, CASH_KEY
 import logging
 logger = logging.getLogger(__name__)
 
@@ -27,6 +42,39 @@ class InvalidAccountCode(Exception):
 
 
 
+# Change it whenever the parser output changes, so that statements cached by
+# an older version of the parser are not used, see load_statement().
+PARSER_VERSION = 1
+
+
+
+# The kind of each row in the worksheet, see classify_rows()
+ROW_DATA = 0
+ROW_BLANK = 1
+ROW_ACCOUNT = 2
+ROW_HOLDING_FIELDS = 3
+ROW_HOLDINGS_SUBTOTAL = 4
+ROW_CASH_FIELDS = 5
+ROW_NO_DATA = 6
+
+
+
+# The kind of events yielded by iter_statement()
+EVENT_DATE = 'date'
+EVENT_ACCOUNT_BEGIN = 'account_begin'
+EVENT_HOLDING = 'holding'
+EVENT_CASH = 'cash'
+EVENT_ACCOUNT_END = 'account_end'
+
+"""
+An event from iter_statement(): kind is one of the EVENT_* above, row is the
+row in the worksheet where the item is found, value is the statement date, 
+the Account, the HoldingPosition or the CashPosition.
+"""
+Event = namedtuple('Event', ['kind', 'row', 'value'])
+
+
+
 def read_jpm(ws, port_values):
 	"""
 	Read the worksheet with portfolio holdings. To retrieve holding, 
@@ -87,17 +135,81 @@ def read_jpm(ws, port_values):
 
 	"""
 
+	run_events(iter_statement(ws), lambda event: collect_event(port_values, event))
+	logger.debug('out of read_jpm()')
+
+
+
+def iter_statement(ws):
+	"""
+	Walk through the worksheet and yield the items in the statement as soon
+	as they are parsed, as Event objects in the following order:
+
+	EVENT_DATE, the statement date
+
+	then for each account:
+		EVENT_ACCOUNT_BEGIN, the Account
+		EVENT_HOLDING, each HoldingPosition
+		EVENT_CASH, each CashPosition
+		EVENT_ACCOUNT_END, the Account
+
+	The holdings and cash of the Account in the events are left empty (if the
+	account has those sections) or missing (if not), the positions are only 
+	given in the EVENT_HOLDING and EVENT_CASH events. So a caller can filter
+	or write the positions without keeping the whole statement in memory.
+	read_jpm() collects the events into port_values. The rows are looked at
+	only as the walk reaches them (see RowKinds), so the first events come
+	before the rest of the sheet is read.
+
+	The holdings sub total of an account is validated when its 'Totals:' row
+	is reached, i.e., after the holding events of that account are yielded,
+	InconsistentSubtotal is raised if it does not match.
+	"""
 	row, d = read_date(ws, 0)
-	port_values['date'] = d
+	yield Event(EVENT_DATE, row, d)
 
+	kinds = RowKinds(ws)
 	while (row < ws.nrows):
-		rows_read = read_account(ws, row, port_values)
+		rows_read = yield from iter_account(ws, row, kinds)
 		row = row + rows_read
 
-	logger.debug('out of read_jpm()')
 
 
+def run_events(events, handle):
+	"""
+	Pass each event from the events generator to handle(), then return the
+	value returned by the generator, i.e., the number of rows read.
+	"""
+	while True:
+		try:
+			event = next(events)
+		except StopIteration as e:
+			return e.value
+
+		handle(event)
 
+
+
+def collect_event(port_values, event):
+	"""
+	Put an event from iter_statement() into the holding object port_values.
+	"""
+	if event.kind == EVENT_DATE:
+		port_values['date'] = event.value
+
+	elif event.kind == EVENT_ACCOUNT_BEGIN:
+		accounts = retrieve_or_create(port_values, 'accounts')
+		accounts.append(event.value)
+
+	elif event.kind == EVENT_HOLDING:
+		port_values['accounts'][-1]['holdings'].append(event.value)
+
+	elif event.kind == EVENT_CASH:
+		port_values['accounts'][-1]['cash'].append(event.value)
+
+
+
+@timed('read_date', rows=lambda result: result[0])
 def read_date(ws, row):
 	"""
 	Read the date in the broker statement
@@ -139,6 +251,10 @@ def read_date(ws, row):
 		rows_read = rows_read + 1
 		# end of while loop
 
+	if row+rows_read >= ws.nrows:
+		logger.error('read_date(): no \'As Of:\' row found')
+		raise ValueError('statement date not found')
+
 	return rows_read, d
 
 
@@ -187,18 +303,116 @@ def account_begins(ws, row):
 
 
 
-def read_account(ws, row, port_values):
+@timed('classify_rows', rows=len)
+def classify_rows(ws):
+	"""
+	Go through the worksheet once and work out the kind of each row, i.e.,
+	ROW_BLANK, ROW_ACCOUNT, ROW_HOLDING_FIELDS, ROW_HOLDINGS_SUBTOTAL,
+	ROW_CASH_FIELDS, ROW_NO_DATA or ROW_DATA.
+
+	The kinds are returned as a bytearray, one byte per row, so that the
+	readers below can walk through the sheet without probing and stripping
+	the same cells again and again.
+	"""
+	kinds = bytearray(ws.nrows)
+	for row in range(ws.nrows):
+		kinds[row] = classify_row(ws.row_values(row, 0, 6))
+
+	return kinds
+
+
+
+# kind of a row not classified yet, see RowKinds
+_ROW_UNKNOWN = 255
+
+
+
+class RowKinds(object):
+	"""
+	The kinds of the rows of a worksheet, like classify_rows(), but a row is
+	classified the first time its kind is asked for, then kept. So a walk
+	through the sheet reads each row once, when it gets there, and an
+	.xlsx sheet is streamed once instead of twice.
+	"""
+	def __init__(self, ws):
+		self._ws = ws
+		self._kinds = bytearray([_ROW_UNKNOWN]) * ws.nrows
+
+
+
+	def __len__(self):
+		return len(self._kinds)
+
+
+
+	def __getitem__(self, row):
+		kind = self._kinds[row]
+		if kind == _ROW_UNKNOWN:
+			kind = classify_row(self._ws.row_values(row, 0, 6))
+			self._kinds[row] = kind
+
+		return kind
+
+
+
+def classify_row(values):
+	"""
+	Work out the kind of a row from the values of its first 6 cells, the
+	rules are the same as account_begins(), is_holdings_subtotal() and 
+	is_blank_line().
+	"""
+	if len(values) > 0 and isinstance(values[0], str):
+		cell_value = values[0]
+		if cell_value.startswith('Account:') and len(cell_value) > 10:
+			return ROW_ACCOUNT
+		elif cell_value == 'Security ID':
+			return ROW_HOLDING_FIELDS
+		elif cell_value == 'Branch Code':
+			return ROW_CASH_FIELDS
+		elif cell_value == 'No Data for this Account':
+			return ROW_NO_DATA
+
+	for cell_value in values[:4]:
+		if not (isinstance(cell_value, str) and str.strip(cell_value) == ''):
+			return ROW_DATA
+
+	if len(values) > 4 and isinstance(values[4], str) \
+		and values[4].startswith('Totals:'):
+		return ROW_HOLDINGS_SUBTOTAL
+
+	for cell_value in values[4:]:
+		if not (isinstance(cell_value, str) and str.strip(cell_value) == ''):
+			return ROW_DATA
+
+	return ROW_BLANK
+
+
+
+def read_account(ws, row, port_values, kinds=None):
 	"""
 	Read the information of an account into the holding object port_values
+
+	kinds is the row kinds from classify_rows(), if not given, the rows are
+	classified as they are reached, see RowKinds.
+	"""
+	if kinds is None:
+		kinds = RowKinds(ws)
+
+	return run_events(iter_account(ws, row, kinds), 
+						lambda event: collect_event(port_values, event))
+
+
+
+@timed('read_account', rows=int)
+def iter_account(ws, row, kinds):
+	"""
+	Find the next account from row, yield the events of the account (see
+	iter_statement()), then return the number of rows read.
 	"""
 	rows_read = 0
 
 	while (row+rows_read < ws.nrows):
-
-		# cell_value = ws.cell_value(row+rows_read, 0)
-		# if account_begins(cell_value):
-		# 	break
-		if account_begins(ws, row+rows_read):
+		if kinds[row+rows_read] == ROW_ACCOUNT:
 			break
 
 		rows_read = rows_read + 1
@@ -207,47 +421,40 @@ def read_account(ws, row, port_values):
 	if row+rows_read >= ws.nrows:	# reaches end of file
 		return rows_read
 
-	logger.debug('read_account(): at row {0}'.format(row+rows_read))
-	# account_code, account_name = extract_account_info(cell_value)
-	account_code, account_name = extract_account_info(ws.cell_value(row+rows_read, 0))
-	account = {}
-	accounts = retrieve_or_create(port_values, 'accounts')
-	accounts.append(account)
-	account['account_code'] = account_code
-	account['account_name'] = account_name
+	logger.debug('iter_account(): at row {0}'.format(row+rows_read))
+	account_row = row+rows_read
+	account_code, account_name = extract_account_info(ws.cell_value(account_row, 0))
+	account = Account(account_code=account_code, account_name=account_name)
+	yield Event(EVENT_ACCOUNT_BEGIN, account_row, account)
 	rows_read = rows_read + 1
-	cell_value = ws.cell_value(row+rows_read, 0)
 
 	# if the following section is a holdings section (there may be
 	# 0 or 1 holding section)
-	if isinstance(cell_value, str) and cell_value == 'Security ID':
-		holdings = []
-		account['holdings'] = holdings
-		n = read_holdings(ws, row+rows_read, holdings)
+	if kinds[row+rows_read] == ROW_HOLDING_FIELDS:
+		account['holdings'] = []
+		n = yield from iter_holdings(ws, row+rows_read, kinds)
 		rows_read = rows_read + n
-		cell_value = ws.cell_value(row+rows_read, 0)
 
 	# if the following section a cash section (there is always a cash
 	# section, either following a holding section or directly following
 	# the account information
-	if isinstance(cell_value, str) and cell_value == 'Branch Code':
-		cash = []
-		account['cash'] = cash
-		n = read_cash(ws, row+rows_read, cash)
+	kind = kinds[row+rows_read]
+	if kind == ROW_CASH_FIELDS:
+		account['cash'] = []
+		n = yield from iter_cash(ws, row+rows_read, kinds)
 		rows_read = rows_read + n
 
-	elif isinstance(cell_value, str) and cell_value == 'No Data for this Account':
+	elif kind == ROW_NO_DATA:
 		rows_read = rows_read + 1
 
-	# elif account_begins(cell_value):	# the next account begins
-	# 	pass
-	elif account_begins(ws, row+rows_read):
+	elif kind == ROW_ACCOUNT:	# the next account begins
 		pass
 
 	else:
-		logger.error('read_account(): unexpected sub section in row {0}'.
+		logger.error('iter_account(): unexpected sub section in row {0}'.
 						format(row+rows_read))
 
+	yield Event(EVENT_ACCOUNT_END, account_row, account)
 	return rows_read
 
 
@@ -264,7 +471,7 @@ def is_empty_account(account):
 
 
 
-def read_holdings(ws, row, holdings):
+def read_holdings(ws, row, holdings, kinds=None):
 	"""
 	Read the holdings section. Each holdings section will consist of
 	the following:
@@ -278,36 +485,59 @@ def read_holdings(ws, row, holdings):
 
 	holding total subsection(1)
 
+	kinds is the row kinds from classify_rows(), if not given, the rows are
+	classified as they are reached, see RowKinds.
 	"""
 	logger.debug('read_holdings(): at row {0}'.format(row))
+	if kinds is None:
+		kinds = RowKinds(ws)
+
+	return run_events(iter_holdings(ws, row, kinds), 
+						lambda event: holdings.append(event.value))
+
+
+
+@timed('read_holdings', rows=int)
+def iter_holdings(ws, row, kinds):
+	"""
+	Read the holdings section starting at row, yield an EVENT_HOLDING for
+	each position, then validate the sub total and return the number of 
+	rows read.
+
+	The quantity fields are added up as the positions are read, so the
+	sub total is checked without going through the positions again.
+	"""
 	rows_read = 0
+	totals = RunningTotals()	# sums of this section, to validate the sub total
 
-	rows_each_holding, coordinates, fields = read_holding_fields(ws, row+rows_read)
+	layout = get_holding_layout(ws, row+rows_read, kinds)
+	rows_each_holding = layout.rows_each_holding
 	rows_read = rows_read + rows_each_holding
 
 	# read each holding position
 	while (row+rows_read < ws.nrows):
-		if is_holdings_subtotal(ws, row+rows_read):
+		if kinds[row+rows_read] == ROW_HOLDINGS_SUBTOTAL:
 			n, holdings_total = read_holdings_total(ws, row+rows_read)
-			validate_holdings_total(holdings, holdings_total)
+			validate_holdings_total(totals, holdings_total)
 			rows_read = rows_read + n
 			break
 
-		while (is_blank_line(ws, row+rows_read)):
+		while (kinds[row+rows_read] == ROW_BLANK):
 			rows_read = rows_read + 1
 
 		# if it is not a blank line, not a holding sub total,
 		# then it must be a holding position
-		read_holding_position(ws, row+rows_read, coordinates, fields, holdings)
+		position = layout.read_position(ws, row+rows_read)
+		totals.add(position)
+		yield Event(EVENT_HOLDING, row+rows_read, position)
 		rows_read = rows_read + rows_each_holding
 		# end of while loop
-		
 
 	return rows_read
 
 
 
-def read_holding_fields(ws, row):
+def read_holding_fields(ws, row, kinds=None):
 	"""
 	The holding fields subsection tells the reader which data field each
 	cell contains. Because the data fields are arranged in a 2 dimensional
@@ -328,172 +558,158 @@ def read_holding_fields(ws, row):
 	It also tells each holding position will take 4 rows in the excel
 	spread sheet.
 
+	kinds is the row kinds from classify_rows(), if not given, the end of
+	the subsection is found by checking for a blank line.
 	"""
-	logger.debug('read_holding_fields(): at row {0}'.format(row))
+	layout = get_holding_layout(ws, row, kinds)
+	return layout.rows_each_holding, list(layout.coordinates), list(layout.fields)
+
+
+
+# compiled holding layouts, keyed by the header signature, see 
+# get_holding_layout()
+_holding_layouts = {}
+
+
+
+def get_holding_layout(ws, row, kinds=None):
+	"""
+	Return the HoldingLayout of the holding fields subsection starting at
+	row.
+
+	Almost every account in a statement has the same holding fields, so
+	the layout is compiled only once for each distinct header, i.e., the 
+	values of the subsection's rows, and reused afterwards.
+	"""
+	logger.debug('get_holding_layout(): at row {0}'.format(row))
 	rows_read = 0
+	header = []
+
+	while (row+rows_read < ws.nrows):
+		header.append(tuple(ws.row_values(row+rows_read, 0, 9)))
+		rows_read = rows_read + 1
+		if kinds is None:
+			if is_blank_line(ws, row+rows_read):
+				break
+		elif kinds[row+rows_read] == ROW_BLANK:
+			break
+		# end of while loop
+
+	signature = tuple(header)
+	try:
+		return _holding_layouts[signature]
+	except KeyError:
+		layout = compile_holding_layout(signature)
+		_holding_layouts[signature] = layout
+		return layout
+
+
+
+def compile_holding_layout(header):
+	"""
+	Work out the HoldingLayout from the header, i.e., the cell values of
+	each row in the holding fields subsection.
+	"""
 	fields = []
 	coordinates = []
 
-	while (row+rows_read < ws.nrows):
+	for rows_read, row_values in enumerate(header):
 
-		for column in range(9):
-			if is_empty_cell(ws, row+rows_read, column):
+		for column, cell_value in enumerate(row_values):
+			if isinstance(cell_value, str) and str.strip(cell_value) == '':
 				continue
 
-			cell_value = ws.cell_value(row+rows_read, column)
 			if not isinstance(cell_value, str):	# data field name needs to
 												# be string
-				logger.error('read_holding_fields(): invalid data field: {0}'.
+				logger.error('compile_holding_layout(): invalid data field: {0}'.
 								format(cell_value))
 				raise ValueError('data field not a string')
 
-			if cell_value == 'Security ID':
-				fld = 'security_id'
-			elif cell_value == 'Security Name':
-				fld = 'security_name'
-			elif cell_value == 'Location/Nominee':
-				fld = 'location_or_nominee'
-			elif cell_value == 'Awaiting Receipt':
-				fld = 'awaiting_receipt'
-			elif cell_value == 'Settled Units':
-				fld = 'settled_units'
-			elif cell_value == 'Total Units':
-				fld = 'total_units'
-			elif cell_value == 'ISIN':
-				fld = 'isin'
-			elif cell_value == 'Reg./Sub Acct.':
-				fld = 'regional_or_sub_account'
-			elif cell_value == 'Awaiting Delivery':
-				fld = 'awaiting_delivery'
-			elif cell_value == 'Current Face-Settled':
-				fld = 'current_face_settled'
-			elif cell_value == 'Current Face-Total':
-				fld = 'current_face_total'
-			elif cell_value == 'OCC ID':
-				fld = 'occ_id'
-			elif cell_value == 'Coupon Rate':
-				fld = 'coupon_rate'
-			elif cell_value == 'Maturity Date':
-				fld = 'maturity_date'
-			elif cell_value == 'Pool Number':
-				fld = 'pool_number'
-			elif cell_value == 'Country':
-				fld = 'country'
-			elif cell_value == 'Collateral Units':
-				fld = 'collateral_units'
-			elif cell_value == 'Borrowed Units':
-				fld = 'borrowed_units'
-			else:	# data field not handled
-				logger.error('read_holding_fields(): unhandled data field: {0}'.
+			try:
+				field = HOLDING_FIELDS[cell_value]
+			except KeyError:	# data field not handled
+				logger.error('compile_holding_layout(): unhandled data field: {0}'.
 								format(cell_value))
 				raise ValueError('data field not handled')
 
-			fields.append(fld)
-			if fld in ['coupon_rate', 'maturity_date', 'pool_number']:
-				# in the actual holding position, the row offset for these
-				# three fields are not the same as the holding fields.
-				coordinates.append((rows_read-1, column))
-			else:
-				coordinates.append((rows_read, column))
+			fields.append(field.name)
+			# in the actual holding position, the row offset for some fields 
+			# (like coupon rate) are not the same as the holding fields.
+			coordinates.append((rows_read+field.row_offset, column))
 			# end of for loop
 
-		rows_read = rows_read + 1
-		if is_blank_line(ws, row+rows_read):
-			break
-		# end of while loop
+	return HoldingLayout(len(header), coordinates, fields)
 
-	return rows_read, coordinates, fields
 
 
-
-def read_holding_position(ws, row, coordinates, fields, holdings):
+class HoldingLayout(object):
 	"""
-	Read a holding position and save it into the holdings object.
+	The compiled layout of the holding positions in a holdings section:
+	the fields, their coordinates relative to the first row of a position, 
+	the converter of each field, and how many rows each position takes.
 	"""
-	logger.debug('read_holding_position(): at row {0}'.format(row))
-	position = {}
+	def __init__(self, rows_each_holding, coordinates, fields):
+		self.rows_each_holding = rows_each_holding
+		self.coordinates = tuple(coordinates)
+		self.fields = tuple(fields)
+
+		columns = []
+		row_offsets = []
+		for fld, (row_offset, col_offset) in zip(fields, coordinates):
+			try:
+				converter = HOLDING_FIELDS_BY_NAME[fld].converter
+			except KeyError:
+				logger.error('HoldingLayout(): unhandled field {0}'.format(fld))
+				raise TypeError('invalid field name: {0}'.format(fld))
+
+			columns.append((fld, row_offset, col_offset, converter))
+			if not row_offset in row_offsets:
+				row_offsets.append(row_offset)
+
+		self.columns = tuple(columns)
+		self.row_offsets = tuple(row_offsets)
+
+
+
+	def read_position(self, ws, row):
+		"""
+		Read the holding position starting at row, return it as a 
+		HoldingPosition.
+
+		The rows of the position are fetched once, each as a slice of the 
+		first 10 columns, then the fields are picked out of the slices. A
+		row is fetched when its first field is reached, so that on a bad
+		sheet (e.g., one ending inside a position), the fields are checked
+		in the same order as cell by cell, and the first invalid field
+		raises its TypeError or ValueError.
+		"""
+		logger.debug('read_position(): at row {0}'.format(row))
+		row_values = {}
+		position = HoldingPosition()
+		for fld, row_offset, col_offset, converter in self.columns:
+			try:
+				values = row_values[row_offset]
+			except KeyError:
+				values = row_values[row_offset] = ws.row_values(row+row_offset, 0, 10)
 
-	i = 0
-	for fld in fields:
-		row_offset, col_offset = coordinates[i]
-		i = i + 1
-		cell_value = ws.cell_value(row+row_offset, col_offset)
-		if isinstance(cell_value, str):
-			cell_value = str.strip(cell_value)
+			cell_value = values[col_offset]
+			if isinstance(cell_value, str):
+				cell_value = str.strip(cell_value)
 
-		if fld in ['security_id', 'security_name', 'isin', 
-					'regional_or_sub_account', 'location_or_nominee',
-					'country']:	# mandatory fields whose value is string
+			value = converter(fld, cell_value)
+			if value is not None:
+				setattr(position, fld, value)
 
-			if isinstance(cell_value, str):
-				# if cell_value == '':
-				# 	# special case handling
-				# 	if fld == 'isin':
-				# 		position['isin'] = ''
-				# 		position['geneva_investment_id'] = map_geneva_investment_id(position['security_id'])
-				# 	else:
-				# 		logger.error('read_holding_position(): field {0} is empty'.
-				# 						format(fld))
-				# 		raise ValueError('field {0} is empty'.format(fld))
-				# else:
-				# 	position[fld] = cell_value
-				position[fld] = cell_value.strip()
-			else:
-				logger.error('read_holding_position(): invalid type for field {0}, value={1}'.
-								format(fld, cell_value))
-				raise TypeError
-		
-		elif fld in ['awaiting_receipt', 'settled_units', 'total_units',
-						'awaiting_delivery', 'collateral_units', 
-						'borrowed_units']:	# mandatory fields whose
-											# value is float
+		return position
 
-			if isinstance(cell_value, float):
-				position[fld] = cell_value
-			else:
-				logger.error('read_holding_position(): invalid type for field {0}, value={1}'.
-								format(fld, cell_value))
-				raise TypeError('invalid data type for field {0}'.format(fld))
-		
-		elif fld in ['occ_id', 'coupon_rate', 'maturity_date', 'pool_number',
-						'current_face_settled', 'current_face_total']:
-			
-			# optional fields
-			if isinstance(cell_value, str) and cell_value == '':
-				pass	# if they are not there, skip it.
-
-			elif fld in ['coupon_rate', 'maturity_date', 
-							'current_face_settled', 'current_face_total']:
-
-				if isinstance(cell_value, float):
-					if fld == 'maturity_date':
-						datemode = get_datemode()
-						position[fld] = xldate_as_datetime(cell_value, datemode)
-					elif fld == 'coupon_rate':
-						position[fld] = cell_value/100
-					else:
-						position[fld] = cell_value
-				else:
-					logger.error('read_holding_position(): invalid type for field {0}, value={1}'.
-								format(fld, cell_value))
-					raise TypeError('invalid data type for field {0}'.format(fld))
-
-			elif fld in ['occ_id', 'pool_number']:
-
-				if isinstance(cell_value, str):
-					position[fld] = cell_value
-				else:
-					logger.error('read_holding_position(): invalid type for field {0}, value={1}'.
-								format(fld, cell_value))
-					raise TypeError('invalid data type for field {0}'.format(fld))
-
-		else:	# unhandled field names
-			logger.error('read_holding_position(): unhandled field {0}'.format(fld))
-			raise TypeError('invalid field name: {0}'.format(fld))
 
-	# end of for loop
 
-	holdings.append(position)
+def read_holding_position(ws, row, coordinates, fields, holdings):
+	"""
+	Read a holding position and save it into the holdings object.
+	"""
+	layout = HoldingLayout(None, coordinates, fields)
+	holdings.append(layout.read_position(ws, row))
 
 
 
@@ -507,13 +723,11 @@ def read_holdings_total(ws, row):
 	"""
 	logger.debug('read_holdings_total(): at row {0}'.format(row))
 	holdings_total = {}
-	fields = ['awaiting_receipt', 'settled_units', 'total_units',
-	'awaiting_delivery', 'current_face_settled', 'current_face_total']
+	fields = QUANTITY_FIELDS
 
 	i = 0
 	for r in range(row, row+2):
-		for column in range(5, 8):
-			cell_value = ws.cell_value(r, column)
+		for cell_value in ws.row_values(r, 5, 8):
 			if isinstance(cell_value, str) and str.strip(cell_value) == '':
 				cell_value = 0
 
@@ -531,39 +745,45 @@ def read_holdings_total(ws, row):
 
 
 
-def read_cash(ws, row, cash):
+def read_cash(ws, row, cash, kinds=None):
 	"""
 	Read the cash positions for each account
+
+	kinds is the row kinds from classify_rows(), if not given, the rows are
+	classified as they are reached, see RowKinds.
 	"""
 	logger.debug('read_cash(): at row {0}'.format(row))
+	if kinds is None:
+		kinds = RowKinds(ws)
+
+	return run_events(iter_cash(ws, row, kinds), 
+						lambda event: cash.append(event.value))
+
+
+
+@timed('read_cash', rows=int)
+def iter_cash(ws, row, kinds):
+	"""
+	Read the cash section starting at row, yield an EVENT_CASH for each
+	cash position, then return the number of rows read.
+	"""
 	rows_read = 0
 
 	fields = read_cash_fields(ws, row)
 	rows_read = rows_read + 1
 
-	# read each holding position
+	# read each cash position
 	while (row+rows_read < ws.nrows):
 
-		while (is_blank_line(ws, row+rows_read)):
+		while (kinds[row+rows_read] == ROW_BLANK):
 			rows_read = rows_read + 1
 		
-		# cell_value = ws.cell_value(row+rows_read, 0)
-		# if account_begins(cell_value):
-		# 	break
-		if account_begins(ws, row+rows_read):
+		if kinds[row+rows_read] == ROW_ACCOUNT:
 			break
 
-		# try:
-		# 	n = read_cash_position(ws, row+rows_read, fields, cash)
-		# 	rows_read = rows_read + n
-		# except (ValueError,TypeError):	# this line does not look like a valid
-		# 								# cash position, stop reading
-		# 	logger.info('read_cash(): row {0} is not a cash position'.
-		# 					format(row+rows_read))
-		# 	break
-
-		n = read_cash_position(ws, row+rows_read, fields, cash)
-		rows_read = rows_read + n
+		position = read_cash_row(ws, row+rows_read, fields)
+		yield Event(EVENT_CASH, row+rows_read, position)
+		rows_read = rows_read + 1
 
 		# end of while loop
 
@@ -591,23 +811,9 @@ def read_cash_fields(ws, row):
 							format(cell_value))
 			raise ValueError('cash field not a string')
 
-		if cell_value == 'Branch Code':
-			fld = 'branch_code'
-		elif cell_value == 'Branch Name':
-			fld = 'branch_name'
-		elif cell_value == 'Cash Account':
-			fld = 'account_number'
-		elif cell_value == 'Cash Account Name':
-			fld = 'account_name'
-		elif cell_value == 'Local CCY':
-			fld = 'currency'
-		elif cell_value == 'DGSD Eligible':
-			fld = 'dgsd_eligible'
-		elif cell_value == 'Opening Cash Balance':
-			fld = 'opening_balance'
-		elif cell_value == 'Closing Cash Balance':
-			fld = 'closing_balance'
-		else:	# data field not handled
+		try:
+			fld = CASH_FIELDS[cell_value].name
+		except KeyError:	# data field not handled
 			logger.error('read_cash_fields(): unhandled cash field: {0}'.
 							format(cell_value))
 			raise ValueError('cash field not handled')
@@ -621,71 +827,140 @@ def read_cash_fields(ws, row):
 
 def read_cash_position(ws, row, fields, cash):
 	"""
-	Read a cash position
+	Read a cash position and save it into the cash object.
 	"""
-	logger.debug('read_cash_position(): at row {0}'.format(row))
-	position = {}
+	cash.append(read_cash_row(ws, row, fields))
+	return 1	# read 1 row
+
+
+
+def read_cash_row(ws, row, fields):
+	"""
+	Read a cash position, return it as a CashPosition.
+	"""
+	logger.debug('read_cash_row(): at row {0}'.format(row))
+	position = CashPosition()
+	row_values = ws.row_values(row, 0, len(fields))
 	column = -1
 	for field in fields:
 		column = column + 1
 		if field == 'empty_field':	# ignore
 			continue
 
-		cell_value = ws.cell_value(row, column)
-		# logger.debug(cell_value)
-		if field in ['branch_code', 'branch_name', 'account_number', 
-						'account_name', 'currency', 'dgsd_eligible']:
-
-			if not isinstance(field, str):
-				logger.error('read_cash_position(): field {0} not a string, value = {1}'.
-								format(field, cell_value))
-				raise TypeError('invalid type for field {0}'.format(field))
-
-			elif str.strip(cell_value) == '':
-				logger.error('read_cash_position(): field {0} is empty'.
+		try:
+			converter = CASH_FIELDS_BY_NAME[field].converter
+		except KeyError:	# unexpected field
+			logger.error('read_cash_row(): unexpected field {0}'.
 								format(field))
-				raise ValueError('field {0} is empty'.format(field))
+			raise ValueError('unexpected field {0}'.format(field))
 
-			position[field] = str.strip(cell_value)
+		cell_value = row_values[column]
+		if isinstance(cell_value, str):
+			cell_value = str.strip(cell_value)
 
-		elif field in ['opening_balance', 'closing_balance']:
-			try:
-				position[field] = float(cell_value)
-			except ValueError:
-				logger.error('read_cash_position(): field {0} cannot be converted to float, value = {1}'.
-								format(field, cell_value))
-				raise TypeError('failed to read field {0} as float number'.format(field))
-
-		else:	# unexpected field
-			logger.error('read_cash_position(): unexpected field {0}'.
-								format(field))
-			raise ValueError('unexpected field {0}'.format(field))
+		setattr(position, field, converter(field, cell_value))
 
 	# end of for loop
 
-	cash.append(position)
-	return 1	# read 1 row
+	return position
+
+
+
+class RunningTotals(object):
+	"""
+	Running sums of the quantity fields of holding positions, updated one
+	position at a time, so that the sub total of a holdings section is
+	ready when its 'Totals:' row is reached.
+
+	The sums are compensated (Neumaier's variant of Kahan summation), the
+	rounding error of each addition is kept and added back at the end, so
+	the result is as accurate as math.fsum() in practice, no matter how
+	many positions there are or how different their sizes.
+	"""
+	def __init__(self, holdings=(), fields=QUANTITY_FIELDS):
+		self.fields = list(fields)
+		self.sums = [0.0] * len(self.fields)
+		self.compensations = [0.0] * len(self.fields)
+		self.count = 0
+		for position in holdings:
+			self.add(position)
+
+
+
+	def add(self, position):
+		"""
+		Add the quantity fields of a position, a missing field counts as
+		zero.
+		"""
+		sums = self.sums
+		compensations = self.compensations
+		for i, fld in enumerate(self.fields):
+			x = position.get(fld, 0.0)
+			s = sums[i]
+			t = s + x
+			if abs(s) >= abs(x):
+				compensations[i] = compensations[i] + ((s - t) + x)
+			else:
+				compensations[i] = compensations[i] + ((x - t) + s)
+			sums[i] = t
+
+		self.count = self.count + 1
 
 
 
+	def __getitem__(self, fld):
+		try:
+			i = self.fields.index(fld)
+		except ValueError:
+			raise KeyError(fld)
+
+		return self.sums[i] + self.compensations[i]
+
+
+
+	def totals(self):
+		"""
+		Return the sum of each field, as a list in the order of fields.
+		"""
+		return [s + c for s, c in zip(self.sums, self.compensations)]
+
+
+
+	def compare(self, holdings_total, tolerance=0.000001):
+		"""
+		Compare the sums with the holdings_total. Return the list of fields
+		whose sum does not match, as tuples (field, sum, holdings_total).
+		"""
+		mismatch = []
+		for fld, sub_total in zip(self.fields, self.totals()):
+			if abs(sub_total - holdings_total[fld]) > tolerance:
+				mismatch.append((fld, sub_total, holdings_total[fld]))
+
+		return mismatch
+
+
+
+@timed('validate_holdings_total')
 def validate_holdings_total(holdings, holdings_total):
-        """
-        Add up the six fields in each position:
+	"""
+	Add up the six fields in each position:
+
+	'awaiting_receipt', 'settled_units', 'total_units',
+	'awaiting_delivery', 'current_face_settled', 'current_face_total'
 
-        'awaiting_receipt', 'settled_units', 'total_units',
-        'awaiting_delivery', 'current_face_settled', 'current_face_total'
+	Then compare it to the sub total, make sure they are equal.
 
-        Then compare it to the sub total, make sure they are equal.
-        """
-        fields = ['awaiting_receipt', 'settled_units', 'total_units',
-        'awaiting_delivery', 'current_face_settled', 'current_face_total']
+	holdings is either the list of positions, or the RunningTotals of them
+	already added up while they were read (see iter_holdings()), then only
+	the six sums are compared.
+	"""
+	if not isinstance(holdings, RunningTotals):
+		holdings = RunningTotals(holdings)
 
-        for field in fields:
-            sub_total = calculate_sub_total(field, holdings)
-            if abs(sub_total - holdings_total[field]) > 0.000001:
-            	logger.error('validate_holdings_total(): sub total does not match for field {0}: {1} != {2}'.
-            					format(field, sub_total, holdings_total[field]))
-            	raise InconsistentSubtotal
+	for field, sub_total, total in holdings.compare(holdings_total):
+		logger.error('validate_holdings_total(): sub total does not match for field {0}: {1} != {2}'.
+						format(field, sub_total, total))
+		raise InconsistentSubtotal
 
 
 
@@ -828,6 +1103,18 @@ def get_currency_from_name(security_name):
 
 
 
+def get_holding_currency(position, master):
+	"""
+	The currency of a holding position, from the security name, or if it
+	is not in the name, from the security master.
+	"""
+	try:
+		return get_currency_from_name(position['security_name'])
+	except NoCurrencyCodeInName:
+		return master.get_currency('JPM', position['security_id'])
+
+
+
 def get_prefix_from_dir(input_dir):
 	"""
 	Work out a prefix for the filename depending on the input directory.
@@ -853,16 +1140,36 @@ def create_csv_file_name(date_string, output_dir, file_prefix, file_suffix):
 
 
 def write_csv(port_values, output_dir=get_input_directory(), \
-				file_prefix=get_prefix_from_dir(get_input_directory())):
+				file_prefix=get_prefix_from_dir(get_input_directory()),
+				archive=None):
 	"""
 	Write cash and holdings into csv files.
+
+	If archive (a PositionArchive, see archive.py) is given, the cash and
+	holdings are also put into the archive.
 	"""	
 	cash_file = write_cash_csv(port_values, output_dir, file_prefix)
 	holding_file = write_holding_csv(port_values, output_dir, file_prefix)
+	if archive is not None:
+		archive_statement(port_values, archive)
+
 	return [cash_file, holding_file]
 
 
 
+# fields in the output cash and holding csv files
+CASH_CSV_FIELDS = ['currency', 'opening_balance', 'closing_balance']
+CASH_CSV_HEADER = ['portfolio', 'date', 'custodian'] + CASH_CSV_FIELDS
+
+HOLDING_CSV_FIELDS = ['security_name', 'country', 'awaiting_receipt', 
+						'awaiting_delivery', 'collateral_units', 'borrowed_units', 
+						'settled_units', 'total_units', 'coupon_rate', 'maturity_date']
+HOLDING_CSV_HEADER = ['portfolio', 'date', 'geneva_investment_id', 'isin',
+						'bloomberg_figi', 'currency'] + HOLDING_CSV_FIELDS
+
+
+
+@timed('write_cash_csv')
 def write_cash_csv(port_values, output_dir, file_prefix):
 	portfolio_date = get_portfolio_date_as_string(port_values)
 	cash_file = create_csv_file_name(portfolio_date, output_dir, file_prefix, 'cash')
@@ -870,29 +1177,39 @@ def write_cash_csv(port_values, output_dir, file_prefix):
 	with open(cash_file, 'w', newline='') as csvfile:
 		logger.debug('write_cash_csv(): {0}'.format(cash_file))
 		file_writer = csv.writer(csvfile, delimiter='|')
-
-		fields = ['currency', 'opening_balance', 'closing_balance']
-		file_writer.writerow(['portfolio', 'date', 'custodian'] + fields)
+		file_writer.writerow(CASH_CSV_HEADER)
 		
 		accounts = port_values['accounts']
 		for account in accounts:
-			if is_empty_account(account) or not 'cash' in account:
-				continue
+			file_writer.writerows(get_cash_rows(account, portfolio_date))
 
-			portfolio_id = map_portfolio_id(account['account_code'])
-			cash = account['cash']
-			for position in cash:
-				row = [portfolio_id, portfolio_date, 'JPM']
+	return cash_file
 
-				for fld in fields:
-					row.append(position[fld])
 
-				file_writer.writerow(row)
 
-	return cash_file
+@timed('cash_rows', rows=len)
+def get_cash_rows(account, portfolio_date):
+	"""
+	Return the rows of an account in the cash csv file.
+	"""
+	if is_empty_account(account) or not 'cash' in account:
+		return []
+
+	portfolio_id = map_portfolio_id(account['account_code'])
+	rows = []
+	for position in account['cash']:
+		row = [portfolio_id, portfolio_date, 'JPM']
+
+		for fld in CASH_CSV_FIELDS:
+			row.append(position[fld])
 
+		rows.append(row)
 
+	return rows
 
+
+
+@timed('write_holding_csv')
 def	write_holding_csv(port_values, output_dir, file_prefix):
 	portfolio_date = get_portfolio_date_as_string(port_values)
 	holding_file = create_csv_file_name(portfolio_date, output_dir, file_prefix, 'position')
@@ -900,68 +1217,629 @@ def	write_holding_csv(port_values, output_dir, file_prefix):
 	with open(holding_file, 'w', newline='') as csvfile:
 		logger.debug('write_holding_csv(): {0}'.format(holding_file))
 		file_writer = csv.writer(csvfile, delimiter='|')
+		file_writer.writerow(HOLDING_CSV_HEADER)
 
-		fields = ['security_name', 'country', 'awaiting_receipt', 
-					'awaiting_delivery', 'collateral_units', 'borrowed_units', 
-					'settled_units', 'total_units', 'coupon_rate', 'maturity_date']
-
-		file_writer.writerow(['portfolio', 'date', 'geneva_investment_id', 'isin',
-								'bloomberg_figi', 'currency'] + fields)
+		# look up all distinct securities in the statement in one go
+		master = get_security_master()
+		master.resolve(get_security_keys(port_values['accounts']))
 
 		accounts = port_values['accounts']
 		for account in accounts:
-			if is_empty_account(account) or not 'holdings' in account:
-				continue
-
-			portfolio_id = map_portfolio_id(account['account_code'])				
-			holdings = account['holdings']
-
-			for position in holdings:
-				row = [portfolio_id, portfolio_date]
-				if position['isin'] == '':
-					security_id_type = 'JPM'
-					security_id = position['security_id']
-				else:
-					security_id_type = 'ISIN'
-					security_id = position['isin']
-
-				try:
-					investment_ids = get_investment_Ids(portfolio_id, security_id_type, security_id)
-				
-				except:
-					investment_ids = ('', 'MISSING_ISIN', '')
-
-				# For portfolio 12404, give special treatment for this position: 
-				# SINO-OCEAN GROUP HOLDING LTD COMMON STOCK HKD 0
-				# with isin = 'HK3377040226'. Although it is a common stock, however, it is
-				# setup as a private security in Geneva due to special accounting treatment.
-				if portfolio_id == '12404' and investment_ids == ('', 'HK3377040226', ''):
-					investment_ids = ('SINO OCEAN LAND_DUMMY', '', '')
-
-				for id in investment_ids:
-					row.append(id)
-
-				try:
-					row.append(get_currency_from_name(position['security_name']))
-				except NoCurrencyCodeInName:
-					row.append(lookup_investment_currency('JPM', position['security_id']))
-
-				for fld in fields:
-					try:
-						item = position[fld]
-						if fld == 'maturity_date':
-							item = convert_datetime_to_string(item)
-					except KeyError:
-						item = ''
-
-					row.append(item)
-
-				file_writer.writerow(row)
+			file_writer.writerows(get_holding_rows(account, portfolio_date, master))
 
 	return holding_file
 
 
 
+def get_security_keys(accounts):
+	"""
+	Return the keys to look up the investment ids of all holding positions
+	in the accounts, see security_master.security_key().
+	"""
+	keys = []
+	for account in accounts:
+		if is_empty_account(account) or not 'holdings' in account:
+			continue
+
+		portfolio_id = map_portfolio_id(account['account_code'])
+		for position in account['holdings']:
+			keys.append(security_key(portfolio_id, position))
+
+	return keys
+
+
+
+@timed('holding_rows', rows=len)
+def get_holding_rows(account, portfolio_date, master=None, typed=False):
+	"""
+	Return the rows of an account in the holding csv file.
+
+	The investment ids and currencies are looked up from the security
+	master, if it is not given, the one of this run is used and the 
+	securities in this account are resolved in one go.
+
+	If typed is True, the maturity date is kept as datetime instead of
+	converted to string, see write_arrow().
+	"""
+	if is_empty_account(account) or not 'holdings' in account:
+		return []
+
+	if master is None:
+		master = get_security_master()
+		master.resolve(get_security_keys([account]))
+
+	portfolio_id = map_portfolio_id(account['account_code'])
+	rows = []
+	for position in account['holdings']:
+		row = [portfolio_id, portfolio_date]
+		investment_ids = master.get_investment_ids(*security_key(portfolio_id, position))
+
+		# For portfolio 12404, give special treatment for this position: 
+		# SINO-OCEAN GROUP HOLDING LTD COMMON STOCK HKD 0
+		# with isin = 'HK3377040226'. Although it is a common stock, however, it is
+		# setup as a private security in Geneva due to special accounting treatment.
+		if portfolio_id == '12404' and investment_ids == ('', 'HK3377040226', ''):
+			investment_ids = ('SINO OCEAN LAND_DUMMY', '', '')
+
+		for id in investment_ids:
+			row.append(id)
+
+		row.append(get_holding_currency(position, master))
+
+		for fld in HOLDING_CSV_FIELDS:
+			try:
+				item = position[fld]
+				if fld == 'maturity_date' and not typed:
+					item = convert_datetime_to_string(item)
+			except KeyError:
+				item = ''
+
+			row.append(item)
+
+		rows.append(row)
+
+	return rows
+
+
+
+@timed('archive_statement')
+def archive_statement(port_values, archive):
+	"""
+	Put the cash and holdings of a statement into the position archive, see
+	get_archive_records().
+	"""
+	holdings, cash = get_archive_records(port_values)
+	archive.add_statement(port_values['date'], get_portfolios(port_values),
+							holdings, cash)
+
+
+
+def get_portfolios(port_values):
+	"""
+	Return the Geneva portfolio ids of the accounts in a statement, sorted.
+	An account code without a portfolio is left out with a warning.
+	"""
+	portfolios = set()
+	for account in port_values['accounts']:
+		try:
+			portfolios.add(map_portfolio_id(account['account_code']))
+		except InvalidAccountCode:
+			logger.warning('get_portfolios(): no portfolio for account {0}'.
+							format(account['account_code']))
+
+	return sorted(portfolios)
+
+
+
+def get_archive_records(port_values):
+	"""
+	Return the holdings and cash of a statement in the archive form (see
+	archive.to_record()): the rows are the same as in the csv files, plus
+	the account code and the JPM security id or cash account number.
+	"""
+	portfolio_date = port_values['date']
+	master = get_security_master()
+	master.resolve(get_security_keys(port_values['accounts']))
+
+	holdings = []
+	cash = []
+	for account in port_values['accounts']:
+		for position, row in zip(account.get('cash', []),
+								get_cash_rows(account, portfolio_date)):
+			record = dict(zip(CASH_CSV_HEADER, row))
+			record['account_code'] = account['account_code']
+			record['account_number'] = position['account_number']
+			cash.append(to_record(record, ARCHIVE_CASH_COLUMNS))
+
+		for position, row in zip(account.get('holdings', []),
+								get_holding_rows(account, portfolio_date,
+													master, typed=True)):
+			record = dict(zip(HOLDING_CSV_HEADER, row))
+			record['account_code'] = account['account_code']
+			record['security_id'] = position['security_id']
+			holdings.append(to_record(record, ARCHIVE_HOLDING_COLUMNS))
+
+	return holdings, cash
+
+
+
+# columns of the delta csv files, see write_delta()
+CASH_DELTA_HEADER = ['change'] + CASH_CSV_HEADER + ['account_number']
+HOLDING_DELTA_HEADER = ['change'] + HOLDING_CSV_HEADER + ['security_id']
+
+
+
+@timed('write_delta')
+def write_delta(port_values, output_dir, file_prefix, archive=None,
+				previous=None, previous_records=None):
+	"""
+	Write the holdings and cash that are added, removed or changed since
+	the previous statement date into csv files, return the list of output
+	files. The first column of each row is 'added', 'removed' or 'changed',
+	followed by the csv columns and the security id or cash account number.
+	Removed rows are those of the previous date.
+
+	The previous positions are, in this order:
+
+	previous_records, the (holdings, cash) from get_previous_records() or
+	get_archive_records(), if given;
+
+	the statement previous (port_values of the previous date), if given;
+
+	otherwise from the archive, see get_previous_records(). Without an
+	archive, every position is added.
+
+	Holdings are matched by portfolio and security id, cash by portfolio,
+	cash account number and currency, see delta.py.
+	"""
+	holdings, cash = get_archive_records(port_values)
+	if previous_records is not None:
+		previous_holdings, previous_cash = previous_records
+	elif previous is not None:
+		previous_holdings, previous_cash = get_archive_records(previous)
+	else:
+		previous_holdings, previous_cash = get_previous_records(archive, port_values)
+
+	portfolio_date = get_portfolio_date_as_string(port_values)
+	output_files = []
+	for previous_rows, rows, key, header, file_suffix in \
+		[(previous_cash, cash, CASH_KEY, CASH_DELTA_HEADER, 'cash_delta'),
+		(previous_holdings, holdings, HOLDING_KEY, HOLDING_DELTA_HEADER, 'position_delta')]:
+
+		delta_file = create_csv_file_name(portfolio_date, output_dir, file_prefix,
+											file_suffix)
+		with open(delta_file, 'w', newline='') as csvfile:
+			logger.debug('write_delta(): {0}'.format(delta_file))
+			file_writer = csv.writer(csvfile, delimiter='|')
+			file_writer.writerow(header)
+			for change, row in compare_rows(previous_rows, rows, key):
+				file_writer.writerow([change] +
+					[get_delta_value(row, column) for column in header[1:]])
+
+		output_files.append(delta_file)
+
+	return output_files
+
+
+
+def get_previous_records(archive, port_values):
+	"""
+	Return the holdings and cash in the archive of the portfolios in the
+	statement, each of its latest date before the statement date. If
+	archive is None, there is no previous position.
+	"""
+	if archive is None:
+		logger.warning('get_previous_records(): no archive, no previous positions')
+		return [], []
+
+	holdings = []
+	cash = []
+	for portfolio in get_portfolios(port_values):
+		d = archive.previous_date(portfolio, port_values['date'])
+		if d is None:
+			continue
+
+		holdings.extend(archive.holdings_history(portfolio=portfolio, start=d, end=d))
+		cash.extend(archive.cash_history(portfolio=portfolio, start=d, end=d))
+
+	return holdings, cash
+
+
+
+def get_delta_value(row, column):
+	"""
+	The value of a column in the delta csv file, the same format as in the
+	cash and holding csv files.
+	"""
+	value = row.get(column)
+	if value is None:
+		return ''
+	if column in ['date', 'maturity_date']:
+		return convert_datetime_to_string(datetime.datetime.strptime(value, '%Y-%m-%d'))
+	return value
+
+
+
+@timed('write_arrow')
+def write_arrow(port_values, output_dir, file_prefix, file_format='parquet'):
+	"""
+	Write cash and holdings into Parquet or Arrow IPC files (file_format is
+	'parquet' or 'arrow'), with the same columns as the csv files, return
+	the list of output files.
+
+	The numbers are float, the 'date' and 'maturity_date' columns are date.
+	"""
+	portfolio_date = get_portfolio_date_as_string(port_values)
+	master = get_security_master()
+	master.resolve(get_security_keys(port_values['accounts']))
+
+	cash_rows = []
+	holding_rows = []
+	for account in port_values['accounts']:
+		cash_rows.extend(get_cash_rows(account, port_values['date']))
+		holding_rows.extend(get_holding_rows(account, port_values['date'],
+												master, typed=True))
+
+	output_files = []
+	for rows, header, file_suffix in [(cash_rows, CASH_CSV_HEADER, 'cash'),
+							(holding_rows, HOLDING_CSV_HEADER, 'position')]:
+		filename = os.path.splitext(create_csv_file_name(portfolio_date,
+						output_dir, file_prefix, file_suffix))[0] + \
+						FILE_FORMATS[file_format]
+		write_table(header, rows, filename, file_format)
+		output_files.append(filename)
+
+	return output_files
+
+
+
+@timed('write_csv_pipelined')
+def write_csv_pipelined(ws, output_dir, file_prefix):
+	"""
+	Parse the worksheet and write the cash and holding csv files at the same
+	time, return the list of output csv files (same as write_csv()).
+
+	The positions of an account are buffered until the account ends, i.e.,
+	after its holdings sub total is validated, then written to both csv 
+	files and released. So the memory used depends on the largest account, 
+	not the whole statement. If anything goes wrong, the partly written csv 
+	files are removed.
+	"""
+	events = iter_statement(ws)
+	event = next(events)	# the statement date comes first
+	portfolio_date = convert_datetime_to_string(event.value)
+	cash_file = create_csv_file_name(portfolio_date, output_dir, file_prefix, 'cash')
+	holding_file = create_csv_file_name(portfolio_date, output_dir, file_prefix, 'position')
+	logger.debug('write_csv_pipelined(): {0}, {1}'.format(cash_file, holding_file))
+
+	try:
+		with open(cash_file, 'w', newline='') as cash_csv, \
+			open(holding_file, 'w', newline='') as holding_csv:
+
+			cash_writer = csv.writer(cash_csv, delimiter='|')
+			cash_writer.writerow(CASH_CSV_HEADER)
+			holding_writer = csv.writer(holding_csv, delimiter='|')
+			holding_writer.writerow(HOLDING_CSV_HEADER)
+
+			for event in events:
+				if event.kind == EVENT_HOLDING:
+					account['holdings'].append(event.value)
+
+				elif event.kind == EVENT_CASH:
+					account['cash'].append(event.value)
+
+				elif event.kind == EVENT_ACCOUNT_BEGIN:
+					account = event.value
+
+				elif event.kind == EVENT_ACCOUNT_END:
+					cash_writer.writerows(get_cash_rows(account, portfolio_date))
+					holding_writer.writerows(get_holding_rows(account, portfolio_date))
+					account = None
+
+	except:
+		logger.error('write_csv_pipelined(): failed, remove output files')
+		for filename in [cash_file, holding_file]:
+			if os.path.exists(filename):
+				os.remove(filename)
+		raise
+
+	return [cash_file, holding_file]
+
+
+
+def read_jpm_parallel(filename, max_workers=None):
+	"""
+	Read a statement file into the holding object port_values, the same
+	as read_jpm(), but the accounts are read in worker processes.
+
+	The rows are classified in one pass first, to find where each account
+	begins. The accounts are then split into max_workers groups of
+	consecutive accounts, each group is read by a worker process, which
+	also validates the holdings sub totals of its accounts. The accounts
+	are put into port_values['accounts'] in their order in the statement.
+
+	The file is opened once, here. Each worker is sent the row values of
+	its group (see SheetRows), the row kinds and its account rows, so it
+	neither opens the file nor classifies the rows again. Opening the file
+	stays in one process though, and it is most of the time: on a synthetic
+	200 accounts x 100 holdings .xlsx, opening and classifying take about
+	11s, reading the accounts under 1s. Measured on one core, read_jpm()
+	takes 12.0s, read_jpm_parallel() 11.5s with 2 workers and 14.3s with 4;
+	on samples/statement.xls 6ms, 21ms and 32ms. So it helps only when
+	reading the accounts is slow, e.g., with many positions, and there are
+	idle cores.
+
+	If max_workers is None, it follows the "max_workers" setting in the
+	[batch] section of the config file.
+	"""
+	logger.debug('read_jpm_parallel(): {0}'.format(filename))
+	if max_workers is None:
+		max_workers = get_max_workers() or os.cpu_count()
+
+	with open_sheet(filename) as ws:
+		date_row, d = read_date(ws, 0)
+		kinds = classify_rows(ws)
+		port_values = {'date': d}
+		account_rows = find_account_rows(kinds, date_row)
+		if len(account_rows) == 0:
+			return port_values
+
+		groups = split_account_rows(account_rows, max_workers)
+		accounts = retrieve_or_create(port_values, 'accounts')
+		if len(groups) == 1:	# not worth starting a worker process
+			accounts.extend(read_accounts(ws, groups[0], kinds))
+			return port_values
+
+		sheets = [SheetRows(ws, group[0], group_end_row(ws, groups, i))
+					for i, group in enumerate(groups)]
+
+	n = len(groups)
+	with ProcessPoolExecutor(max_workers=n) as executor:
+		for group_accounts in executor.map(read_accounts, sheets, groups,
+											[kinds]*n):
+			accounts.extend(group_accounts)
+
+	return port_values
+
+
+
+def group_end_row(ws, groups, i):
+	"""
+	Return the row after the rows of the i-th group of accounts. It includes
+	the first row of the next group, which tells the reader that the last
+	account of the group ends there, as it would in the whole sheet.
+	"""
+	if i + 1 < len(groups):
+		return groups[i+1][0] + 1
+	return ws.nrows
+
+
+
+def find_account_rows(kinds, row=0):
+	"""
+	Return the rows from row onwards where an account begins, by the row
+	kinds from classify_rows().
+	"""
+	return [r for r in range(row, len(kinds)) if kinds[r] == ROW_ACCOUNT]
+
+
+
+def split_account_rows(account_rows, n):
+	"""
+	Split the account rows into at most n groups of consecutive accounts,
+	with similar number of accounts in each group.
+	"""
+	n = max(1, min(n, len(account_rows)))
+	size, extra = divmod(len(account_rows), n)
+	groups = []
+	start = 0
+	for i in range(n):
+		end = start + size + (1 if i < extra else 0)
+		groups.append(account_rows[start:end])
+		start = end
+
+	return groups
+
+
+
+def read_accounts(ws, account_rows, kinds):
+	"""
+	Read the accounts beginning at account_rows of the worksheet (or its
+	SheetRows), return the list of accounts. It runs in a worker process
+	of read_jpm_parallel().
+	"""
+	port_values = {'accounts': []}
+	for row in account_rows:
+		read_account(ws, row, port_values, kinds)
+
+	return port_values['accounts']
+
+
+
+def load_statement(filename, use_cache=None, parallel=False):
+	"""
+	Open a statement file and read it, return the holding object port_values
+	(see read_jpm()).
+
+	If use_cache is True, the parsed statement is looked up in the on disk 
+	cache first, keyed by the file content, PARSER_VERSION and the excel
+	datemode (the dates depend on it), so that a statement already parsed
+	is loaded without opening the excel file. If use_cache is None, it
+	follows the "enabled" setting in the [cache] section of the config
+	file.
+
+	If parallel is True, the accounts are read in worker processes, see
+	read_jpm_parallel().
+	"""
+	if use_cache is None:
+		use_cache = is_cache_enabled()
+
+	if use_cache:
+		cache = StatementCache()
+		key = file_key(filename, PARSER_VERSION, {'datemode': get_datemode()})
+		port_values = cache.get(key)
+		if port_values is not None:
+			logger.debug('load_statement(): {0} loaded from cache'.format(filename))
+			return port_values
+
+	if parallel:
+		port_values = read_jpm_parallel(filename)
+	else:
+		port_values = {}
+		with open_sheet(filename) as ws:
+			read_jpm(ws, port_values)
+
+	if use_cache:
+		cache.put(key, port_values)
+
+	return port_values
+
+
+
+def convert_jpm(filename, output_dir=None, file_prefix=None, pipelined=False,
+				use_cache=None, report_memory=None, parallel=False,
+				collect_metrics=None, arrow_format=None, use_archive=None,
+				delta=None, previous_file=None):
+	"""
+	Convert one JPM broker statement into the cash and holding csv files,
+	return the list of output csv files.
+
+	If output_dir is not given, the csv files are written to the directory
+	where the statement is in, with the file prefix worked out from that
+	directory.
+
+	If pipelined is True, the csv files are written while the statement is
+	parsed, see write_csv_pipelined(). Otherwise the statement is loaded by
+	load_statement(filename, use_cache, parallel), parallel is not used when
+	pipelined is True.
+
+	The workbook is released once the statement is parsed, before the csv
+	files are written. If report_memory is True, the peak memory used is
+	logged. If it is None, it follows the "report_memory" setting in the
+	[excel] section of the config file.
+
+	If collect_metrics is True, the time of each stage is recorded (see
+	metrics.py) and written to a json file next to the csv files, the
+	metrics are also available from metrics.get_metrics() afterwards. If
+	it is None, it follows the "enabled" setting in the [metrics] section
+	of the config file.
+
+	If arrow_format is 'parquet' or 'arrow', the cash and holdings are also
+	written as Parquet or Arrow IPC files, see write_arrow(), except in
+	pipelined mode. If it is None, it follows the "arrow_format" setting in
+	the [output] section of the config file.
+
+	If use_archive is True, the cash and holdings are also put into the
+	position archive (see archive.py), except in pipelined mode. If it is
+	None, it follows the "enabled" setting in the [archive] section of the
+	config file.
+
+	If delta is True, the cash and holdings added, removed or changed since
+	the previous statement are also written, see write_delta(), except in
+	pipelined mode. If it is None, it follows the "delta" setting in the
+	[output] section of the config file. The previous statement is
+	previous_file if given, loaded by load_statement(previous_file,
+	use_cache), i.e., from the statement cache when it is there. Otherwise
+	it is the previous statement date in the position archive, so delta
+	implies use_archive, the next statement is compared with this one.
+	"""
+	logger.debug('convert_jpm(): {0}'.format(filename))
+	if output_dir is None:
+		output_dir = os.path.dirname(os.path.abspath(filename))
+	if file_prefix is None:
+		file_prefix = get_prefix_from_dir(output_dir)
+
+	if report_memory is None:
+		report_memory = is_memory_report_enabled()
+	if collect_metrics is None:
+		collect_metrics = is_metrics_enabled()
+	if arrow_format is None:
+		arrow_format = get_arrow_format()
+	if use_archive is None:
+		use_archive = is_archive_enabled()
+	if delta is None:
+		delta = is_delta_enabled()
+	if delta and not use_archive:
+		logger.info('convert_jpm(): delta is on, the statement is archived')
+		use_archive = True
+
+	if collect_metrics:
+		reset_metrics()
+		enable_metrics()
+
+	try:
+		with stage('convert_jpm'):
+			if report_memory:
+				with track_memory() as memory:
+					output_files = _convert_jpm(filename, output_dir, file_prefix,
+												pipelined, use_cache, parallel,
+												arrow_format, use_archive, delta,
+												previous_file)
+
+				logger.info('convert_jpm(): {0}, peak memory {1:,} bytes'.
+								format(filename, memory['peak']))
+			else:
+				output_files = _convert_jpm(filename, output_dir, file_prefix,
+											pipelined, use_cache, parallel,
+											arrow_format, use_archive, delta,
+											previous_file)
+	finally:
+		if collect_metrics:
+			enable_metrics(False)
+
+	if collect_metrics:
+		extra = {'filename': filename, 'lookup_cache': get_cache_stats()}
+		if report_memory:
+			extra['peak_memory'] = memory['peak']
+		write_metrics(get_metrics_file_name(output_files), extra)
+
+	return output_files
+
+
+
+def get_metrics_file_name(output_files):
+	"""
+	The metrics file is put next to the csv files, e.g., for the cash file
+	'..._2016-7-6_cash.csv', it is '..._2016-7-6_metrics.json'.
+	"""
+	return os.path.splitext(output_files[0])[0].rsplit('_', 1)[0] + '_metrics.json'
+
+
+
+def _convert_jpm(filename, output_dir, file_prefix, pipelined, use_cache,
+					parallel, arrow_format, use_archive, delta, previous_file):
+	if pipelined:
+		with open_sheet(filename) as ws:
+			return write_csv_pipelined(ws, output_dir, file_prefix)
+
+	port_values = load_statement(filename, use_cache, parallel)
+	previous_records = None
+	if delta and previous_file is not None:
+		previous_records = get_archive_records(load_statement(previous_file,
+																use_cache))
+
+	if use_archive:
+		with PositionArchive() as archive:
+			if delta and previous_records is None:
+				# before this statement goes into the archive
+				previous_records = get_previous_records(archive, port_values)
+
+			output_files = write_csv(port_values, output_dir, file_prefix, archive)
+	else:
+		output_files = write_csv(port_values, output_dir, file_prefix)
+
+	if delta:
+		output_files.extend(write_delta(port_values, output_dir, file_prefix,
+										previous_records=previous_records))
+
+	if arrow_format:
+		output_files.extend(write_arrow(port_values, output_dir, file_prefix,
+										arrow_format))
+
+	return output_files
+
+
+
 if __name__ == '__main__':
 	import sys, logging.config
 	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
@@ -975,14 +1853,11 @@ if __name__ == '__main__':
 		print('{0} does not exist'.format(filename))
 		sys.exit(1)
 
-	port_values = {}
 	try:
-		wb = open_workbook(filename=filename)
-		ws = wb.sheet_by_name('Sheet1')
-		read_jpm(ws, port_values)
-		write_csv(port_values)
+		convert_jpm(filename, get_input_directory(), 
+					get_prefix_from_dir(get_input_directory()))
 	except:
 		logger.exception('open_jpm:main()')
 		print('something goes wrong, check log file.')
 	else:
-		print('OK')
\ No newline at end of file
+		print('OK')
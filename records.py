@@ -0,0 +1,129 @@
+# coding=utf-8
+#
+# Compact record types for the parser output. A statement may have thousands
+# of positions, keeping each one as a dictionary costs a lot of memory, so
+# they are stored in objects with __slots__ instead.
+#
+# The records behave like dictionaries for reading and writing fields, i.e.,
+# position['isin'], 'coupon_rate' in position, len(position), so code
+# written for the dictionaries (write_csv(), recon_helper) keeps working.
+# A field that is not set is treated as a missing key.
+#
+
+from jpm.schema import HOLDING_FIELDS, CASH_FIELDS
+
+
+
+class Record(object):
+	"""
+	Base class of the records, sub classes define the fields in __slots__.
+	"""
+	__slots__ = ()
+
+	def __init__(self, **kwargs):
+		for key, value in kwargs.items():
+			self[key] = value
+
+
+
+	def __getitem__(self, key):
+		try:
+			return getattr(self, key)
+		except (AttributeError, TypeError):
+			raise KeyError(key)
+
+
+
+	def __setitem__(self, key, value):
+		if not key in self.__slots__:
+			raise KeyError(key)
+		setattr(self, key, value)
+
+
+
+	def __delitem__(self, key):
+		try:
+			delattr(self, key)
+		except (AttributeError, TypeError):
+			raise KeyError(key)
+
+
+
+	def __contains__(self, key):
+		return key in self.__slots__ and hasattr(self, key)
+
+
+
+	def __iter__(self):
+		return iter(self.keys())
+
+
+
+	def __len__(self):
+		return len(self.keys())
+
+
+
+	def __eq__(self, other):
+		if isinstance(other, (Record, dict)):
+			return dict(self.items()) == dict(other.items())
+		return NotImplemented
+
+
+
+	def __repr__(self):
+		return '{0}({1})'.format(type(self).__name__, dict(self.items()))
+
+
+
+	def get(self, key, default=None):
+		try:
+			return self[key]
+		except KeyError:
+			return default
+
+
+
+	def keys(self):
+		return [key for key in self.__slots__ if hasattr(self, key)]
+
+
+
+	def values(self):
+		return [getattr(self, key) for key in self.keys()]
+
+
+
+	def items(self):
+		return [(key, getattr(self, key)) for key in self.keys()]
+
+
+
+	def to_dict(self):
+		return dict(self.items())
+
+
+
+class HoldingPosition(Record):
+	"""
+	A holding position, the fields are those in schema.HOLDING_FIELDS.
+	"""
+	__slots__ = tuple(field.name for field in HOLDING_FIELDS.values())
+
+
+
+class CashPosition(Record):
+	"""
+	A cash position, the fields are those in schema.CASH_FIELDS.
+	"""
+	__slots__ = tuple(field.name for field in CASH_FIELDS.values())
+
+
+
+class Account(Record):
+	"""
+	An account in the statement, holdings and cash are lists of
+	HoldingPosition and CashPosition. An empty account, i.e., 'No Data for
+	this Account', has neither holdings nor cash.
+	"""
+	__slots__ = ('account_code', 'account_name', 'holdings', 'cash')
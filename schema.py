@@ -0,0 +1,182 @@
+# coding=utf-8
+#
+# The layout of the JPM broker statement: maps each header label in the
+# holdings and cash sections to the internal field name and the converter
+# of the cell values under it.
+#
+# To handle a new column in the statement, add an entry to HOLDING_FIELDS
+# or CASH_FIELDS.
+#
+
+from xlrd.xldate import xldate_as_datetime
+from collections import namedtuple
+from jpm.utility import get_datemode
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+"""
+A field in the statement.
+
+name: the internal field name.
+
+converter: the function to convert a cell value (already stripped if it is
+	a string) to the field value, with signature converter(name, cell_value).
+	It returns None if the field is optional and the cell is empty, raises
+	TypeError or ValueError if the cell value is invalid.
+
+row_offset: the row offset of the field in a holding position, relative
+	to the row of its header label. For example, 'Coupon Rate' is in the
+	third row of the holding fields subsection, but the coupon rate itself
+	is in the second row of a holding position, so its row offset is -1.
+"""
+Field = namedtuple('Field', ['name', 'converter', 'row_offset'])
+
+
+
+def _invalid_type(name, cell_value):
+	logger.error('invalid type for field {0}, value={1}'.format(name, cell_value))
+	raise TypeError('invalid data type for field {0}'.format(name))
+
+
+
+def string(name, cell_value):
+	"""
+	mandatory field whose value is string, can be empty
+	"""
+	if isinstance(cell_value, str):
+		return cell_value
+	_invalid_type(name, cell_value)
+
+
+
+def number(name, cell_value):
+	"""
+	mandatory field whose value is float
+	"""
+	if isinstance(cell_value, float):
+		return cell_value
+	_invalid_type(name, cell_value)
+
+
+
+def optional_string(name, cell_value):
+	"""
+	optional field whose value is string, if it is not there, skip it.
+	"""
+	if isinstance(cell_value, str):
+		if cell_value == '':
+			return None
+		return cell_value
+	_invalid_type(name, cell_value)
+
+
+
+def optional_number(name, cell_value):
+	"""
+	optional field whose value is float, if it is not there, skip it.
+	"""
+	if isinstance(cell_value, str) and cell_value == '':
+		return None
+	return number(name, cell_value)
+
+
+
+def percent(name, cell_value):
+	"""
+	optional field in percentage, like coupon rate 5.375 means 5.375%.
+	"""
+	value = optional_number(name, cell_value)
+	if value is None:
+		return None
+	return value/100
+
+
+
+def excel_date(name, cell_value):
+	"""
+	optional field in Excel date, converted to datetime.
+	"""
+	value = optional_number(name, cell_value)
+	if value is None:
+		return None
+	return xldate_as_datetime(value, get_datemode())
+
+
+
+def non_empty_string(name, cell_value):
+	"""
+	mandatory field whose value is a non-empty string
+	"""
+	if not isinstance(cell_value, str):
+		_invalid_type(name, cell_value)
+
+	elif cell_value == '':
+		logger.error('field {0} is empty'.format(name))
+		raise ValueError('field {0} is empty'.format(name))
+
+	return cell_value
+
+
+
+def amount(name, cell_value):
+	"""
+	mandatory field whose value can be converted to float
+	"""
+	try:
+		return float(cell_value)
+	except ValueError:
+		logger.error('field {0} cannot be converted to float, value = {1}'.
+						format(name, cell_value))
+		raise TypeError('failed to read field {0} as float number'.format(name))
+
+
+
+HOLDING_FIELDS = {
+	'Security ID': Field('security_id', string, 0),
+	'Security Name': Field('security_name', string, 0),
+	'Location/Nominee': Field('location_or_nominee', string, 0),
+	'Awaiting Receipt': Field('awaiting_receipt', number, 0),
+	'Settled Units': Field('settled_units', number, 0),
+	'Total Units': Field('total_units', number, 0),
+	'ISIN': Field('isin', string, 0),
+	'Reg./Sub Acct.': Field('regional_or_sub_account', string, 0),
+	'Awaiting Delivery': Field('awaiting_delivery', number, 0),
+	'Current Face-Settled': Field('current_face_settled', optional_number, 0),
+	'Current Face-Total': Field('current_face_total', optional_number, 0),
+	'OCC ID': Field('occ_id', optional_string, 0),
+	'Coupon Rate': Field('coupon_rate', percent, -1),
+	'Maturity Date': Field('maturity_date', excel_date, -1),
+	'Pool Number': Field('pool_number', optional_string, -1),
+	'Country': Field('country', string, 0),
+	'Collateral Units': Field('collateral_units', number, 0),
+	'Borrowed Units': Field('borrowed_units', number, 0)
+}
+
+
+
+CASH_FIELDS = {
+	'Branch Code': Field('branch_code', non_empty_string, 0),
+	'Branch Name': Field('branch_name', non_empty_string, 0),
+	'Cash Account': Field('account_number', non_empty_string, 0),
+	'Cash Account Name': Field('account_name', non_empty_string, 0),
+	'Local CCY': Field('currency', non_empty_string, 0),
+	'DGSD Eligible': Field('dgsd_eligible', non_empty_string, 0),
+	'Opening Cash Balance': Field('opening_balance', amount, 0),
+	'Closing Cash Balance': Field('closing_balance', amount, 0)
+}
+
+
+
+# the same fields, keyed by the internal field name
+HOLDING_FIELDS_BY_NAME = dict((f.name, f) for f in HOLDING_FIELDS.values())
+CASH_FIELDS_BY_NAME = dict((f.name, f) for f in CASH_FIELDS.values())
+
+
+
+# the quantity fields of a holding position, also the fields in the
+# holdings sub total of an account.
+QUANTITY_FIELDS = ['awaiting_receipt', 'settled_units', 'total_units',
+					'awaiting_delivery', 'current_face_settled',
+					'current_face_total']
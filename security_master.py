@@ -0,0 +1,159 @@
+# coding=utf-8
+#
+# The security master: investment ids and currencies of the securities in
+# a statement, indexed in dictionaries, so that writing the holding csv file
+# costs one lookup per distinct security, not one per holding row.
+#
+# The currencies can be preloaded from the lookup workbook (the "workbook"
+# setting in the [lookup] section of jpm.config), a sheet with columns
+# security_id_type, security_id and currency, see samples/sample_lookup.xls.
+# The investment ids depend on the portfolio (e.g., HTM bonds), so they are
+# always resolved by investment_lookup, once per distinct (portfolio,
+# security id type, security id) in one bulk call.
+#
+# A security master is for one statement, see get_security_master(). Only
+# the currencies from the workbook are kept for the whole process, the
+# investment ids are kept across statements by the bounded caches in
+# lookup_cache.py, and both are dropped by lookup_cache.clear_caches().
+#
+
+from xlrd import open_workbook
+from jpm.utility import get_lookup_workbook
+from jpm.lookup_cache import lookup_investment_ids, lookup_currency
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+def security_key(portfolio_id, position):
+	"""
+	Return the key (portfolio_id, security_id_type, security_id) to look up
+	the investment ids of a holding position. The ISIN is used, if it is
+	empty, then the JPM security id.
+	"""
+	if position['isin'] == '':
+		return (portfolio_id, 'JPM', position['security_id'])
+	else:
+		return (portfolio_id, 'ISIN', position['isin'])
+
+
+
+def _to_string(cell_value):
+	"""
+	Security ids like 12345 are read as float from the workbook.
+	"""
+	if isinstance(cell_value, float) and cell_value.is_integer():
+		return str(int(cell_value))
+	return str.strip(str(cell_value))
+
+
+
+class SecurityMaster(object):
+	"""
+	Hash indexes of the investment ids, keyed by (portfolio_id,
+	security_id_type, security_id), and currencies, keyed by
+	(security_id_type, security_id).
+	"""
+	def __init__(self, lookup_file=None, currencies=None):
+		self.investment_ids = {}
+		self.currencies = {} if currencies is None else currencies
+		if lookup_file:
+			self.load(lookup_file)
+
+
+
+	def load(self, lookup_file):
+		"""
+		Load the currencies from the lookup workbook, i.e., every sheet with
+		columns security_id_type, security_id and currency.
+		"""
+		logger.debug('SecurityMaster.load(): {0}'.format(lookup_file))
+		wb = open_workbook(filename=lookup_file)
+		for ws in wb.sheets():
+			if ws.nrows == 0:
+				continue
+
+			header = [str.strip(str(cell_value)) for cell_value in ws.row_values(0)]
+			try:
+				id_type_column = header.index('security_id_type')
+				id_column = header.index('security_id')
+				currency_column = header.index('currency')
+			except ValueError:	# not a currency sheet
+				continue
+
+			for row in range(1, ws.nrows):
+				row_values = ws.row_values(row)
+				currency = _to_string(row_values[currency_column])
+				if currency == '':
+					continue
+
+				key = (_to_string(row_values[id_type_column]),
+						_to_string(row_values[id_column]))
+				self.currencies[key] = currency
+
+		wb.release_resources()
+
+
+
+	def resolve(self, keys):
+		"""
+		Look up the investment ids of all the keys (see security_key()) not
+		yet in the index, each distinct key is looked up once.
+		"""
+		for key in set(keys):
+			if not key in self.investment_ids:
+				self.investment_ids[key] = lookup_investment_ids(*key)
+
+
+
+	def get_investment_ids(self, portfolio_id, security_id_type, security_id):
+		key = (portfolio_id, security_id_type, security_id)
+		try:
+			return self.investment_ids[key]
+		except KeyError:
+			self.resolve([key])
+			return self.investment_ids[key]
+
+
+
+	def get_currency(self, security_id_type, security_id):
+		"""
+		Return the currency from the index, if it is not there, look it up
+		by investment_lookup (exception is raised if it is not found).
+		"""
+		try:
+			return self.currencies[(security_id_type, security_id)]
+		except KeyError:
+			return lookup_currency(security_id_type, security_id)
+
+
+
+# currencies loaded from the lookup workbook, once per process, see
+# get_security_master()
+_currencies = None
+
+
+
+def get_security_master():
+	"""
+	Return a new security master for one statement. The currencies are
+	loaded from the lookup workbook in the config file the first time it
+	is called, then shared by the masters of later statements. The
+	investment ids resolved are dropped with the master, later statements
+	find them in the lookup cache.
+	"""
+	global _currencies
+	if _currencies is None:
+		_currencies = SecurityMaster(get_lookup_workbook()).currencies
+
+	return SecurityMaster(currencies=_currencies)
+
+
+
+def clear_currencies():
+	"""
+	Drop the currencies loaded from the lookup workbook, they are loaded
+	again by the next get_security_master().
+	"""
+	global _currencies
+	_currencies = None
@@ -0,0 +1,208 @@
+# coding=utf-8
+#
+# Conversion server: a long running process that converts statements on
+# request, so a scheduler does not have to start open_jpm.py for each
+# statement and pay for the interpreter startup, imports, config and the
+# lookup tables every time.
+#
+# The protocol is one JSON object per line, over a local TCP socket (or a
+# Unix socket, see [server] in jpm.config). A request looks like:
+#
+#	{"filename": "statement.xls", "output_dir": "...", "file_prefix": "..."}
+#
+# where output_dir and file_prefix are optional, a relative filename is
+# relative to the input directory. The response is:
+#
+#	{"filename": "...", "output_files": [...], "error": null}
+#
+# where error is the error message if the conversion fails. The statements
+# are converted in a pool of worker processes, which are all started (and
+# the lookup workbook loaded, if there is one in the [lookup] section of
+# jpm.config) before the server listens, so the first request does not wait
+# for them. The workers are spawned, not forked, so they do not hold copies
+# of the server and client sockets.
+#
+
+import asyncio, json, os, socket, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from jpm.utility import get_input_directory, get_max_workers, \
+						get_server_host, get_server_port, get_server_unix_socket
+from jpm.security_master import get_security_master
+from jpm.batch import convert_statement
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+def warm_up():
+	"""
+	Run once in each worker process when it starts, so the imports are done
+	and the currencies in the lookup workbook (if any) are loaded before
+	the first request.
+	"""
+	get_security_master()
+
+
+
+def create_executor(max_workers=None):
+	"""
+	Create the pool of worker processes and start all of them, if
+	max_workers is None, it is read from the [batch] section of the config
+	file.
+
+	A worker process is started only when a task is submitted, so one
+	task is submitted for each worker and waited for here.
+	"""
+	if max_workers is None:
+		max_workers = get_max_workers() or os.cpu_count()
+
+	executor = ProcessPoolExecutor(max_workers=max_workers, initializer=warm_up,
+									mp_context=multiprocessing.get_context('spawn'))
+	wait([executor.submit(os.getpid) for i in range(max_workers)])
+	logger.debug('create_executor(): {0} workers started'.format(max_workers))
+	return executor
+
+
+
+def convert_request(request):
+	"""
+	Convert the statement of a request (a dictionary), return the response
+	dictionary. It runs in a worker process.
+	"""
+	filename = os.path.join(get_input_directory(), request['filename'])
+	filename, output_files, error = convert_statement(filename,
+								request.get('output_dir'), request.get('file_prefix'))
+	return {'filename': filename, 'output_files': output_files, 'error': error}
+
+
+
+def parse_request(line):
+	"""
+	Parse a request line into a dictionary, ValueError is raised if it is
+	not a valid request.
+	"""
+	request = json.loads(line.decode('utf-8'))
+	if not isinstance(request, dict) or not isinstance(request.get('filename'), str):
+		raise ValueError('request must be a JSON object with a "filename"')
+
+	return request
+
+
+
+async def handle_connection(reader, writer, executor):
+	"""
+	Serve the requests of one client connection, one at a time, until the
+	client closes the connection.
+	"""
+	loop = asyncio.get_running_loop()
+	while True:
+		line = await reader.readline()
+		if not line:
+			break
+
+		try:
+			request = parse_request(line)
+		except ValueError as e:	# json.JSONDecodeError is also ValueError
+			logger.error('handle_connection(): invalid request: {0}'.format(line))
+			response = {'filename': None, 'output_files': [],
+						'error': 'invalid request: {0}'.format(e)}
+		else:
+			logger.debug('handle_connection(): {0}'.format(request))
+			response = await run_request(loop, executor, request)
+
+		writer.write(json.dumps(response).encode('utf-8') + b'\n')
+		await writer.drain()
+
+	writer.close()
+	await writer.wait_closed()
+
+
+
+async def run_request(loop, executor, request):
+	"""
+	Run convert_request() in the executor. If it fails there, e.g., a worker
+	process dies (BrokenProcessPool), the error goes into the response, so
+	the client still gets a response line.
+	"""
+	try:
+		return await loop.run_in_executor(executor, convert_request, request)
+	except Exception as e:
+		logger.exception('run_request(): {0}'.format(request))
+		return {'filename': request['filename'], 'output_files': [],
+				'error': '{0}: {1}'.format(type(e).__name__, e)}
+
+
+
+async def start_server(executor, host=None, port=None, unix_socket=None):
+	"""
+	Start listening, return the asyncio server. If unix_socket is given,
+	listen on the Unix socket, otherwise on host and port (from the config
+	file if not given).
+	"""
+	def client_connected(reader, writer):
+		return handle_connection(reader, writer, executor)
+
+	if unix_socket is not None:
+		return await asyncio.start_unix_server(client_connected, path=unix_socket)
+
+	if host is None:
+		host = get_server_host()
+	if port is None:
+		port = get_server_port()
+
+	return await asyncio.start_server(client_connected, host, port)
+
+
+
+async def serve(max_workers=None):
+	"""
+	Run the server until it is cancelled.
+	"""
+	with create_executor(max_workers) as executor:
+		server = await start_server(executor, unix_socket=get_server_unix_socket())
+		for sock in server.sockets:
+			print('listening on {0}'.format(sock.getsockname()))
+
+		async with server:
+			await server.serve_forever()
+
+
+
+def request_conversion(filename, output_dir=None, file_prefix=None,
+						host=None, port=None, unix_socket=None):
+	"""
+	Client side: send one conversion request to the server and wait for the
+	response, a dictionary as described at the top of this file.
+	"""
+	request = {'filename': filename}
+	if output_dir is not None:
+		request['output_dir'] = output_dir
+	if file_prefix is not None:
+		request['file_prefix'] = file_prefix
+
+	if unix_socket is not None:
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		sock.connect(unix_socket)
+	else:
+		sock = socket.create_connection((host or get_server_host(),
+											port or get_server_port()))
+
+	with sock, sock.makefile('rwb') as f:
+		f.write(json.dumps(request).encode('utf-8') + b'\n')
+		f.flush()
+		return json.loads(f.readline().decode('utf-8'))
+
+
+
+if __name__ == '__main__':
+	import sys, logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	max_workers = None
+	if len(sys.argv) > 1:
+		max_workers = int(sys.argv[1])
+
+	try:
+		asyncio.run(serve(max_workers))
+	except KeyboardInterrupt:
+		print('stopped.')
@@ -0,0 +1,206 @@
+# coding=utf-8
+#
+# A parsed statement with hash indexes over its positions, so that finding
+# the holdings of an ISIN, a JPM security id, a Geneva portfolio or a
+# currency is one dictionary lookup instead of a loop over all accounts,
+# e.g., to match the positions against Geneva:
+#
+#	statement = Statement(load_statement(filename))
+#	for position in statement.holdings_by_isin('HK3377040226'):
+#		portfolio_id = statement.get_portfolio_id(position)
+#
+# An index is built the first time it is used, then kept. The statement
+# must not be changed after that, otherwise the indexes are out of date.
+#
+
+from jpm.open_jpm import map_portfolio_id, is_empty_account, \
+						get_holding_currency, InvalidAccountCode
+from jpm.security_master import get_security_master
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+class Statement(object):
+	"""
+	Wrap the port_values of a statement (see read_jpm()). The lookups
+	return a list of positions (or accounts) in statement order, an empty
+	list if there is none.
+	"""
+	def __init__(self, port_values, master=None):
+		self.port_values = port_values
+		self.date = port_values['date']
+		self.accounts = port_values['accounts']
+		self._master = master
+		self._indexes = {}
+
+
+
+	def holdings(self):
+		"""
+		Return (account, position) of all the holding positions.
+		"""
+		for account in self.accounts:
+			if is_empty_account(account):
+				continue
+			for position in account.get('holdings', []):
+				yield account, position
+
+
+
+	def cash(self):
+		"""
+		Return (account, position) of all the cash positions.
+		"""
+		for account in self.accounts:
+			if is_empty_account(account):
+				continue
+			for position in account.get('cash', []):
+				yield account, position
+
+
+
+	def _get_index(self, name):
+		try:
+			return self._indexes[name]
+		except KeyError:
+			pass
+
+		logger.debug('Statement._get_index(): build {0}'.format(name))
+		index = {}
+		for key, value in getattr(self, '_index_' + name)():
+			index.setdefault(key, []).append(value)
+
+		self._indexes[name] = index
+		return index
+
+
+
+	def _lookup(self, name, key):
+		return self._get_index(name).get(key, [])
+
+
+
+	# the _index_<name>() methods give (key, value) of each item in the index
+
+	def _index_isin(self):
+		for account, position in self.holdings():
+			if position['isin'] != '':
+				yield position['isin'], position
+
+
+
+	def _index_security_id(self):
+		for account, position in self.holdings():
+			yield position['security_id'], position
+
+
+
+	def _index_portfolio(self):
+		"""
+		Empty accounts are left out, so are accounts whose account code has
+		no Geneva portfolio, the rest of the statement is still indexed.
+		"""
+		for account in self.accounts:
+			if is_empty_account(account):
+				continue
+			try:
+				portfolio_id = map_portfolio_id(account['account_code'])
+			except InvalidAccountCode:
+				logger.warning('Statement._index_portfolio(): no portfolio for account {0}'.
+								format(account['account_code']))
+				continue
+
+			yield portfolio_id, account
+
+
+
+	def _index_holding_currency(self):
+		master = self._master
+		if master is None:
+			master = get_security_master()
+
+		for account, position in self.holdings():
+			yield get_holding_currency(position, master), position
+
+
+
+	def _index_cash_currency(self):
+		for account, position in self.cash():
+			yield position['currency'], position
+
+
+
+	def _index_account(self):
+		"""
+		id of a position -> the account it is in.
+		"""
+		for account, position in self.holdings():
+			yield id(position), account
+		for account, position in self.cash():
+			yield id(position), account
+
+
+
+	def holdings_by_isin(self, isin):
+		return self._lookup('isin', isin)
+
+
+
+	def holdings_by_security_id(self, security_id):
+		return self._lookup('security_id', security_id)
+
+
+
+	def holdings_by_currency(self, currency):
+		"""
+		The currency of a holding position is from its security name, or
+		the security master if it is not in the name, see
+		get_holding_currency(). So building this index may call
+		investment_lookup.
+		"""
+		return self._lookup('holding_currency', currency)
+
+
+
+	def cash_by_currency(self, currency):
+		return self._lookup('cash_currency', currency)
+
+
+
+	def accounts_by_portfolio(self, portfolio_id):
+		"""
+		The accounts whose account code maps to the Geneva portfolio id, see
+		map_portfolio_id(), empty accounts are not included.
+		"""
+		return self._lookup('portfolio', portfolio_id)
+
+
+
+	def holdings_by_portfolio(self, portfolio_id):
+		return [position for account in self.accounts_by_portfolio(portfolio_id)
+				if not is_empty_account(account)
+				for position in account.get('holdings', [])]
+
+
+
+	def cash_by_portfolio(self, portfolio_id):
+		return [position for account in self.accounts_by_portfolio(portfolio_id)
+				if not is_empty_account(account)
+				for position in account.get('cash', [])]
+
+
+
+	def get_account(self, position):
+		"""
+		Return the account of a holding or cash position in this statement.
+		"""
+		accounts = self._lookup('account', id(position))
+		if len(accounts) == 0:
+			raise KeyError('position not in the statement')
+		return accounts[0]
+
+
+
+	def get_portfolio_id(self, position):
+		return map_portfolio_id(self.get_account(position)['account_code'])
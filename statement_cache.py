@@ -0,0 +1,158 @@
+# coding=utf-8
+#
+# On disk cache of parsed statements. A parsed statement (port_values) is
+# pickled and compressed into a file named after the hash of the statement
+# file content, the parser version and the settings the parser depends on
+# (like the excel datemode), so re-running the same statement skips opening
+# and parsing the excel file. Changing the statement, the parser or those
+# settings gives a different key, so stale entries are never used.
+#
+# When the total size of the cache exceeds the limit, the least recently
+# used entries are removed.
+#
+
+import hashlib, os, pickle, tempfile, zlib
+from jpm.utility import get_cache_directory, get_cache_max_size
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+CACHE_FILE_SUFFIX = '.statement'
+
+
+
+def file_hash(filename):
+	"""
+	Return the SHA-256 of the file content, as a hex string.
+	"""
+	sha = hashlib.sha256()
+	with open(filename, 'rb') as f:
+		for block in iter(lambda: f.read(1024*1024), b''):
+			sha.update(block)
+
+	return sha.hexdigest()
+
+
+
+def file_key(filename, version, settings=None):
+	"""
+	Return the cache key of a statement file: the SHA-256 of its content,
+	the parser version and the settings (a dictionary) that change the
+	parsed result.
+	"""
+	key = '{0}|parser version {1}'.format(file_hash(filename), version)
+	if settings:
+		key = key + ''.join('|{0}={1}'.format(name, settings[name])
+								for name in sorted(settings))
+
+	return hashlib.sha256(key.encode()).hexdigest()
+
+
+
+class StatementCache(object):
+	"""
+	The cache directory, with at most max_size bytes of cache files.
+	"""
+	def __init__(self, directory=None, max_size=None):
+		if directory is None:
+			directory = get_cache_directory()
+		if max_size is None:
+			max_size = get_cache_max_size()
+
+		self.directory = directory
+		self.max_size = max_size
+
+
+
+	def _path(self, key):
+		return os.path.join(self.directory, key + CACHE_FILE_SUFFIX)
+
+
+
+	def get(self, key):
+		"""
+		Return the cached statement of key, or None if it is not there.
+		"""
+		path = self._path(key)
+		try:
+			with open(path, 'rb') as f:
+				value = pickle.loads(zlib.decompress(f.read()))
+		except FileNotFoundError:
+			return None
+		except Exception:	# a broken cache file is treated as not there
+			logger.exception('StatementCache.get(): failed to read {0}'.format(path))
+			return None
+
+		os.utime(path)	# mark it recently used
+		logger.debug('StatementCache.get(): hit {0}'.format(path))
+		return value
+
+
+
+	def put(self, key, value):
+		"""
+		Save a statement into the cache, then remove the least recently used
+		entries if the cache is too large.
+		"""
+		os.makedirs(self.directory, exist_ok=True)
+		data = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+		# write to a temp file first, so that other processes never see a
+		# partly written cache file
+		fd, temp_file = tempfile.mkstemp(dir=self.directory)
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write(data)
+			os.replace(temp_file, self._path(key))
+		except:
+			os.remove(temp_file)
+			raise
+
+		self.evict()
+
+
+
+	def evict(self):
+		"""
+		Remove the least recently used cache files until the total size is
+		within max_size.
+		"""
+		entries = []
+		total_size = 0
+		for filename in os.listdir(self.directory):
+			if not filename.endswith(CACHE_FILE_SUFFIX):
+				continue
+
+			path = os.path.join(self.directory, filename)
+			try:
+				stat = os.stat(path)
+			except FileNotFoundError:	# removed by another process
+				continue
+
+			entries.append((stat.st_mtime, stat.st_size, path))
+			total_size = total_size + stat.st_size
+
+		for mtime, size, path in sorted(entries):
+			if total_size <= self.max_size:
+				break
+
+			logger.debug('StatementCache.evict(): remove {0}'.format(path))
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+			total_size = total_size - size
+
+
+
+	def clear(self):
+		"""
+		Remove all the cache files.
+		"""
+		if not os.path.isdir(self.directory):
+			return
+
+		for filename in os.listdir(self.directory):
+			if filename.endswith(CACHE_FILE_SUFFIX):
+				os.remove(os.path.join(self.directory, filename))
@@ -0,0 +1,137 @@
+"""
+Test the archive.py
+"""
+
+import unittest2
+import datetime, os, shutil, tempfile
+from jpm.open_jpm import read_jpm, archive_statement, write_csv, \
+                            get_security_keys
+from jpm.archive import PositionArchive
+from jpm.benchmark.synthetic import generate_statement, SyntheticSheet
+from jpm.lookup_cache import seed_investment_ids
+
+
+
+class TestArchive(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestArchive, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        self.directory = tempfile.mkdtemp()
+        self.archive = PositionArchive(os.path.join(self.directory, 'archive.db'))
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        self.archive.close()
+        shutil.rmtree(self.directory)
+
+
+
+    def read_statement(self, date):
+        ws = SyntheticSheet(generate_statement(accounts=2, holdings=5, cash=2,
+                                                date=date))
+        port_values = {}
+        read_jpm(ws, port_values)
+        for key in get_security_keys(port_values['accounts']):
+            seed_investment_ids(key, ('', key[2], ''))
+        return port_values
+
+
+
+    def test_archive_statement(self):
+        for day in [6, 7, 8]:
+            port_values = self.read_statement(datetime.date(2016,7,day))
+            archive_statement(port_values, self.archive)
+
+        self.assertEqual(self.archive.dates(), ['2016-07-06', '2016-07-07', '2016-07-08'])
+        self.assertEqual(self.archive.dates('11490'), ['2016-07-06', '2016-07-07', '2016-07-08'])
+        self.assertEqual(self.archive.dates('99999'), [])
+
+        position = port_values['accounts'][0]['holdings'][0]
+        history = self.archive.holdings_history(portfolio='11490',
+                                                isin=position['isin'])
+        self.assertEqual([h['date'] for h in history],
+                            ['2016-07-06', '2016-07-07', '2016-07-08'])
+        self.assertEqual(history[-1]['security_id'], position['security_id'])
+        self.assertEqual(history[-1]['account_code'], '48029')
+        self.assertEqual(history[-1]['settled_units'], position['settled_units'])
+
+        history = self.archive.holdings_history(portfolio='11490',
+                                                start=datetime.date(2016,7,7),
+                                                end='2016-07-07')
+        self.assertEqual(len(history), 5)
+
+        cash = self.archive.cash_history(portfolio='12341')
+        self.assertEqual(len(cash), 6)
+        self.assertEqual(cash[0]['account_number'],
+                            port_values['accounts'][1]['cash'][0]['account_number'])
+
+
+
+    def test_add_again(self):
+        """
+        Adding the same statement date again replaces the rows.
+        """
+        port_values = self.read_statement(datetime.date(2016,7,6))
+        archive_statement(port_values, self.archive)
+        archive_statement(port_values, self.archive)
+        self.assertEqual(len(self.archive.holdings_history()), 10)
+        self.assertEqual(len(self.archive.cash_history()), 4)
+
+
+
+    def test_add_again_no_rows(self):
+        """
+        Adding a statement date again deletes the old rows of its portfolios,
+        even if they have no rows now.
+        """
+        port_values = self.read_statement(datetime.date(2016,7,6))
+        archive_statement(port_values, self.archive)
+        for account in port_values['accounts']:
+            account['holdings'] = []
+            account['cash'] = []
+
+        archive_statement(port_values, self.archive)
+        self.assertEqual(self.archive.holdings_history(), [])
+        self.assertEqual(self.archive.cash_history(), [])
+
+
+
+    def test_bond_fields(self):
+        port_values = self.read_statement(datetime.date(2016,7,6))
+        archive_statement(port_values, self.archive)
+        bonds = [p for account in port_values['accounts'][:2]
+                    for p in account['holdings'] if 'maturity_date' in p]
+        history = self.archive.holdings_history(security_id=bonds[0]['security_id'])
+        self.assertEqual(history[0]['maturity_date'],
+                            bonds[0]['maturity_date'].strftime('%Y-%m-%d'))
+        self.assertAlmostEqual(history[0]['coupon_rate'], bonds[0]['coupon_rate'])
+
+
+
+    def test_query_plan(self):
+        """
+        The queries by ISIN and by security id use the indexes.
+        """
+        for sql in ['SELECT * FROM holdings WHERE isin=? AND currency=?',
+                    'SELECT * FROM holdings WHERE security_id=?',
+                    'SELECT * FROM holdings WHERE portfolio=? AND date>=?']:
+            plan = ' '.join(str(tuple(row)) for row in self.archive.connection.
+                                execute('EXPLAIN QUERY PLAN ' + sql,
+                                        ['x']*sql.count('?')))
+            self.assertTrue('USING INDEX' in plan, plan)
+
+
+
+    def test_write_csv(self):
+        port_values = self.read_statement(datetime.date(2016,7,6))
+        write_csv(port_values, self.directory, 'test_', self.archive)
+        self.assertEqual(len(self.archive.holdings_history()), 10)
@@ -0,0 +1,86 @@
+"""
+Test the arrow_output.py
+"""
+
+import unittest2
+import datetime, os, shutil, tempfile
+from jpm.open_jpm import read_jpm, write_arrow, get_security_keys
+from jpm.arrow_output import is_available, make_table, write_table, read_table
+from jpm.benchmark.synthetic import generate_statement, SyntheticSheet
+from jpm.lookup_cache import seed_investment_ids
+
+
+
+@unittest2.skipIf(not is_available(), 'pyarrow not installed')
+class TestArrowOutput(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestArrowOutput, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        self.directory = tempfile.mkdtemp()
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        shutil.rmtree(self.directory)
+
+
+
+    def test_make_table(self):
+        header = ['portfolio', 'date', 'coupon_rate', 'maturity_date']
+        rows = [['12548', datetime.datetime(2016,7,6), 0.05375, datetime.datetime(2017,3,8)],
+                ['12548', datetime.datetime(2016,7,6), '', '']]
+        table = make_table(header, rows)
+        self.assertEqual(str(table.schema.field('portfolio').type), 'string')
+        self.assertEqual(str(table.schema.field('date').type), 'date32[day]')
+        self.assertEqual(str(table.schema.field('coupon_rate').type), 'double')
+        self.assertEqual(table.column('coupon_rate').to_pylist(), [0.05375, None])
+        self.assertEqual(table.column('maturity_date').to_pylist(),
+                            [datetime.date(2017,3,8), None])
+
+        # no rows
+        self.assertEqual(make_table(header, []).num_rows, 0)
+
+
+
+    def test_write_table(self):
+        header = ['portfolio', 'opening_balance']
+        rows = [['12548', 100.5], ['12857', 0.0]]
+        for file_format, extension in [('parquet', '.parquet'), ('arrow', '.arrow')]:
+            filename = os.path.join(self.directory, 'test' + extension)
+            write_table(header, rows, filename, file_format)
+            table = read_table(filename)
+            self.assertEqual(table.column('opening_balance').to_pylist(), [100.5, 0.0])
+
+        with self.assertRaises(ValueError):
+            write_table(header, rows, filename, 'csv')
+
+
+
+    def test_write_arrow(self):
+        ws = SyntheticSheet(generate_statement(accounts=3, holdings=5, cash=2))
+        port_values = {}
+        read_jpm(ws, port_values)
+        for key in get_security_keys(port_values['accounts']):
+            seed_investment_ids(key, ('', key[2], ''))
+
+        cash_file, holding_file = write_arrow(port_values, self.directory, 'test_')
+        self.assertTrue(cash_file.endswith('test_2016-7-6_cash.parquet'))
+        cash = read_table(cash_file)
+        self.assertEqual(cash.num_rows, 6)
+        self.assertEqual(cash.column('date').to_pylist()[0], datetime.date(2016,7,6))
+
+        holdings = read_table(holding_file)
+        self.assertEqual(holdings.num_rows, 15)
+        bonds = [position for account in port_values['accounts'][:3]
+                    for position in account['holdings'] if 'maturity_date' in position]
+        maturity_dates = [d for d in holdings.column('maturity_date').to_pylist()
+                            if d is not None]
+        self.assertEqual(maturity_dates, [p['maturity_date'].date() for p in bonds])
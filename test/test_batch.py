@@ -0,0 +1,58 @@
+"""
+Test the batch.py
+"""
+
+import unittest2
+import os
+from jpm.utility import get_current_path
+from jpm.batch import find_statements, convert_statements
+
+
+
+class TestBatch(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestBatch, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        pass
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        pass
+
+
+
+    def test_find_statements(self):
+        filenames = find_statements(os.path.join(get_current_path(), 'samples'))
+        self.assertEqual(len(filenames), 11)
+        self.assertTrue(os.path.join(get_current_path(), 'samples', 'statement.xls') in filenames)
+        self.assertTrue(os.path.join(get_current_path(), 'samples', 'statement.xlsx') in filenames)
+
+
+
+    def test_convert_statements(self):
+        """
+        Failed statements should be reported, not stop the batch.
+        """
+        filenames = [get_current_path() + '\\samples\\holding_error.xls',
+                        get_current_path() + '\\samples\\date_error.xls']
+
+        results = convert_statements(filenames, 2)
+        self.assertEqual(len(results), 2)
+
+        filename, output_files, error = results[0]
+        self.assertEqual(filename, filenames[0])
+        self.assertEqual(output_files, [])
+        self.assertTrue(error.startswith('InconsistentSubtotal'))
+
+        filename, output_files, error = results[1]
+        self.assertEqual(filename, filenames[1])
+        self.assertTrue(error.startswith('ValueError'))
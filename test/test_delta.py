@@ -0,0 +1,238 @@
+"""
+Test the delta.py
+"""
+
+import unittest2
+import datetime, csv, os, shutil, tempfile
+from jpm.open_jpm import read_jpm, archive_statement, write_delta, \
+                            get_security_keys, convert_jpm, \
+                            get_previous_records, CASH_DELTA_HEADER
+from jpm.archive import PositionArchive
+from jpm.delta import compare_rows, HOLDING_KEY, CASH_KEY
+from jpm.benchmark.synthetic import generate_statement, SyntheticSheet, \
+                                    save_xlsx
+import jpm.utility
+from jpm.lookup_cache import seed_investment_ids
+
+
+
+class TestDelta(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestDelta, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        self.directory = tempfile.mkdtemp()
+        self.archive_file = os.path.join(self.directory, 'archive.db')
+        self.archive = PositionArchive(self.archive_file)
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        self.archive.close()
+        shutil.rmtree(self.directory)
+
+
+
+    def read_statement(self, date):
+        ws = SyntheticSheet(generate_statement(accounts=2, holdings=5, cash=2,
+                                                date=date))
+        port_values = {}
+        read_jpm(ws, port_values)
+        for key in get_security_keys(port_values['accounts']):
+            seed_investment_ids(key, ('', key[2], ''))
+        return port_values
+
+
+
+    def read_delta_file(self, filename):
+        with open(filename, newline='') as f:
+            rows = list(csv.reader(f, delimiter='|'))
+        os.remove(filename)
+        return rows
+
+
+
+    def test_compare_rows(self):
+        previous_rows = [{'portfolio': '1', 'security_id': 'A', 'date': '2016-07-06', 'units': 100},
+                        {'portfolio': '1', 'security_id': 'B', 'date': '2016-07-06', 'units': 200},
+                        {'portfolio': '1', 'security_id': 'C', 'date': '2016-07-06', 'units': 300}]
+        rows = [{'portfolio': '1', 'security_id': 'A', 'date': '2016-07-07', 'units': 100},
+                {'portfolio': '1', 'security_id': 'B', 'date': '2016-07-07', 'units': 250},
+                {'portfolio': '2', 'security_id': 'C', 'date': '2016-07-07', 'units': 300}]
+        delta = compare_rows(previous_rows, rows, HOLDING_KEY)
+        self.assertEqual([(change, row['portfolio'], row['security_id'])
+                            for change, row in delta],
+                            [('changed', '1', 'B'), ('added', '2', 'C'),
+                            ('removed', '1', 'C')])
+        self.assertEqual(delta[0][1]['units'], 250)
+
+
+
+    def test_compare_duplicate_keys(self):
+        previous_rows = [{'portfolio': '1', 'account_number': 'X', 'currency': 'HKD', 'balance': 1},
+                        {'portfolio': '1', 'account_number': 'X', 'currency': 'HKD', 'balance': 2}]
+        rows = [{'portfolio': '1', 'account_number': 'X', 'currency': 'HKD', 'balance': 1}]
+        delta = compare_rows(previous_rows, rows, CASH_KEY)
+        self.assertEqual(len(delta), 1)
+        self.assertEqual(delta[0][0], 'removed')
+        self.assertEqual(delta[0][1]['balance'], 2)
+
+
+
+    def test_write_delta(self):
+        port_values = self.read_statement(datetime.date(2016,7,6))
+        archive_statement(port_values, self.archive)
+
+        port_values = self.read_statement(datetime.date(2016,7,7))
+        holdings = port_values['accounts'][0]['holdings']
+        holdings[0]['settled_units'] = holdings[0]['settled_units'] + 1000
+        removed = holdings.pop(1)
+        output_files = write_delta(port_values, self.directory, 'test_',
+                                    self.archive)
+        self.assertEqual(len(output_files), 2)
+        self.assertTrue(output_files[0].endswith('2016-7-7_cash_delta.csv'))
+        self.assertTrue(output_files[1].endswith('2016-7-7_position_delta.csv'))
+
+        rows = self.read_delta_file(output_files[0])
+        self.assertEqual(rows[0][:3], ['change', 'portfolio', 'date'])
+        self.assertEqual(len(rows), 1)  # no change in cash
+
+        rows = self.read_delta_file(output_files[1])
+        self.assertEqual(rows[0][-1], 'security_id')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][0], 'changed')
+        self.assertEqual(rows[1][-1], holdings[0]['security_id'])
+        self.assertEqual(rows[1][2], '2016-7-7')
+        self.assertEqual(rows[2][0], 'removed')
+        self.assertEqual(rows[2][-1], removed['security_id'])
+        self.assertEqual(rows[2][2], '2016-7-6')
+
+
+
+    def test_write_delta_no_previous(self):
+        """
+        Without a previous date, every position is added.
+        """
+        port_values = self.read_statement(datetime.date(2016,7,6))
+        output_files = write_delta(port_values, self.directory, 'test_',
+                                    self.archive)
+        rows = self.read_delta_file(output_files[0])
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(set(row[0] for row in rows[1:]), set(['added']))
+        rows = self.read_delta_file(output_files[1])
+        self.assertEqual(len(rows), 11)
+
+
+
+    def test_write_delta_previous_statement(self):
+        previous = self.read_statement(datetime.date(2016,7,6))
+        port_values = self.read_statement(datetime.date(2016,7,7))
+        port_values['accounts'][1]['cash'][0]['closing_balance'] = 0
+        output_files = write_delta(port_values, self.directory, 'test_',
+                                    previous=previous)
+        rows = self.read_delta_file(output_files[0])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][0], 'changed')
+        self.assertEqual(rows[1][-1],
+                            port_values['accounts'][1]['cash'][0]['account_number'])
+        rows = self.read_delta_file(output_files[1])
+        self.assertEqual(len(rows), 1)
+
+
+
+    def save_statement(self, date, closing_balance=None):
+        """
+        Save a synthetic statement as an .xlsx file, the closing balance of
+        its first cash account is changed if closing_balance is given.
+        """
+        rows = generate_statement(accounts=2, holdings=3, cash=2,
+                                    empty_accounts=0, date=date)
+        if closing_balance is not None:
+            for row in rows:
+                if len(row) > 9 and row[4] == '00000000':
+                    row[9] = closing_balance
+
+        port_values = {}
+        read_jpm(SyntheticSheet(rows), port_values)
+        for key in get_security_keys(port_values['accounts']):
+            seed_investment_ids(key, ('', key[2], ''))
+
+        filename = os.path.join(self.directory, 'statement{0}.xlsx'.format(date.day))
+        save_xlsx(rows, filename)
+        return filename
+
+
+
+    def test_convert_jpm_delta(self):
+        """
+        convert_jpm() writes the delta against the archive, the statement
+        is archived even if use_archive is False.
+        """
+        config = jpm.utility.config['archive']
+        database = config['database']
+        config['database'] = self.archive_file
+        try:
+            filename = self.save_statement(datetime.date(2016,7,6))
+            output_files = convert_jpm(filename, self.directory, 'test_',
+                                        use_cache=False, use_archive=True,
+                                        delta=True)
+            self.assertEqual(len(output_files), 4)
+            self.assertTrue(output_files[2].endswith('2016-7-6_cash_delta.csv'))
+            rows = self.read_delta_file(output_files[2])
+            self.assertEqual(len(rows), 5)  # no previous date, all added
+            self.assertEqual(set(row[0] for row in rows[1:]), set(['added']))
+
+            filename = self.save_statement(datetime.date(2016,7,7), 1234.5)
+            output_files = convert_jpm(filename, self.directory, 'test_',
+                                        use_cache=False, use_archive=False,
+                                        delta=True)
+            self.assertTrue(output_files[3].endswith('2016-7-7_position_delta.csv'))
+            self.assertEqual(len(self.read_delta_file(output_files[3])), 1)
+            rows = self.read_delta_file(output_files[2])
+            self.assertEqual(len(rows), 2)
+            self.assertEqual(rows[1][0], 'changed')
+            self.assertEqual(rows[1][-1], '00000000')
+            self.assertEqual(float(rows[1][CASH_DELTA_HEADER.index('closing_balance')]),
+                                1234.5)
+
+            # the second statement is archived for the next delta
+            self.assertEqual(self.archive.dates(), ['2016-07-06', '2016-07-07'])
+        finally:
+            config['database'] = database
+
+
+
+    def test_convert_jpm_delta_previous_file(self):
+        """
+        The previous statement is loaded from previous_file, not from the
+        archive, which is empty.
+        """
+        config = jpm.utility.config['archive']
+        database = config['database']
+        config['database'] = self.archive_file
+        try:
+            previous_file = self.save_statement(datetime.date(2016,7,6))
+            filename = self.save_statement(datetime.date(2016,7,7), 1234.5)
+            output_files = convert_jpm(filename, self.directory, 'test_',
+                                        use_cache=False, delta=True,
+                                        previous_file=previous_file)
+            self.assertEqual(len(self.read_delta_file(output_files[3])), 1)
+            rows = self.read_delta_file(output_files[2])
+            self.assertEqual(len(rows), 2)
+            self.assertEqual(rows[1][0], 'changed')
+            self.assertEqual(self.archive.dates(), ['2016-07-07'])
+        finally:
+            config['database'] = database
+
+
+
+    def test_previous_records_no_archive(self):
+        port_values = self.read_statement(datetime.date(2016,7,6))
+        self.assertEqual(get_previous_records(None, port_values), ([], []))
@@ -0,0 +1,121 @@
+"""
+Test the diagnose.py
+"""
+
+import unittest2
+from xlrd import open_workbook
+from jpm.utility import get_current_path
+from jpm.open_jpm import read_jpm
+from jpm.diagnose import diagnose_jpm, diagnose_statement
+from jpm.benchmark.synthetic import generate_statement, SyntheticSheet
+
+
+
+class TestDiagnose(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestDiagnose, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        pass
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        pass
+
+
+
+    def make_bad_statement(self):
+        """
+        3 accounts, 48029 and 48089 have problems, 48090 is fine.
+        """
+        rows = generate_statement(accounts=3, holdings=2, cash=2, empty_accounts=0)
+        rows[13][6] = 'abc'     # settled units of 48029
+        rows[19][1] = '3.5%'    # coupon rate of 48029
+        rows[40][7] = 1.0       # total units of 48089, sub total mismatch
+        rows[48][9] = 'n/a'     # closing balance of 48089
+        return SyntheticSheet(rows)
+
+
+
+    def test_diagnose_jpm(self):
+        port_values = {}
+        problems = diagnose_jpm(self.make_bad_statement(), port_values)
+        self.assertEqual([(p.row, p.column, p.field, p.value, p.account)
+                            for p in problems],
+                            [(13, 6, 'settled_units', 'abc', '48029'),
+                            (19, 1, 'coupon_rate', '3.5%', '48029'),
+                            (44, 7, 'total_units', 7889301.0, '48089'),
+                            (48, 9, 'closing_balance', 'n/a', '48089')])
+        self.assertTrue(problems[2].message.startswith('sub total does not match'))
+
+        # the valid account is still read
+        self.assertEqual(port_values['date'].day, 6)
+        self.assertEqual([a['account_code'] for a in port_values['accounts']],
+                            ['48090'])
+        self.assertEqual(len(port_values['accounts'][0]['holdings']), 2)
+        self.assertEqual(len(port_values['accounts'][0]['cash']), 2)
+
+
+
+    def test_fail_fast(self):
+        """
+        read_jpm() still stops at the first problem.
+        """
+        with self.assertRaises(TypeError):
+            read_jpm(self.make_bad_statement(), {})
+
+
+
+    def test_good_statement(self):
+        filename = get_current_path() + '\\samples\\statement.xls'
+        wb = open_workbook(filename=filename)
+        ws = wb.sheet_by_name('Sheet1')
+        port_values = {}
+        self.assertEqual(diagnose_jpm(ws, port_values), [])
+
+        expected = {}
+        read_jpm(ws, expected)
+        self.assertEqual(port_values, expected)
+
+
+
+    def test_diagnose_statement(self):
+        filename = get_current_path() + '\\samples\\holding_error.xls'
+        report = diagnose_statement(filename)
+        self.assertEqual(report['date'], '2016-7-6')
+        self.assertEqual(report['accounts'], 11)
+        self.assertEqual(len(report['problems']), 1)
+        problem = report['problems'][0]
+        self.assertEqual(problem['cell'], 'G193')
+        self.assertEqual(problem['field'], 'settled_units')
+        self.assertEqual(problem['account'], '48029')
+
+
+
+    def test_date_error(self):
+        filename = get_current_path() + '\\samples\\date_error.xls'
+        report = diagnose_statement(filename)
+        self.assertEqual(report['date'], None)
+        self.assertEqual(report['problems'][0]['field'], 'date')
+
+        # no 'As Of:' row at all
+        filename = get_current_path() + '\\samples\\sample_lookup.xls'
+        report = diagnose_statement(filename)
+        self.assertTrue('statement date not found' in report['problems'][0]['message'])
+
+
+
+    def test_file_error(self):
+        filename = get_current_path() + '\\samples\\no_such_file.xls'
+        report = diagnose_statement(filename)
+        self.assertEqual(report['accounts'], 0)
+        self.assertEqual(len(report['problems']), 1)
+        self.assertEqual(report['problems'][0]['cell'], None)
@@ -11,7 +11,15 @@ from jpm.open_jpm import read_jpm, read_date, extract_account_info, \
                             read_holdings_total, validate_holdings_total, \
                             read_holdings, read_cash_fields, is_empty_account, \
                             read_cash_position, read_cash, read_account, \
-                            get_currency_from_name
+                            get_currency_from_name, classify_rows, \
+                            ROW_DATA, ROW_BLANK, ROW_ACCOUNT, ROW_NO_DATA, \
+                            ROW_HOLDING_FIELDS, ROW_HOLDINGS_SUBTOTAL, \
+                            ROW_CASH_FIELDS, get_holding_layout, \
+                            iter_statement, EVENT_DATE, EVENT_ACCOUNT_BEGIN, \
+                            EVENT_HOLDING, EVENT_CASH, EVENT_ACCOUNT_END, \
+                            read_jpm_parallel, split_account_rows, RunningTotals, \
+                            RowKinds
+from jpm.workbook import SheetRows
 
 
 
@@ -60,6 +68,38 @@ class TestJPM(unittest2.TestCase):
 
 
 
+    def test_classify_rows(self):
+        filename = get_current_path() + '\\samples\\statement.xls'
+        wb = open_workbook(filename=filename)
+        ws = wb.sheet_by_name('Sheet1')
+
+        kinds = classify_rows(ws)
+        self.assertEqual(len(kinds), ws.nrows)
+        self.assertEqual(kinds[5], ROW_DATA)    # As Of: 06-Jul-2016
+        self.assertEqual(kinds[7], ROW_ACCOUNT)
+        self.assertEqual(kinds[8], ROW_HOLDING_FIELDS)
+        self.assertEqual(kinds[12], ROW_BLANK)
+        self.assertEqual(kinds[13], ROW_DATA)
+        self.assertEqual(kinds[192], ROW_HOLDINGS_SUBTOTAL)
+        self.assertEqual(kinds[194], ROW_CASH_FIELDS)
+        self.assertEqual(kinds[195], ROW_BLANK)
+        self.assertEqual(kinds[318], ROW_NO_DATA)
+
+
+
+    def test_row_kinds(self):
+        filename = get_current_path() + '\\samples\\statement.xls'
+        wb = open_workbook(filename=filename)
+        ws = wb.sheet_by_name('Sheet1')
+
+        kinds = RowKinds(ws)
+        self.assertEqual(len(kinds), ws.nrows)
+        self.assertEqual(kinds[318], ROW_NO_DATA)
+        self.assertEqual([kinds[row] for row in range(ws.nrows)],
+                            list(classify_rows(ws)))
+
+
+
     def test_extract_account_info(self):
         cell_value = \
             'Account:   48029   CLT - CLI HK BR (CLASS A-HK) TRUST FUND  '
@@ -144,6 +184,21 @@ class TestJPM(unittest2.TestCase):
 
 
 
+    def test_get_holding_layout(self):
+        """
+        Accounts with the same holding fields share the same layout.
+        """
+        filename = get_current_path() + '\\samples\\statement.xls'
+        wb = open_workbook(filename=filename)
+        ws = wb.sheet_by_name('Sheet1')
+
+        layout = get_holding_layout(ws, 8)  # holding fields at A9
+        self.assertEqual(layout.rows_each_holding, 4)
+        self.assertEqual(len(layout.fields), 18)
+        self.assertTrue(get_holding_layout(ws, 210) is layout) # A211
+
+
+
     def test_read_holding_position(self):
         filename = get_current_path() + '\\samples\\holding_sample.xls'
         wb = open_workbook(filename=filename)
@@ -378,6 +433,70 @@ class TestJPM(unittest2.TestCase):
 
 
 
+    def test_iter_statement(self):
+        """
+        Test iter_statement()
+        """
+        filename = get_current_path() + '\\samples\\statement.xls'
+        wb = open_workbook(filename=filename)
+        ws = wb.sheet_by_name('Sheet1')
+
+        events = iter_statement(ws)
+        event = next(events)
+        self.assertEqual(event.kind, EVENT_DATE)
+        self.assertEqual(event.value, datetime.datetime(2016,7,6))
+
+        event = next(events)
+        self.assertEqual(event.kind, EVENT_ACCOUNT_BEGIN)
+        self.assertEqual(event.row, 7)
+        self.assertEqual(event.value['account_code'], '48029')
+
+        event = next(events)
+        self.assertEqual(event.kind, EVENT_HOLDING)
+        self.assertEqual(event.row, 13)
+        self.validate_equity_position(event.value)
+
+        # the first position comes before the rest of the sheet is read,
+        # rows after the first 20 raise IndexError in SheetRows
+        events2 = iter_statement(SheetRows(ws, 0, 20))
+        self.assertEqual([next(events2).kind for i in range(3)],
+                            [EVENT_DATE, EVENT_ACCOUNT_BEGIN, EVENT_HOLDING])
+
+        counts = {}
+        for event in events:
+            counts[event.kind] = counts.get(event.kind, 0) + 1
+
+        self.assertEqual(counts[EVENT_HOLDING], 51)
+        self.assertEqual(counts[EVENT_CASH], 10)
+        self.assertEqual(counts[EVENT_ACCOUNT_BEGIN], 11)
+        self.assertEqual(counts[EVENT_ACCOUNT_END], 12)
+
+
+
+    def test_split_account_rows(self):
+        groups = split_account_rows([1, 5, 9, 20, 31], 3)
+        self.assertEqual(groups, [[1, 5], [9, 20], [31]])
+        self.assertEqual(split_account_rows([1, 5], 4), [[1], [5]])
+
+
+
+    def test_read_jpm_parallel(self):
+        """
+        Read the accounts in worker processes, the result should be the
+        same as read_jpm().
+        """
+        filename = get_current_path() + '\\samples\\statement.xls'
+        wb = open_workbook(filename=filename)
+        ws = wb.sheet_by_name('Sheet1')
+        port_values = {}
+        read_jpm(ws, port_values)
+
+        port_values2 = read_jpm_parallel(filename, 3)
+        self.assertEqual(port_values2, port_values)
+        self.validate_account(port_values2['accounts'][0])
+
+
+
     def validate_account(self, account):
         """
         Validate the first account (48029) in statement.xls
@@ -557,4 +676,42 @@ class TestJPM(unittest2.TestCase):
         self.assertEqual(position['settled_units'], 1000000)
         self.assertEqual(position['total_units'], 1000000)
         self.assertAlmostEqual(position['coupon_rate'], 5.375/100)
-        self.assertEqual(position['maturity_date'], datetime.datetime(2017,3,8))
\ No newline at end of file
+        self.assertEqual(position['maturity_date'], datetime.datetime(2017,3,8))
+
+
+
+    def test_running_totals(self):
+        filename = get_current_path() + '\\samples\\statement.xls'
+        wb = open_workbook(filename=filename)
+        ws = wb.sheet_by_name('Sheet1')
+
+        holdings = []
+        read_holdings(ws, 210, holdings)    # bond holdings at A211
+        totals = RunningTotals(holdings)
+        self.assertEqual(totals.count, 15)
+        self.assertAlmostEqual(totals['settled_units'], 101500000)
+
+        n, holdings_total = read_holdings_total(ws, 289)
+        self.assertEqual(totals.compare(holdings_total), [])
+        holdings_total['total_units'] = 0
+        mismatch = totals.compare(holdings_total)
+        self.assertEqual(len(mismatch), 1)
+        self.assertEqual(mismatch[0][0], 'total_units')
+
+
+
+    def test_compensated_sum(self):
+        totals = RunningTotals(fields=['settled_units'])
+        for x in [1e16, 1.0, -1e16] + [0.1]*10:
+            totals.add({'settled_units': x})
+        self.assertEqual(totals['settled_units'], 2.0)
+        self.assertEqual(totals.totals(), [2.0])
+
+
+
+    def test_running_totals_missing_field(self):
+        totals = RunningTotals([{'settled_units': 5.0}, {}])
+        self.assertEqual(totals['settled_units'], 5.0)
+        self.assertEqual(totals['current_face_total'], 0)
+        with self.assertRaises(KeyError):
+            totals['coupon_rate']
@@ -7,7 +7,8 @@ import datetime, os
 from xlrd import open_workbook
 from jpm.utility import get_current_path
 from jpm.open_jpm import read_jpm, read_date, InconsistentSubtotal, write_csv, \
-                            get_currency_from_name, NoCurrencyCodeInName
+                            get_currency_from_name, NoCurrencyCodeInName, \
+                            write_csv_pipelined, read_jpm_parallel
 from investment_lookup.id_lookup import InvestmentIdNotFound
 
 
@@ -96,6 +97,31 @@ class TestJPM(unittest2.TestCase):
     
     
 
+    def test_read_jpm_truncated_position(self):
+        """
+        The sheet ends inside the first holding position, the invalid
+        field is reported, not an IndexError.
+        """
+        filename = get_current_path() + '\\samples\\holding_field_sample.xls'
+        wb = open_workbook(filename=filename)
+        ws = wb.sheet_by_name('Sheet1')
+
+        with self.assertRaisesRegex(TypeError, 'awaiting_receipt'):
+            read_jpm(ws, {})
+
+
+
+    def test_read_jpm_parallel_error(self):
+        """
+        The sub total is validated in the worker process, the error is
+        raised to the caller.
+        """
+        filename = get_current_path() + '\\samples\\holding_error.xls'
+        with self.assertRaises(InconsistentSubtotal):
+            read_jpm_parallel(filename, 2)
+
+
+
     def test_read_jpm_error2(self):
         filename = get_current_path() + '\\samples\\holding_error2.xls'
         wb = open_workbook(filename=filename)
@@ -104,4 +130,19 @@ class TestJPM(unittest2.TestCase):
 
         with self.assertRaises(InvestmentIdNotFound):
             read_jpm(ws, port_values)
-            write_csv(port_values, os.path.join(get_current_path(), 'samples'))
\ No newline at end of file
+            write_csv(port_values, os.path.join(get_current_path(), 'samples'))
+
+
+
+    def test_write_csv_pipelined_error(self):
+        filename = get_current_path() + '\\samples\\holding_error.xls'
+        wb = open_workbook(filename=filename)
+        ws = wb.sheet_by_name('Sheet1')
+        output_dir = os.path.join(get_current_path(), 'samples')
+
+        with self.assertRaises(InconsistentSubtotal):
+            write_csv_pipelined(ws, output_dir, 'pipelined_')
+
+        # the partly written csv files are removed
+        for filename in os.listdir(output_dir):
+            self.assertFalse(filename.startswith('pipelined_'))
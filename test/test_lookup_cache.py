@@ -0,0 +1,135 @@
+"""
+Test the lookup_cache.py
+"""
+
+import unittest2
+import jpm.lookup_cache
+from jpm.lookup_cache import LookupCache, lookup_investment_ids, \
+                                clear_caches, MISSING_INVESTMENT_IDS
+from investment_lookup.id_lookup import InvestmentIdNotFound
+
+
+
+class TestLookupCache(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestLookupCache, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        self.calls = 0
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        pass
+
+
+
+    def compute(self, value):
+        self.calls = self.calls + 1
+        return value
+
+
+
+    def test_hit_and_miss(self):
+        cache = LookupCache(10)
+        self.assertEqual(cache.get('a', lambda: self.compute(1)), 1)
+        self.assertEqual(cache.get('a', lambda: self.compute(2)), 1)
+        self.assertEqual(self.calls, 1)
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size'], 1)
+
+
+
+    def test_eviction(self):
+        cache = LookupCache(2)
+        cache.get('a', lambda: self.compute(1))
+        cache.get('b', lambda: self.compute(2))
+        cache.get('a', lambda: self.compute(1))    # 'b' is now least recent
+        cache.get('c', lambda: self.compute(3))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        cache.get('a', lambda: self.compute(1))
+        self.assertEqual(self.calls, 3)
+        cache.get('b', lambda: self.compute(2))
+        self.assertEqual(self.calls, 4)
+
+
+
+    def test_exception_not_cached(self):
+        cache = LookupCache(2)
+
+        def fail():
+            self.calls = self.calls + 1
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            cache.get('a', fail)
+        with self.assertRaises(ValueError):
+            cache.get('a', fail)
+        self.assertEqual(self.calls, 2)
+
+
+
+    def test_put_and_resize(self):
+        cache = LookupCache(3)
+        for key in ['a', 'b', 'c']:
+            cache.put(key, key)
+        self.assertEqual(cache.get('a', lambda: self.compute('x')), 'a')
+        self.assertEqual(self.calls, 0)
+
+        cache.resize(1)     # only the most recent 'a' is kept
+        self.assertEqual(cache.stats()['size'], 1)
+        self.assertEqual(cache.stats()['evictions'], 2)
+        self.assertEqual(cache.get('a', lambda: self.compute('x')), 'a')
+
+
+
+    def test_ttl(self):
+        # None is kept for 0 seconds, i.e., always computed again
+        cache = LookupCache(10, ttl=lambda value: 0 if value is None else None)
+        cache.get('a', lambda: self.compute(None))
+        cache.get('a', lambda: self.compute(None))
+        self.assertEqual(self.calls, 2)
+        cache.get('b', lambda: self.compute(1))
+        cache.get('b', lambda: self.compute(1))
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(cache.stats()['misses'], 3)
+
+
+
+    def test_lookup_investment_ids_errors(self):
+        """
+        A security not found is cached, other errors are not.
+        """
+        def lookup(portfolio_id, security_id_type, security_id):
+            self.calls = self.calls + 1
+            if security_id == 'NOT_FOUND':
+                raise InvestmentIdNotFound()
+            raise OSError('database not available')
+
+        get_investment_Ids = jpm.lookup_cache.get_investment_Ids
+        jpm.lookup_cache.get_investment_Ids = lookup
+        clear_caches()
+        try:
+            for i in range(2):
+                self.assertEqual(lookup_investment_ids('12404', 'ISIN', 'NOT_FOUND'),
+                                    MISSING_INVESTMENT_IDS)
+            self.assertEqual(self.calls, 1)
+
+            for i in range(2):
+                self.assertEqual(lookup_investment_ids('12404', 'ISIN', 'ERROR'),
+                                    MISSING_INVESTMENT_IDS)
+            self.assertEqual(self.calls, 3)
+        finally:
+            jpm.lookup_cache.get_investment_Ids = get_investment_Ids
+            clear_caches()
@@ -0,0 +1,114 @@
+"""
+Test the metrics.py
+"""
+
+import unittest2
+import json, os, shutil, tempfile
+from xlrd import open_workbook
+from jpm.utility import get_current_path
+from jpm.open_jpm import read_jpm, get_metrics_file_name
+from jpm.metrics import enable, reset, timed, stage, get_metrics, write_metrics
+
+
+
+@timed('add', rows=len)
+def add(values):
+    return values + [0]
+
+
+
+@timed('count', rows=int)
+def count(n):
+    for i in range(n):
+        yield i
+
+    return n
+
+
+
+class TestMetrics(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestMetrics, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        reset()
+        enable()
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        enable(False)
+        reset()
+
+
+
+    def test_timed(self):
+        add([1, 2])
+        add([1, 2, 3])
+        self.assertEqual(list(count(3)), [0, 1, 2])
+        with stage('block'):
+            pass
+
+        metrics = get_metrics()
+        self.assertEqual(metrics['add']['calls'], 2)
+        self.assertEqual(metrics['add']['rows'], 7)
+        self.assertEqual(metrics['count']['calls'], 1)
+        self.assertEqual(metrics['count']['rows'], 3)
+        self.assertEqual(metrics['block']['calls'], 1)
+        self.assertGreaterEqual(metrics['block']['seconds'], 0)
+
+
+
+    def test_disabled(self):
+        enable(False)
+        add([1])
+        self.assertEqual(list(count(2)), [0, 1])
+        self.assertEqual(get_metrics(), {})
+
+
+
+    def test_read_jpm(self):
+        filename = get_current_path() + '\\samples\\statement.xls'
+        wb = open_workbook(filename=filename)
+        ws = wb.sheet_by_name('Sheet1')
+        port_values = {}
+        read_jpm(ws, port_values)
+
+        metrics = get_metrics()
+        self.assertEqual(metrics['read_date']['calls'], 1)
+        self.assertFalse('classify_rows' in metrics)    # rows classified lazily
+        self.assertEqual(metrics['read_holdings']['calls'], 3)
+        self.assertEqual(metrics['validate_holdings_total']['calls'], 3)
+        self.assertEqual(metrics['read_cash']['calls'], 6)
+        self.assertEqual(metrics['read_account']['rows'] +
+                            metrics['read_date']['rows'], ws.nrows)
+
+
+
+    def test_write_metrics(self):
+        directory = tempfile.mkdtemp()
+        try:
+            add([1])
+            filename = os.path.join(directory, 'metrics.json')
+            write_metrics(filename, {'filename': 'statement.xls'})
+            with open(filename) as f:
+                report = json.load(f)
+
+            self.assertEqual(report['filename'], 'statement.xls')
+            self.assertEqual(report['stages']['add']['calls'], 1)
+        finally:
+            shutil.rmtree(directory)
+
+
+
+    def test_get_metrics_file_name(self):
+        self.assertEqual(get_metrics_file_name(['C:\\temp\\jpm_2016-7-6_cash.csv',
+                                                'C:\\temp\\jpm_2016-7-6_position.csv']),
+                            'C:\\temp\\jpm_2016-7-6_metrics.json')
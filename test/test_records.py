@@ -0,0 +1,60 @@
+"""
+Test the records.py
+"""
+
+import unittest2
+import pickle
+from jpm.records import Account, HoldingPosition, CashPosition
+
+
+
+class TestRecords(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestRecords, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        pass
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        pass
+
+
+
+    def test_holding_position(self):
+        position = HoldingPosition(security_id='B1L3XL6', isin='CNE1000004X4')
+        position['settled_units'] = 150000.0
+
+        self.assertEqual(len(position), 3)
+        self.assertEqual(position['isin'], 'CNE1000004X4')
+        self.assertTrue('settled_units' in position)
+        self.assertFalse('coupon_rate' in position)
+        self.assertEqual(position.get('coupon_rate', ''), '')
+        with self.assertRaises(KeyError):
+            position['coupon_rate']
+        with self.assertRaises(KeyError):
+            position['no_such_field'] = 1
+
+        self.assertEqual(position, {'security_id': 'B1L3XL6', 
+                                    'isin': 'CNE1000004X4', 
+                                    'settled_units': 150000.0})
+
+
+
+    def test_account(self):
+        account = Account(account_code='48029', account_name='TRUST FUND')
+        self.assertFalse('cash' in account)
+        account['cash'] = [CashPosition(currency='HKD', closing_balance=1.0)]
+        self.assertTrue('cash' in account)
+
+        account = pickle.loads(pickle.dumps(account))
+        self.assertEqual(account['account_code'], '48029')
+        self.assertEqual(account['cash'][0]['currency'], 'HKD')
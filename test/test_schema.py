@@ -0,0 +1,73 @@
+"""
+Test the schema.py
+"""
+
+import unittest2
+import datetime
+from jpm.schema import HOLDING_FIELDS, CASH_FIELDS, HOLDING_FIELDS_BY_NAME, \
+                        CASH_FIELDS_BY_NAME
+
+
+
+class TestSchema(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestSchema, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        pass
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        pass
+
+
+
+    def test_holding_fields(self):
+        self.assertEqual(len(HOLDING_FIELDS), 18)
+        self.assertEqual(len(HOLDING_FIELDS_BY_NAME), 18)
+        self.assertEqual(HOLDING_FIELDS['Reg./Sub Acct.'].name, 'regional_or_sub_account')
+        self.assertEqual(HOLDING_FIELDS['Coupon Rate'].row_offset, -1)
+        self.assertEqual(HOLDING_FIELDS['ISIN'].row_offset, 0)
+
+
+
+    def test_holding_converters(self):
+        converter = HOLDING_FIELDS_BY_NAME['coupon_rate'].converter
+        self.assertAlmostEqual(converter('coupon_rate', 5.375), 5.375/100)
+        self.assertEqual(converter('coupon_rate', ''), None)
+
+        converter = HOLDING_FIELDS_BY_NAME['maturity_date'].converter
+        self.assertEqual(converter('maturity_date', 42802.0), 
+                            datetime.datetime(2017,3,8))
+
+        converter = HOLDING_FIELDS_BY_NAME['settled_units'].converter
+        self.assertEqual(converter('settled_units', 1000.0), 1000)
+        with self.assertRaises(TypeError):
+            converter('settled_units', '')
+
+        converter = HOLDING_FIELDS_BY_NAME['isin'].converter
+        self.assertEqual(converter('isin', ''), '')
+        with self.assertRaises(TypeError):
+            converter('isin', 1.0)
+
+
+
+    def test_cash_converters(self):
+        self.assertEqual(len(CASH_FIELDS), 8)
+        converter = CASH_FIELDS_BY_NAME['currency'].converter
+        self.assertEqual(converter('currency', 'HKD'), 'HKD')
+        with self.assertRaises(ValueError):
+            converter('currency', '')
+
+        converter = CASH_FIELDS_BY_NAME['closing_balance'].converter
+        self.assertAlmostEqual(converter('closing_balance', '1234.5'), 1234.5)
+        with self.assertRaises(TypeError):
+            converter('closing_balance', 'abc')
@@ -0,0 +1,68 @@
+"""
+Test the security_master.py
+"""
+
+import unittest2
+from jpm.utility import get_current_path
+from jpm.security_master import SecurityMaster, security_key, \
+                                get_security_master
+from jpm.lookup_cache import seed_investment_ids, clear_caches
+
+
+
+class TestSecurityMaster(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestSecurityMaster, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        pass
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        pass
+
+
+
+    def test_load(self):
+        master = SecurityMaster(get_current_path() + '\\samples\\sample_lookup.xls')
+        self.assertEqual(len(master.currencies), 1)
+        self.assertEqual(master.get_currency('JPM', 'B1L3XL6'), 'HKD')
+
+
+
+    def test_security_key(self):
+        position = {'security_id': 'B1L3XL6', 'isin': 'CNE1000004X4'}
+        self.assertEqual(security_key('11490', position), 
+                            ('11490', 'ISIN', 'CNE1000004X4'))
+
+        position = {'security_id': '4C0198S', 'isin': ''}
+        self.assertEqual(security_key('12308', position), 
+                            ('12308', 'JPM', '4C0198S'))
+
+
+
+    def test_master_per_statement(self):
+        """
+        Each statement gets its own master, the investment ids are kept
+        across statements only by the lookup cache.
+        """
+        key = ('11490', 'ISIN', 'XS0000000001')
+        seed_investment_ids(key, ('', 'XS0000000001', ''))
+        master = get_security_master()
+        self.assertEqual(master.get_investment_ids(*key), ('', 'XS0000000001', ''))
+
+        master2 = get_security_master()
+        self.assertFalse(master2 is master)
+        self.assertEqual(master2.investment_ids, {})
+        self.assertTrue(master2.currencies is master.currencies)
+
+        clear_caches()
+        self.assertFalse(get_security_master().currencies is master.currencies)
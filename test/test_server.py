@@ -0,0 +1,101 @@
+"""
+Test the server.py
+"""
+
+import unittest2
+import asyncio, json, os, shutil, socket, tempfile, threading
+from jpm.utility import get_current_path
+from jpm.server import create_executor, start_server, request_conversion
+
+
+
+class TestServer(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestServer, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        self.directory = tempfile.mkdtemp()
+        self.executor = create_executor(1)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+                        start_server(self.executor, '127.0.0.1', 0), self.loop).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        asyncio.run_coroutine_threadsafe(self.close_server(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.executor.shutdown()
+        shutil.rmtree(self.directory)
+
+
+
+    async def close_server(self):
+        """
+        Close the server and wait for the connection handlers to finish,
+        the clients have closed their connections by now.
+        """
+        self.server.close()
+        await self.server.wait_closed()
+        await asyncio.gather(*(asyncio.all_tasks() - {asyncio.current_task()}))
+
+
+
+    def test_request_conversion(self):
+        """
+        Two requests over the same connection.
+        """
+        filename = get_current_path() + '\\samples\\holding_error.xls'
+        with socket.create_connection(('127.0.0.1', self.port)) as sock, \
+                sock.makefile('rwb') as f:
+            for i in range(2):
+                f.write(json.dumps({'filename': filename,
+                                    'output_dir': self.directory}).encode() + b'\n')
+                f.flush()
+                response = json.loads(f.readline().decode())
+                self.assertEqual(response['filename'], filename)
+                self.assertTrue(response['error'].startswith('InconsistentSubtotal'))
+
+
+
+    def test_request_conversion_error(self):
+        filename = get_current_path() + '\\samples\\holding_error.xls'
+        response = request_conversion(filename, self.directory, port=self.port)
+        self.assertEqual(response['output_files'], [])
+        self.assertTrue(response['error'].startswith('InconsistentSubtotal'))
+
+        # no csv file is left behind
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+
+    def test_request_executor_failed(self):
+        # the executor cannot run the conversion, the client still gets
+        # an error response
+        self.executor.shutdown()
+        filename = get_current_path() + '\\samples\\holding_error.xls'
+        response = request_conversion(filename, self.directory, port=self.port)
+        self.assertEqual(response['filename'], filename)
+        self.assertEqual(response['output_files'], [])
+        self.assertTrue(response['error'].startswith('RuntimeError'))
+
+
+
+    def test_invalid_request(self):
+        with socket.create_connection(('127.0.0.1', self.port)) as sock, \
+                sock.makefile('rwb') as f:
+            f.write(b'not json\n')
+            f.flush()
+            self.assertTrue(b'invalid request' in f.readline())
@@ -0,0 +1,111 @@
+"""
+Test the statement.py
+"""
+
+import unittest2
+from xlrd import open_workbook
+from jpm.utility import get_current_path
+from jpm.open_jpm import read_jpm, is_empty_account
+from jpm.security_master import SecurityMaster
+from jpm.statement import Statement
+
+
+
+class TestStatement(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestStatement, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        filename = get_current_path() + '\\samples\\statement.xls'
+        wb = open_workbook(filename=filename)
+        ws = wb.sheet_by_name('Sheet1')
+        port_values = {}
+        read_jpm(ws, port_values)
+
+        # the only holding without currency in its name
+        master = SecurityMaster()
+        master.currencies[('JPM', 'B1L3XL6')] = 'HKD'
+        self.statement = Statement(port_values, master)
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        pass
+
+
+
+    def test_holdings_by_isin(self):
+        holdings = self.statement.holdings_by_isin('CNE100000HD4')
+        self.assertEqual(len(holdings), 2)
+        self.assertEqual([self.statement.get_portfolio_id(p) for p in holdings],
+                            ['11490', '12856'])
+        self.assertEqual(self.statement.get_account(holdings[1])['account_code'],
+                            '53413')
+        self.assertEqual(self.statement.holdings_by_isin('XX0000000000'), [])
+
+
+
+    def test_holdings_by_security_id(self):
+        holdings = self.statement.holdings_by_security_id('B1TMD93')
+        self.assertEqual(len(holdings), 1)
+        self.assertEqual(holdings[0]['isin'], 'XS0290534212')
+        self.assertEqual(self.statement.get_portfolio_id(holdings[0]), '12548')
+
+
+
+    def test_by_portfolio(self):
+        self.assertEqual(len(self.statement.holdings_by_portfolio('11490')), 36)
+        self.assertEqual(len(self.statement.holdings_by_portfolio('12548')), 15)
+        self.assertEqual(len(self.statement.holdings_by_portfolio('12341')), 0)
+        # the other account of 11490 is empty
+        self.assertEqual(len(self.statement.accounts_by_portfolio('11490')), 1)
+        cash = self.statement.cash_by_portfolio('12857')
+        self.assertEqual([c['currency'] for c in cash], ['HKD', 'USD'])
+        self.assertEqual(self.statement.holdings_by_portfolio('99999'), [])
+
+
+
+    def test_by_portfolio_unmapped_account(self):
+        """
+        An account code without a Geneva portfolio does not break the
+        lookups of the other accounts.
+        """
+        accounts = self.statement.accounts
+        account = [a for a in accounts if not is_empty_account(a)][0]
+        accounts.append(dict(account, account_code='XXXXX'))
+        self.assertEqual(len(self.statement.holdings_by_portfolio('11490')), 36)
+        self.assertEqual(len(self.statement.accounts_by_portfolio('11490')), 1)
+
+
+
+    def test_by_currency(self):
+        self.assertEqual(len(self.statement.holdings_by_currency('USD')), 16)
+        self.assertEqual(len(self.statement.holdings_by_currency('CNY')), 1)
+        self.assertEqual(len(self.statement.holdings_by_currency('EUR')), 1)
+        self.assertEqual(len(self.statement.holdings_by_currency('HKD')), 34)
+        cash = self.statement.cash_by_currency('USD')
+        self.assertEqual([c['account_number'] for c in cash],
+                            ['37329803', '37575203', '37989703', '38858303', '38858403'])
+
+
+
+    def test_lazy_index(self):
+        self.assertEqual(self.statement._indexes, {})
+        self.statement.holdings_by_isin('CNE100000HD4')
+        self.assertEqual(list(self.statement._indexes), ['isin'])
+        index = self.statement._indexes['isin']
+        self.statement.holdings_by_isin('HK0000069689')
+        self.assertTrue(self.statement._indexes['isin'] is index)
+
+
+
+    def test_position_not_in_statement(self):
+        with self.assertRaises(KeyError):
+            self.statement.get_account({'isin': 'CNE100000HD4'})
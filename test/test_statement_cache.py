@@ -0,0 +1,74 @@
+"""
+Test the statement_cache.py
+"""
+
+import unittest2
+import datetime, os, shutil, tempfile
+from xlrd import open_workbook
+from jpm.utility import get_current_path
+from jpm.open_jpm import read_jpm
+from jpm.statement_cache import StatementCache, file_key
+
+
+
+class TestStatementCache(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestStatementCache, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        self.directory = tempfile.mkdtemp()
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        shutil.rmtree(self.directory)
+
+
+
+    def test_file_key(self):
+        filename = get_current_path() + '\\samples\\statement.xls'
+        self.assertEqual(file_key(filename, 1), file_key(filename, 1))
+        self.assertNotEqual(file_key(filename, 1), file_key(filename, 2))
+
+        filename2 = get_current_path() + '\\samples\\holding_error.xls'
+        self.assertNotEqual(file_key(filename, 1), file_key(filename2, 1))
+
+        self.assertEqual(file_key(filename, 1, {'datemode': 0}),
+                            file_key(filename, 1, {'datemode': 0}))
+        self.assertNotEqual(file_key(filename, 1, {'datemode': 0}),
+                            file_key(filename, 1, {'datemode': 1}))
+
+
+
+    def test_get_put(self):
+        filename = get_current_path() + '\\samples\\statement.xls'
+        wb = open_workbook(filename=filename)
+        ws = wb.sheet_by_name('Sheet1')
+        port_values = {}
+        read_jpm(ws, port_values)
+
+        cache = StatementCache(self.directory, 10*1024*1024)
+        key = file_key(filename, 1)
+        self.assertEqual(cache.get(key), None)
+        cache.put(key, port_values)
+
+        port_values = cache.get(key)
+        self.assertEqual(port_values['date'], datetime.datetime(2016,7,6))
+        self.assertEqual(len(port_values['accounts']), 12)
+        self.assertEqual(port_values['accounts'][0]['holdings'][35]['isin'], 
+                            'CNE1000004X4')
+
+
+
+    def test_evict(self):
+        cache = StatementCache(self.directory, 1)   # 1 byte, keep nothing
+        cache.put('a', {'accounts': []})
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(os.listdir(self.directory), [])
@@ -0,0 +1,96 @@
+"""
+Test the benchmark/synthetic.py and benchmark/run_benchmarks.py
+"""
+
+import unittest2
+import datetime
+from jpm.open_jpm import read_jpm
+from jpm.benchmark.synthetic import generate_statement, SyntheticSheet
+from jpm.benchmark.run_benchmarks import time_function, compare_results
+
+
+
+class TestSynthetic(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestSynthetic, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        pass
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        pass
+
+
+
+    def test_generate_statement(self):
+        ws = SyntheticSheet(generate_statement(accounts=5, holdings=8, cash=2,
+                                                empty_accounts=2))
+        port_values = {}
+        read_jpm(ws, port_values)
+        self.assertEqual(port_values['date'], datetime.datetime(2016,7,6))
+
+        accounts = port_values['accounts']
+        self.assertEqual(len(accounts), 7)
+        for account in accounts[:5]:
+            self.assertEqual(len(account['holdings']), 8)
+            self.assertEqual(len(account['cash']), 2)
+
+        for account in accounts[5:]:
+            self.assertFalse('holdings' in account)
+            self.assertFalse('cash' in account)
+
+
+
+    def test_bond_ratio(self):
+        for bond_ratio, expected in [(0, 0), (1, 30)]:
+            ws = SyntheticSheet(generate_statement(accounts=3, holdings=10,
+                                                    bond_ratio=bond_ratio))
+            port_values = {}
+            read_jpm(ws, port_values)
+            bonds = [position for account in port_values['accounts'][:3]
+                        for position in account['holdings']
+                        if 'maturity_date' in position]
+            self.assertEqual(len(bonds), expected)
+
+
+
+    def test_blank_density(self):
+        rows = generate_statement(accounts=2, holdings=10, blank_density=0)
+        rows2 = generate_statement(accounts=2, holdings=10, blank_density=3)
+        self.assertEqual(len(rows2) - len(rows), 2*(9*3 + 3*3))
+
+        port_values = {}
+        read_jpm(SyntheticSheet(rows2), port_values)
+        self.assertEqual(len(port_values['accounts'][1]['holdings']), 10)
+
+        # the same arguments give the same statement
+        self.assertEqual(generate_statement(accounts=2, holdings=10),
+                            generate_statement(accounts=2, holdings=10))
+
+
+
+    def test_time_function(self):
+        seconds, number = time_function(lambda: sum(range(100)), 2, 0.001)
+        self.assertGreater(seconds, 0)
+        self.assertGreaterEqual(number, 1)
+
+
+
+    def test_compare_results(self):
+        old = {'results': [{'benchmark': 'read_jpm', 'accounts': 10,
+                            'holdings': 10, 'seconds': 0.2}]}
+        new = {'results': [{'benchmark': 'read_jpm', 'accounts': 10,
+                            'holdings': 10, 'seconds': 0.1},
+                            {'benchmark': 'write_csv', 'accounts': 10,
+                            'holdings': 10, 'seconds': 0.1}]}
+        self.assertEqual(compare_results(old, new),
+                            [('read_jpm', 10, 10, 0.2, 0.1)])
@@ -0,0 +1,63 @@
+"""
+Test the watch.py
+"""
+
+import unittest2
+import os, shutil, tempfile, time
+from jpm.utility import get_current_path
+from jpm.watch import find_changed_statements, MIN_FILE_AGE
+
+
+
+class TestWatch(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestWatch, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        self.directory = tempfile.mkdtemp()
+        for filename in ['statement.xls', 'holding_error.xls']:
+            shutil.copy(get_current_path() + '\\samples\\' + filename, 
+                        self.directory)
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        shutil.rmtree(self.directory)
+
+
+
+    def test_find_changed_statements(self):
+        state = {}
+        now = time.time() + MIN_FILE_AGE + 1
+        changed = find_changed_statements(self.directory, state, now)
+        self.assertEqual(len(changed), 2)
+
+        # nothing changed
+        changed = find_changed_statements(self.directory, state, now)
+        self.assertEqual(changed, [])
+
+        # touched, but the content is the same
+        filename = os.path.join(self.directory, 'statement.xls')
+        os.utime(filename, (now - MIN_FILE_AGE - 1, now - MIN_FILE_AGE - 1))
+        changed = find_changed_statements(self.directory, state, now)
+        self.assertEqual(changed, [])
+
+        # content changed
+        with open(filename, 'ab') as f:
+            f.write(b'0')
+        changed = find_changed_statements(self.directory, state, now)
+        self.assertEqual(changed, [filename])
+
+
+
+    def test_file_too_new(self):
+        state = {}
+        changed = find_changed_statements(self.directory, state, time.time())
+        self.assertEqual(changed, [])
@@ -0,0 +1,112 @@
+"""
+Test the workbook.py
+"""
+
+import unittest2
+import datetime, os, shutil, tempfile
+from jpm.utility import get_current_path
+from jpm.open_jpm import read_jpm
+from jpm.workbook import open_sheet, track_memory, load_workbook
+
+
+
+class TestWorkbook(unittest2.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestWorkbook, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        """
+            Run before a test function
+        """
+        pass
+
+
+
+    def tearDown(self):
+        """
+            Run after a test finishes
+        """
+        pass
+
+
+
+    def test_open_sheet(self):
+        filename = get_current_path() + '\\samples\\statement.xls'
+        port_values = {}
+        with open_sheet(filename) as ws:
+            self.assertEqual(ws.name, 'Sheet1')
+            read_jpm(ws, port_values)
+
+        self.assertEqual(port_values['date'], datetime.datetime(2016,7,6))
+        self.assertEqual(len(port_values['accounts']), 12)
+
+
+
+    def test_track_memory(self):
+        with track_memory() as memory:
+            data = [float(i) for i in range(10000)]
+
+        self.assertGreater(memory['peak'], 0)
+        self.assertGreaterEqual(memory['peak'], memory['current'])
+
+
+
+    @unittest2.skipIf(load_workbook is None, 'openpyxl not installed')
+    def test_open_xlsx_sheet(self):
+        """
+        The .xlsx statement has the same content as statement.xls.
+        """
+        port_values = {}
+        with open_sheet(get_current_path() + '\\samples\\statement.xls') as ws:
+            read_jpm(ws, port_values)
+
+        port_values2 = {}
+        with open_sheet(get_current_path() + '\\samples\\statement.xlsx') as ws:
+            self.assertEqual(ws.nrows, 362)
+            read_jpm(ws, port_values2)
+
+        self.assertEqual(port_values2, port_values)
+
+
+
+    @unittest2.skipIf(load_workbook is None, 'openpyxl not installed')
+    def test_open_xlsx_sheet_1904(self):
+        """
+        A workbook in the 1904 date system gives the same dates.
+        """
+        port_values = {}
+        with open_sheet(get_current_path() + '\\samples\\statement.xlsx') as ws:
+            read_jpm(ws, port_values)
+
+        from openpyxl.utils.datetime import CALENDAR_MAC_1904
+        wb = load_workbook(get_current_path() + '\\samples\\statement.xlsx')
+        wb.epoch = CALENDAR_MAC_1904
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'statement1904.xlsx')
+            wb.save(filename)
+            port_values2 = {}
+            with open_sheet(filename) as ws:
+                read_jpm(ws, port_values2)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(port_values2, port_values)
+
+
+
+    @unittest2.skipIf(load_workbook is None, 'openpyxl not installed')
+    def test_xlsx_sheet_random_access(self):
+        """
+        Going back to a row before the window still gives the right value.
+        """
+        filename = get_current_path() + '\\samples\\statement.xls'
+        with open_sheet(filename) as ws:
+            expected = [ws.row_values(row) for row in range(ws.nrows)]
+
+        filename = get_current_path() + '\\samples\\statement.xlsx'
+        with open_sheet(filename) as ws:
+            for row in [0, 300, 5, 361, 200, 201, 0]:
+                self.assertEqual(ws.row_values(row), expected[row])
+                self.assertEqual(ws.cell_value(row, 0), expected[row][0])
@@ -5,6 +5,8 @@
 # 
 
 import configparser, os
+import logging
+logger = logging.getLogger(__name__)
 
 # def get_current_path():
 # 	"""
@@ -162,6 +164,18 @@ def get_datemode():
 
 
 
+def is_memory_report_enabled():
+	"""
+	Whether to log the peak memory used to convert each statement.
+	"""
+	global config
+	try:
+		return config['excel']['report_memory'].strip() == '1'
+	except KeyError:
+		return False
+
+
+
 def get_input_directory():
 	"""
 	Where the input files reside.
@@ -175,6 +189,283 @@ def get_input_directory():
 
 
 
+def get_max_workers():
+	"""
+	Number of worker processes for batch conversion, read from the config 
+	object. Returns None if it is 0 or not set, i.e., one process per CPU
+	core.
+	"""
+	global config
+	try:
+		max_workers = int(config['batch']['max_workers'])
+	except KeyError:
+		return None
+	except ValueError:
+		logger.error('get_max_workers(): invalid max_workers value: {0}'.
+						format(config['batch']['max_workers']))
+		raise
+
+	if max_workers <= 0:
+		return None
+	return max_workers
+
+
+
+def get_lookup_cache_size():
+	"""
+	Maximum number of entries in the lookup caches, read from the config
+	object, default is 4096.
+	"""
+	global config
+	try:
+		cache_size = int(config['lookup']['cache_size'])
+	except KeyError:
+		return 4096
+	except ValueError:
+		logger.error('get_lookup_cache_size(): invalid cache_size value: {0}'.
+						format(config['lookup']['cache_size']))
+		raise
+
+	return cache_size
+
+
+
+def get_lookup_missing_ttl():
+	"""
+	Seconds to remember that a security is not found by the investment id
+	lookup, read from the config object, default is 600.
+	"""
+	global config
+	try:
+		missing_ttl = float(config['lookup']['missing_ttl'])
+	except KeyError:
+		return 600
+	except ValueError:
+		logger.error('get_lookup_missing_ttl(): invalid missing_ttl value: {0}'.
+						format(config['lookup']['missing_ttl']))
+		raise
+
+	return missing_ttl
+
+
+
+def get_lookup_workbook():
+	"""
+	The lookup workbook to preload the security master from, return None
+	if it is not set.
+	"""
+	global config
+	try:
+		workbook = config['lookup']['workbook'].strip()
+	except KeyError:
+		return None
+
+	if workbook == '':
+		return None
+
+	return os.path.join(get_current_path(), workbook)
+
+
+
+def is_cache_enabled():
+	"""
+	Whether parsed statements are cached on disk, default is no.
+	"""
+	global config
+	try:
+		return config['cache']['enabled'].strip() == '1'
+	except KeyError:
+		return False
+
+
+
+def get_cache_directory():
+	"""
+	Directory of the parsed statement cache.
+	"""
+	global config
+	try:
+		directory = config['cache']['directory'].strip()
+	except KeyError:
+		directory = ''
+
+	if directory == '':
+		directory = os.path.join(get_current_path(), 'cache')
+
+	return directory
+
+
+
+def get_cache_max_size():
+	"""
+	Maximum total size of the parsed statement cache, in bytes.
+	"""
+	global config
+	try:
+		max_size = float(config['cache']['max_size'])
+	except KeyError:
+		max_size = 200
+	except ValueError:
+		logger.error('get_cache_max_size(): invalid max_size value: {0}'.
+						format(config['cache']['max_size']))
+		raise
+
+	return int(max_size*1024*1024)
+
+
+
+def get_watch_interval():
+	"""
+	Seconds between two scans of the input directory in watch mode.
+	"""
+	global config
+	try:
+		return float(config['watch']['interval'])
+	except KeyError:
+		return 60
+
+
+
+def get_watch_state_file():
+	"""
+	The state file of watch mode.
+	"""
+	global config
+	try:
+		state_file = config['watch']['state_file'].strip()
+	except KeyError:
+		state_file = ''
+
+	if state_file == '':
+		state_file = 'watch_state.json'
+
+	return os.path.join(get_current_path(), state_file)
+
+
+
+def get_server_host():
+	"""
+	The address the conversion server listens on.
+	"""
+	global config
+	try:
+		host = config['server']['host'].strip()
+	except KeyError:
+		host = ''
+
+	if host == '':
+		host = '127.0.0.1'
+
+	return host
+
+
+
+def get_server_port():
+	"""
+	The TCP port of the conversion server.
+	"""
+	global config
+	try:
+		return int(config['server']['port'])
+	except KeyError:
+		return 8765
+
+
+
+def get_server_unix_socket():
+	"""
+	The Unix socket path of the conversion server, None if not set, then
+	the server listens on TCP.
+	"""
+	global config
+	try:
+		unix_socket = config['server']['unix_socket'].strip()
+	except KeyError:
+		return None
+
+	if unix_socket == '':
+		return None
+
+	return os.path.join(get_current_path(), unix_socket)
+
+
+
+def is_metrics_enabled():
+	"""
+	Whether to record the time of each conversion stage, see metrics.py.
+	"""
+	global config
+	try:
+		return config['metrics']['enabled'].strip() == '1'
+	except KeyError:
+		return False
+
+
+
+def get_arrow_format():
+	"""
+	The format of the additional columnar output files, 'parquet' or
+	'arrow', None if not set.
+	"""
+	global config
+	try:
+		arrow_format = config['output']['arrow_format'].strip().lower()
+	except KeyError:
+		return None
+
+	if arrow_format == '':
+		return None
+
+	if not arrow_format in ['parquet', 'arrow']:
+		logger.error('get_arrow_format(): invalid arrow_format: {0}'.
+						format(arrow_format))
+		raise ValueError('invalid arrow_format: {0}'.format(arrow_format))
+
+	return arrow_format
+
+
+
+def is_delta_enabled():
+	"""
+	Whether to write the day over day delta of the cash and holdings.
+	"""
+	global config
+	try:
+		return config['output']['delta'].strip() == '1'
+	except KeyError:
+		return False
+
+
+
+def is_archive_enabled():
+	"""
+	Whether to put the converted statements into the position archive.
+	"""
+	global config
+	try:
+		return config['archive']['enabled'].strip() == '1'
+	except KeyError:
+		return False
+
+
+
+def get_archive_database():
+	"""
+	The SQLite database file of the position archive.
+	"""
+	global config
+	try:
+		database = config['archive']['database'].strip()
+	except KeyError:
+		database = ''
+
+	if database == '':
+		database = 'archive.db'
+
+	return os.path.join(get_current_path(), database)
+
+
+
 def retrieve_or_create(port_values, key):
 	"""
 	retrieve or create the holding objects (list of dictionary) from the 
@@ -0,0 +1,151 @@
+# coding=utf-8
+#
+# Watch mode: keep polling the input directory, convert the statements that
+# are new or changed since the last time, so nobody has to run open_jpm.py
+# by hand for each statement dropped into the folder.
+#
+# The size, modification time and content hash of each statement seen are
+# kept in a small json state file (see [watch] in jpm.config). A statement
+# whose size and modification time are unchanged is skipped without reading
+# it, one whose content hash is unchanged is not converted again.
+#
+
+import json, os, time
+from jpm.utility import get_input_directory, get_watch_interval, \
+						get_watch_state_file
+from jpm.statement_cache import file_hash
+from jpm.batch import convert_statements, list_statements
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+# a statement modified less than this many seconds ago may still be being
+# copied into the folder, leave it to the next scan.
+MIN_FILE_AGE = 10
+
+
+
+def load_state(state_file):
+	"""
+	Load the state, a dictionary of filename to its record: size, mtime,
+	hash, output_files and error.
+	"""
+	try:
+		with open(state_file) as f:
+			return json.load(f)
+	except FileNotFoundError:
+		return {}
+
+
+
+def save_state(state, state_file):
+	"""
+	Save the state, write to a temp file first so that the state file is
+	never left half written.
+	"""
+	temp_file = state_file + '.tmp'
+	with open(temp_file, 'w') as f:
+		json.dump(state, f, indent=1, sort_keys=True)
+
+	os.replace(temp_file, state_file)
+
+
+
+def find_changed_statements(directory, state, now=None):
+	"""
+	Return the statements in the directory that are new or changed since
+	they were last recorded in the state. The state of statements whose
+	content is unchanged (e.g., just touched) is updated here.
+	"""
+	if now is None:
+		now = time.time()
+
+	changed = []
+	for filename in list_statements(directory):
+		stat = os.stat(filename)
+		if now - stat.st_mtime < MIN_FILE_AGE:
+			continue
+
+		record = state.get(filename)
+		if record is not None and record['size'] == stat.st_size \
+			and record['mtime'] == stat.st_mtime:
+			continue
+
+		content_hash = file_hash(filename)
+		if record is not None and record['hash'] == content_hash:
+			record['size'] = stat.st_size
+			record['mtime'] = stat.st_mtime
+			continue
+
+		state[filename] = {'size': stat.st_size, 'mtime': stat.st_mtime,
+							'hash': content_hash, 'output_files': [],
+							'error': None}
+		changed.append(filename)
+
+	return changed
+
+
+
+def process_directory(directory, state_file, max_workers=None):
+	"""
+	Convert the new or changed statements in the directory once, return
+	the results as in batch.convert_statements().
+
+	A statement that fails is recorded with the error, and is tried again
+	only when it changes.
+	"""
+	state = load_state(state_file)
+	filenames = find_changed_statements(directory, state)
+	results = []
+	if len(filenames) > 0:
+		logger.info('process_directory(): {0} new or changed statements'.
+						format(len(filenames)))
+		results = convert_statements(filenames, max_workers)
+		for filename, output_files, error in results:
+			state[filename]['output_files'] = output_files
+			state[filename]['error'] = error
+			if error is None:
+				print('OK      {0}'.format(filename))
+			else:
+				print('FAILED  {0}: {1}'.format(filename, error))
+
+	save_state(state, state_file)
+	return results
+
+
+
+def watch(directory=None, state_file=None, interval=None, max_workers=None):
+	"""
+	Poll the directory forever, until interrupted by Ctrl-C.
+	"""
+	if directory is None:
+		directory = get_input_directory()
+	if state_file is None:
+		state_file = get_watch_state_file()
+	if interval is None:
+		interval = get_watch_interval()
+
+	print('watching {0}, press Ctrl-C to stop.'.format(directory))
+	try:
+		while True:
+			try:
+				process_directory(directory, state_file, max_workers)
+			except OSError:	# e.g., the shared folder is not reachable
+				logger.exception('watch():')
+
+			time.sleep(interval)
+	except KeyboardInterrupt:
+		print('stopped.')
+
+
+
+if __name__ == '__main__':
+	import sys, logging.config
+	logging.config.fileConfig('logging.config', disable_existing_loggers=False)
+
+	directory = None
+	if len(sys.argv) > 1:
+		directory = sys.argv[1]
+
+	watch(directory)
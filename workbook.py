@@ -0,0 +1,262 @@
+# coding=utf-8
+#
+# Open the statement workbook lazily: only the statement sheet is loaded,
+# and the sheet and the workbook are released as soon as the caller is done
+# with it, so that large statements in a batch do not pile up in memory.
+#
+# A statement can also be an .xlsx file. It is read by openpyxl in read only
+# mode, the rows are streamed from the file and only a small window of them
+# is kept in memory, see XlsxSheet. openpyxl is optional, it is needed only
+# for .xlsx statements.
+#
+
+from xlrd import open_workbook
+from contextlib import contextmanager
+from collections import deque
+import os, tracemalloc
+from jpm.utility import get_datemode
+from jpm.metrics import stage
+
+try:
+	from openpyxl import load_workbook
+	from openpyxl.utils.datetime import to_excel, CALENDAR_WINDOWS_1900, \
+										CALENDAR_MAC_1904
+	# epoch of the Excel date numbers in each datemode
+	DATEMODE_EPOCHS = {0: CALENDAR_WINDOWS_1900, 1: CALENDAR_MAC_1904}
+except ImportError:
+	load_workbook = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+@contextmanager
+def open_sheet(filename, sheet_name='Sheet1'):
+	"""
+	Open the workbook on demand and load only the sheet, to be used as:
+
+	with open_sheet(filename) as ws:
+		read_jpm(ws, port_values)
+
+	When the with block ends, the sheet is unloaded and the workbook
+	resources released, so ws must not be used after that.
+
+	An .xlsx file is opened by open_xlsx_sheet().
+	"""
+	logger.debug('open_sheet(): {0}, {1}'.format(filename, sheet_name))
+	if is_xlsx(filename):
+		with open_xlsx_sheet(filename, sheet_name) as ws:
+			yield ws
+		return
+
+	with stage('open_workbook'):
+		wb = open_workbook(filename=filename, on_demand=True)
+		ws = wb.sheet_by_name(sheet_name)
+
+	try:
+		yield ws
+	finally:
+		if wb.sheet_loaded(sheet_name):
+			wb.unload_sheet(sheet_name)
+		wb.release_resources()
+
+
+
+# file extensions of the statements read by openpyxl
+XLSX_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# number of rows kept in memory by XlsxSheet
+XLSX_WINDOW_SIZE = 64
+
+
+
+def is_xlsx(filename):
+	return os.path.splitext(filename)[1].lower() in XLSX_EXTENSIONS
+
+
+
+@contextmanager
+def open_xlsx_sheet(filename, sheet_name='Sheet1'):
+	"""
+	Open an .xlsx workbook in read only mode and yield the sheet as an
+	XlsxSheet, the workbook is closed when the with block ends.
+
+	The dates are given as Excel date numbers in the datemode of the config
+	file, which the parser decodes them with (see excel_date() in
+	schema.py), whatever the date system of the workbook is.
+	"""
+	if load_workbook is None:
+		logger.error('open_xlsx_sheet(): openpyxl not installed: {0}'.
+						format(filename))
+		raise ImportError('openpyxl is needed to read {0}'.format(filename))
+
+	with stage('open_workbook'):
+		wb = load_workbook(filename, read_only=True, data_only=True)
+		ws = XlsxSheet(wb[sheet_name], DATEMODE_EPOCHS[get_datemode()])
+
+	try:
+		yield ws
+	finally:
+		wb.close()
+
+
+
+class XlsxSheet(object):
+	"""
+	A read only openpyxl worksheet, with the part of the xlrd Sheet
+	interface used by the parser: name, nrows, ncols, cell_value() and
+	row_values(). The cell values are the same as xlrd gives, i.e., numbers
+	are float, dates are Excel date numbers and empty cells are ''.
+
+	The rows are streamed from the file, only the last window_size rows
+	read are kept. Reading forward is cheap, going back to a row before the
+	window restarts the stream from that row. The parser reads the rows
+	mostly forward, so a statement is streamed a few times at most and the
+	memory used does not grow with its size.
+	"""
+	def __init__(self, ws, epoch, window_size=XLSX_WINDOW_SIZE):
+		self.name = ws.title
+		self._ws = ws
+		self._epoch = epoch
+		self._window_size = window_size
+		self.nrows = ws.max_row
+		self.ncols = ws.max_column
+		if self.nrows is None or self.ncols is None:
+			# no dimension in the file, e.g., written by a streaming writer,
+			# count the rows and columns
+			self.nrows = 0
+			self.ncols = 0
+			for values in ws.iter_rows(values_only=True):
+				self.nrows = self.nrows + 1
+				self.ncols = max(self.ncols, len(values))
+
+		self._restart(0)
+
+
+
+	def _restart(self, row):
+		self._rows = deque()
+		self._first_row = row		# row number of self._rows[0]
+		self._iterator = self._ws.iter_rows(min_row=row+1, max_row=self.nrows,
+											values_only=True)
+
+
+
+	def _row(self, row):
+		if row < 0 or row >= self.nrows:
+			raise IndexError('row index out of range: {0}'.format(row))
+
+		if row < self._first_row:
+			logger.debug('XlsxSheet._row(): restart at row {0}'.format(row))
+			self._restart(row)
+
+		while self._first_row + len(self._rows) <= row:
+			self._rows.append(self._convert_row(next(self._iterator)))
+			if len(self._rows) > self._window_size:
+				self._rows.popleft()
+				self._first_row = self._first_row + 1
+
+		return self._rows[row - self._first_row]
+
+
+
+	def _convert_row(self, values):
+		row_values = [self._convert_value(value) for value in values]
+		if len(row_values) < self.ncols:
+			row_values.extend([''] * (self.ncols - len(row_values)))
+		return row_values
+
+
+
+	def _convert_value(self, value):
+		if value is None:
+			return ''
+		if isinstance(value, str):
+			return value
+		if isinstance(value, (int, float)):	# bool is also int
+			return float(value)
+		try:
+			return float(to_excel(value, self._epoch))	# date and time
+		except (TypeError, AttributeError, ValueError):
+			return str(value)
+
+
+
+	def cell_value(self, row, column):
+		return self._row(row)[column]
+
+
+
+	def row_values(self, row, start_colx=0, end_colx=None):
+		return self._row(row)[start_colx:end_colx]
+
+
+
+class SheetRows(object):
+	"""
+	A copy of the rows first_row to end_row (excluded) of a sheet, with the
+	same part of the xlrd Sheet interface as XlsxSheet. The row numbers are
+	the same as in the sheet and nrows is the number of rows of the sheet,
+	reading a row outside the copy raises IndexError.
+
+	It holds plain lists of values, so it can be sent to a worker process
+	instead of the file name, see read_jpm_parallel().
+	"""
+	def __init__(self, ws, first_row, end_row):
+		self.name = ws.name
+		self.nrows = ws.nrows
+		self.ncols = ws.ncols
+		self.first_row = first_row
+		self._rows = [ws.row_values(row) for row in range(first_row, end_row)]
+
+
+
+	def _row(self, row):
+		if row < self.first_row or row >= self.first_row + len(self._rows):
+			raise IndexError('row {0} not in rows {1} to {2}'.format(row,
+								self.first_row, self.first_row + len(self._rows)))
+		return self._rows[row - self.first_row]
+
+
+
+	def cell_value(self, row, column):
+		return self._row(row)[column]
+
+
+
+	def row_values(self, row, start_colx=0, end_colx=None):
+		return self._row(row)[start_colx:end_colx]
+
+
+
+@contextmanager
+def track_memory():
+	"""
+	Track the memory allocated by Python in the with block, to be used as:
+
+	with track_memory() as memory:
+		...
+	memory['peak'], memory['current']
+
+	where peak is the peak memory in bytes during the block, current is the
+	memory still allocated at the end. Tracking slows things down, so use it
+	only when needed.
+	"""
+	memory = {'peak': 0, 'current': 0}
+	started = not tracemalloc.is_tracing()
+	if started:
+		tracemalloc.start()
+
+	elif hasattr(tracemalloc, 'reset_peak'):	# Python 3.9 or later
+		tracemalloc.reset_peak()
+
+	base, _ = tracemalloc.get_traced_memory()
+	try:
+		yield memory
+	finally:
+		current, peak = tracemalloc.get_traced_memory()
+		memory['current'] = current - base
+		memory['peak'] = peak - base
+		if started:
+			tracemalloc.stop()